@@ -0,0 +1,42 @@
+import argparse
+import time
+
+import numpy as np
+
+from rlpack.environment.atari_wrappers import make_atari
+
+
+parser = argparse.ArgumentParser(description="Compare the fused Atari preprocessing with the wrapper chain.")
+parser.add_argument("--env", type=str, default="PongNoFrameskip-v4")
+parser.add_argument("--nstep", type=int, default=5000)
+args = parser.parse_args()
+
+
+def run(env, actions):
+    env.seed(1)
+    env.reset()
+    obs = []
+    start = time.time()
+    for a in actions:
+        ob, _, done, _ = env.step(a)
+        obs.append(np.asarray(ob)[..., -1])
+        if done:
+            env.reset()
+    return time.time() - start, obs
+
+
+def run_main():
+    env, fused_env = make_atari(args.env), make_atari(args.env, fused=True)
+    actions = np.random.RandomState(0).randint(env.action_space.n, size=args.nstep)
+
+    t, obs = run(env, actions)
+    t_fused, fused_obs = run(fused_env, actions)
+
+    diff = np.abs(np.asarray(obs, dtype=np.int32) - np.asarray(fused_obs, dtype=np.int32))
+    print(f"wrapper chain: {t / args.nstep * 1e6:.1f} us/step")
+    print(f"fused:         {t_fused / args.nstep * 1e6:.1f} us/step ({t / t_fused:.2f}x)")
+    print(f"pixel difference: max={diff.max()} mean={diff.mean():.3f}")
+
+
+if __name__ == "__main__":
+    run_main()
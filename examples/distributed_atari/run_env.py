@@ -6,28 +6,39 @@ from rlpack.environment import make_atari
 parser = argparse.ArgumentParser(description="Parse environment name.")
 parser.add_argument("--ip", type=str, default="localhost")
 parser.add_argument("--port", type=int, default=50000)
+parser.add_argument("--n_env", type=int, default=1)
 parser.add_argument("--env", type=str, default="PongNoFrameskip-v4")
 args = parser.parse_args()
 
 
-env_wrapper = EnvironmentWrapper(addr_port_tuple=(args.ip, args.port))
+env_wrapper = EnvironmentWrapper(addr_port_tuple=(args.ip, args.port), n_env=args.n_env)
 
 # env side reset
 
-env = make_atari(args.env)
+envs = {env_id: make_atari(args.env) for env_id in env_wrapper.env_ids}
 
-
-state, reward, done = env.reset(), 0, False
-env_wrapper.put_srd(state=state, reward=reward, done=done)
+env_ids = list(envs.keys())
+states = [envs[env_id].reset() for env_id in env_ids]
+rewards, dones = [0] * len(env_ids), [False] * len(env_ids)
+env_wrapper.put_srd_batch(env_ids, states, rewards, dones)
+done_dict = dict(zip(env_ids, dones))
 
 # action side
 
 while True:
-    if done:
-        action = env_wrapper.get_a()  # env will send a fake action
-        state, reward, done = env.reset(), 0, False
-    else:
-        action = env_wrapper.get_a()
-        state, reward, done, _ = env.step(action)
-
-    env_wrapper.put_srd(state=state, reward=reward, done=done)
+    actions = env_wrapper.get_a_batch()
+    env_ids, states, rewards, dones = [], [], [], []
+    for env_id, action in actions.items():
+        env = envs[env_id]
+        if done_dict[env_id]:
+            # env will send a fake action
+            state, reward, done = env.reset(), 0, False
+        else:
+            state, reward, done, _ = env.step(action)
+        done_dict[env_id] = done
+        env_ids.append(env_id)
+        states.append(state)
+        rewards.append(reward)
+        dones.append(done)
+
+    env_wrapper.put_srd_batch(env_ids, states, rewards, dones)
@@ -32,6 +32,8 @@ class AgentWrapper(Thread):
         self._action_queue = defaultdict(Queue)
         self._sard_running = defaultdict(list)
         self._sard_finish = []
+        self._env_worker = {}
+        self._pending_srd = deque()
         self._port = port
         self._agent_server = None
         self._lock = Lock()
@@ -52,34 +54,35 @@ class AgentWrapper(Thread):
         self._agent_server = m.get_server()
 
     def _get_n_srd(self, n):
-        srds = []
-        env_ids = []
-        m = 0
-        while m < n:
-            all_envs = list(self._srd_queue.keys())
-            for t in all_envs:
+        while len(self._pending_srd) < n:
+            all_workers = list(self._srd_queue.keys())
+            for w in all_workers:
                 try:
-                    s, r, d = self._srd_queue[t].get(block=False)
-                    env_ids.append(t)
-                    srds.append((s, r, d))
-
-                    if t in self._sard_running:
-                        self._sard_running[t][-1][2] = r
-                        self._sard_running[t][-1][3] = d
-                        self._sard_running[t].append([s, None, None, None])
-                        if d:
-                            episode = self._sard_running.pop(t)
-                            self._sard_finish.append(episode)
-                    else:
-                        self._sard_running[t].append([s, None, None, None])
-
-                    m += 1
-                    if m >= n:
-                        break
+                    records = self._srd_queue[w].get(block=False)
                 except Empty:
                     continue
+                for record in records:
+                    self._env_worker[record[0]] = w
+                self._pending_srd.extend(records)
             time.sleep(0.0001)
 
+        srds = []
+        env_ids = []
+        for _ in range(n):
+            t, s, r, d = self._pending_srd.popleft()
+            env_ids.append(t)
+            srds.append((s, r, d))
+
+            if t in self._sard_running:
+                self._sard_running[t][-1][2] = r
+                self._sard_running[t][-1][3] = d
+                self._sard_running[t].append([s, None, None, None])
+                if d:
+                    episode = self._sard_running.pop(t)
+                    self._sard_finish.append(episode)
+            else:
+                self._sard_running[t].append([s, None, None, None])
+
         states = [srds[i][0] for i in range(n)]
         rewards = np.asarray([srds[i][1] for i in range(n)])
         dones = [srds[i][2] for i in range(n)]
@@ -96,13 +99,18 @@ class AgentWrapper(Thread):
     def put_a_batch(self, env_ids, actions):
         """Return actions to environments.
 
-        env_ids and actions are one-to-one correspondence.
+        env_ids and actions are one-to-one correspondence. Actions are grouped
+        by worker so that each worker receives a single message.
         """
+        batches = defaultdict(list)
         for env_id, a in zip(env_ids, actions):
-            self._action_queue[env_id].put(a)
+            batches[self._env_worker[env_id]].append((env_id, a))
             if env_id in self._sard_running:
                 self._sard_running[env_id][-1][1] = a
 
+        for worker_id, batch in batches.items():
+            self._action_queue[worker_id].put(batch)
+
     def get_episodes(self, withdraw_running=False):
         """Take out all newly generated episode.
 
@@ -154,14 +162,19 @@ class AgentWrapper(Thread):
 class EnvironmentWrapper:
     """Send srd to the agent and receive actions from the agent."""
 
-    def __init__(self, addr_port_tuple):
+    def __init__(self, addr_port_tuple, n_env=1):
         """Connect to agent.
 
         Args:
             addr_port_tuple:    tuple:(str, int) the address of agent.
+            n_env:              int, the number of environments served by this
+                                worker. They share one connection and one
+                                message per step.
         """
         self._addr_port_tuple = addr_port_tuple
-        self.env_id = str(uuid4())
+        self.worker_id = str(uuid4())
+        self.env_ids = [self.worker_id] if n_env == 1 else [f"{self.worker_id}/{i}" for i in range(n_env)]
+        self.env_id = self.env_ids[0]
         self.action_queue = None
         self.srd_queue = None
         self.reward_function = lambda x: None
@@ -189,14 +202,25 @@ class EnvironmentWrapper:
                     logging.warn(
                         f'Warning, env has reconnected {reconnected} times.')
 
-        self.srd_queue = m.get_srd(self.env_id)  # pylint:disable-msg=E1101
-        self.action_queue = m.get_a(self.env_id)  # pylint:disable-msg=E1101
+        self.srd_queue = m.get_srd(self.worker_id)  # pylint:disable-msg=E1101
+        self.action_queue = m.get_a(self.worker_id)  # pylint:disable-msg=E1101
 
     def get_a(self):
         """Retrive action from agent, blocking."""
-        a = self.action_queue.get()
+        (_, a), = self.action_queue.get()
         return a
 
     def put_srd(self, state, reward, done):
         """Put state, reward, done to agent, non-blocking."""
-        self.srd_queue.put((state, reward, done))
+        self.srd_queue.put([(self.env_id, state, reward, done)])
+
+    def get_a_batch(self):
+        """Retrive actions for the environments of this worker, blocking.
+
+        Return a dict from env_id to action.
+        """
+        return dict(self.action_queue.get())
+
+    def put_srd_batch(self, env_ids, states, rewards, dones):
+        """Put states, rewards, dones of several environments to agent in one message, non-blocking."""
+        self.srd_queue.put(list(zip(env_ids, states, rewards, dones)))
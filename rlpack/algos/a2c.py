@@ -1,6 +1,7 @@
 import numpy as np
 import tensorflow as tf
 
+from ..utils import compute_returns_advantages
 from .base import Base
 
 
@@ -12,9 +13,15 @@ class A2C(Base):
                  dim_obs=None, dim_act=None,
                  policy_fn=None, value_fn=None,
                  discount=0.99, gae=0.95,
-                 train_epoch=10, policy_lr=1e-3, value_lr=1e-3, batch_size=64,
+                 train_epoch=10, policy_lr=1e-3, value_lr=1e-3, batch_size=None, fuse_update=False, stage_rollout=False,
                  save_path="./log", log_freq=10, save_model_freq=1000,
                  ):
+        """
+        batch_size: minibatch size, indices are shuffled every epoch and value and policy steps alternate per minibatch.
+            None trains on the whole batch, all value epochs before the policy epochs.
+        fuse_update: update policy and value in the same `sess.run`.
+        stage_rollout: copy the rollout into graph variables once per update and feed only minibatch indices.
+        """
 
         self._dim_obs = dim_obs
         self._dim_act = dim_act
@@ -27,6 +34,8 @@ class A2C(Base):
         self._policy_lr = policy_lr
         self._value_lr = value_lr
         self._batch_size = batch_size
+        self._fuse_update = fuse_update
+        self._stage_rollout = stage_rollout
 
         self._log_freq = log_freq
         self._save_model_freq = save_model_freq
@@ -36,10 +45,10 @@ class A2C(Base):
     def _build_network(self):
         """Build networks for algorithm."""
         # Build inputs.
-        self._obs = tf.placeholder(tf.float32, [None, *self._dim_obs], "observation")
-        self._act = tf.placeholder(tf.float32, [None, self._dim_act], "action")
-        self._adv = tf.placeholder(tf.float32, [None])
-        self._ret = tf.placeholder(tf.float32, [None], "target_state_value")
+        self._obs = self._rollout_placeholder(tf.float32, [None, *self._dim_obs], "observation", self._stage_rollout)
+        self._act = self._rollout_placeholder(tf.float32, [None, self._dim_act], "action", self._stage_rollout)
+        self._adv = self._rollout_placeholder(tf.float32, [None], staged=self._stage_rollout)
+        self._ret = self._rollout_placeholder(tf.float32, [None], "target_state_value", self._stage_rollout)
         self.all_phs = [self._obs, self._act, self._adv, self._ret]
 
         with tf.variable_scope("policy"):
@@ -65,48 +74,44 @@ class A2C(Base):
     def update(self, databatch):
 
         states, actions, advantages, returns, oldlogproba = self._parse_databatch(*databatch)
-        inputs = {k: v for k, v in zip(self.all_phs, [states, actions, advantages, returns])}
-
-        for _ in range(self._train_epoch):
-            self.sess.run(self.train_value_op, feed_dict=inputs)
-
-        for _ in range(self._train_epoch):
-            self.sess.run(self.train_policy_op, feed_dict=inputs)
-
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        batch = [np.asarray(x) for x in [states, actions, advantages, returns]]
+        if self._stage_rollout:
+            self._stage_feed(dict(zip(self.all_phs, batch)))
+
+        def feed(index):
+            if self._stage_rollout:
+                return {self._stage_index: index}
+            return {k: v[index] for k, v in zip(self.all_phs, batch)}
+
+        # 整批且不合并时保持原顺序：先训练完value，再训练policy。
+        if self._batch_size is None and not self._fuse_update:
+            inputs = feed(np.arange(len(batch[0])))
+            for _ in range(self._train_epoch):
+                self.sess.run(self.train_value_op, feed_dict=inputs)
+            for _ in range(self._train_epoch):
+                self.sess.run(self.train_policy_op, feed_dict=inputs)
+        else:
+            for _ in range(self._train_epoch):
+                for index in self._minibatch_indices(len(batch[0]), self._batch_size):
+                    inputs = feed(index)
+                    if self._fuse_update:
+                        self.sess.run([self.train_value_op, self.train_policy_op], feed_dict=inputs)
+                    else:
+                        self.sess.run(self.train_value_op, feed_dict=inputs)
+                        self.sess.run(self.train_policy_op, feed_dict=inputs)
+
+        global_step = self._increment_step()
 
         if global_step % self._save_model_freq == 0:
             self.save_model()
 
     def _parse_databatch(self, states, actions, rewards, dones, earlystops, nextstates):
 
-        batch_size = len(dones)
         oldlogproba, values = self.sess.run([self.logp, self.v], feed_dict={self._obs: states, self._act: actions})
-        nextvalues = self.sess.run(self.v, feed_dict={self._obs: nextstates})
-
-        returns = np.zeros(batch_size)
-        deltas = np.zeros(batch_size)
-        advantages = np.zeros(batch_size)
-
-        for i in reversed(range(batch_size)):
-
-            if dones[i]:
-                prev_return = 0
-                prev_value = 0
-                prev_advantage = 0
-            elif earlystops[i]:
-                prev_return = nextvalues[i]
-                prev_value = prev_return
-                prev_advantage = 0
-
-            returns[i] = rewards[i] + self._discount * prev_return * (1 - dones[i])
-            deltas[i] = rewards[i] + self._discount * prev_value * (1 - dones[i]) - values[i]
-            # ref: https://arxiv.org/pdf/1506.02438.pdf (generalization advantage estimate)
-            advantages[i] = deltas[i] + self._discount * self._gae * prev_advantage * (1 - dones[i])
-
-            prev_return = returns[i]
-            prev_value = values[i]
-            prev_advantage = advantages[i]
+        nextvalues = self._bootstrap_values(dones, earlystops, nextstates)
+
+        returns, _, advantages = compute_returns_advantages(rewards, values, nextvalues, dones, earlystops,
+                                                            self._discount, self._gae)
 
         advantages = (advantages - advantages.mean()) / advantages.std()
 
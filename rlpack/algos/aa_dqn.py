@@ -5,6 +5,7 @@ from tqdm import tqdm
 
 from ..common.utils import assert_shape
 from ..common.network import mlp, cnn1d, cnn2d
+from ..utils import stacked_variable_getter
 from .base import Base
 
 
@@ -69,9 +70,12 @@ class AADQN(Base):
         with tf.variable_scope("main/qnet"):
             self._qvals = self._value_fn(self._observation)
 
+        # The target networks share stacked [n_net, ...] variables, the newest copy is at `self._target_pointer - 1`.
+        # Only storage and refresh are fused: value_fn is an arbitrary network, so the ensemble is still
+        # evaluated as n_net forward passes, each reading one slice of the stacked variables.
         self._target_qvals = []
         for i in range(self._n_net):
-            with tf.variable_scope(f"target_{i}/qnet"):
+            with tf.variable_scope("target/qnet", reuse=tf.AUTO_REUSE, custom_getter=stacked_variable_getter(self._n_net, i)):
                 self._target_qvals.append(self._value_fn(self._next_observation))
 
     # def _dense(self, x):
@@ -117,16 +121,8 @@ class AADQN(Base):
         # self._train_op = self.optimizer.minimize(loss, var_list=trainable_variables)
 
         # Update target network.
-        update_target_operation = []
-        for i in reversed(range(1, self._n_net)):  # i=0表示最近的模型。
-            with tf.control_dependencies(update_target_operation):
-                update_target_operation.append(self._update_target(f"target_{i}/qnet", f"target_{i-1}/qnet"))
-
-        with tf.control_dependencies(update_target_operation):
-            update_target_operation.append(self._update_target("target_0/qnet", "main/qnet"))
-
-        self._update_target_op = update_target_operation
-        self._log_op = {"loss": loss}
+        self._update_target_op = self._update_target("target/qnet", "main/qnet")
+        self._register_metric("loss", loss)
 
     def _compute_weights(self, action_q):
         """
@@ -156,18 +152,21 @@ class AADQN(Base):
         return weights, mat, inv_mat
 
     def _update_target(self, net1, net2):
-        """net1 = net2
+        """Copy net2 into the oldest slot of the stacked net1 and advance the circular pointer.
 
         Arguments:
-            net1 {str} -- variable scope of net1.
+            net1 {str} -- variable scope of the stacked target networks.
             net2 {str} -- variable scope of net2
         """
-        params1 = tf.trainable_variables(net1)
+        self._target_pointer = tf.Variable(0, trainable=False, name="target_pointer")
+        params1 = tf.global_variables(net1)
         params1 = sorted(params1, key=lambda k: k.name)
         params2 = tf.trainable_variables(net2)
         params2 = sorted(params2, key=lambda k: k.name)
         assert len(params1) == len(params2)
-        return tf.group([x1.assign(x2) for x1, x2 in zip(params1, params2)])
+        copy_ops = [tf.scatter_update(x1, self._target_pointer, x2) for x1, x2 in zip(params1, params2)]
+        with tf.control_dependencies(copy_ops):
+            return tf.assign(self._target_pointer, (self._target_pointer + 1) % self._n_net)
 
     def get_action(self, obs):
         """
@@ -186,7 +185,7 @@ class AADQN(Base):
         max_a = np.argmax(q, axis=1)
 
         # Epsilon greedy method.
-        global_step = self.sess.run(tf.train.get_global_step())
+        global_step = self.global_step
         epsilon = self._epsilon_schedule(global_step)
         batch_size = obs.shape[0]
         actions = np.random.randint(self._dim_act, size=batch_size)
@@ -198,8 +197,8 @@ class AADQN(Base):
         s_batch, a_batch, r_batch, d_batch, next_s_batch = databatch
 
         for _ in range(self._train_epoch):
-            weight, mat, inv_mat, _ = self.sess.run([self.weights, self.mat, self.inv_mat, self._train_op],
-                                                    feed_dict={
+            weight, mat, inv_mat, _ = self._run_with_metrics([self.weights, self.mat, self.inv_mat, self._train_op],
+                                                             feed_dict={
                 self._observation: s_batch,
                 self._action: a_batch,
                 self._reward: r_batch,
@@ -212,21 +211,10 @@ class AADQN(Base):
             # print(">>>> inv_mat:", inv_mat)
             # input()
 
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        global_step = self._increment_step()
 
         if global_step % self._save_model_freq == 0:
             self.save_model()
 
         if global_step % self._update_target_freq == 0:
             self.sess.run(self._update_target_op)
-
-        if global_step % self._log_freq == 0:
-            log = self.sess.run(self._log_op,
-                                feed_dict={
-                                    self._observation: s_batch,
-                                    self._action: a_batch,
-                                    self._reward: r_batch,
-                                    self._done: d_batch,
-                                    self._next_observation: next_s_batch
-                                })
-            self.sw.add_scalars("aadqn", log, global_step=global_step)
@@ -3,6 +3,7 @@ import numpy as np
 import tensorflow as tf
 
 from ..common.utils import assert_shape
+from ..utils import stacked_variable_getter
 from .base import Base
 
 
@@ -56,9 +57,12 @@ class AveDQN(Base):
             # self._qvals = self._dense(self._observation)
             self._qvals = self._value_fn(self._observation)
 
+        # The target networks share stacked [n_net, ...] variables, the newest copy is at `self._target_pointer - 1`.
+        # Only storage and refresh are fused: value_fn is an arbitrary network, so the ensemble is still
+        # evaluated as n_net forward passes, each reading one slice of the stacked variables.
         self._target_qvals = []
         for i in range(self._n_net):
-            with tf.variable_scope(f"target_{i}/qnet"):
+            with tf.variable_scope("target/qnet", reuse=tf.AUTO_REUSE, custom_getter=stacked_variable_getter(self._n_net, i)):
                 self._target_qvals.append(self._value_fn(self._next_observation))
 
     # def _dense(self, t):
@@ -89,30 +93,25 @@ class AveDQN(Base):
         self._train_op = self.optimizer.minimize(loss, var_list=trainable_variables)
 
         # Update target network.
-        update_target_operation = []
-        for i in reversed(range(1, self._n_net)):  # i=0表示最近的模型。
-            with tf.control_dependencies(update_target_operation):
-                update_target_operation.append(self._update_target(f"target_{i}/qnet", f"target_{i-1}/qnet"))
-
-        with tf.control_dependencies(update_target_operation):
-            update_target_operation.append(self._update_target("target_0/qnet", "main/qnet"))
-
-        self.update_target_op = update_target_operation
-        self._log_op = {"loss": loss}
+        self.update_target_op = self._update_target("target/qnet", "main/qnet")
+        self._register_metric("loss", loss)
 
     def _update_target(self, net1, net2):
-        """net1 = net2 
+        """Copy net2 into the oldest slot of the stacked net1 and advance the circular pointer.
 
         Arguments:
-            net1 {str} -- variable scope of net1.
+            net1 {str} -- variable scope of the stacked target networks.
             net2 {str} -- variable scope of net2
         """
-        params1 = tf.trainable_variables(net1)
+        self._target_pointer = tf.Variable(0, trainable=False, name="target_pointer")
+        params1 = tf.global_variables(net1)
         params1 = sorted(params1, key=lambda k: k.name)
         params2 = tf.trainable_variables(net2)
         params2 = sorted(params2, key=lambda k: k.name)
         assert len(params1) == len(params2)
-        return tf.group([x1.assign(x2) for x1, x2 in zip(params1, params2)])
+        copy_ops = [tf.scatter_update(x1, self._target_pointer, x2) for x1, x2 in zip(params1, params2)]
+        with tf.control_dependencies(copy_ops):
+            return tf.assign(self._target_pointer, (self._target_pointer + 1) % self._n_net)
 
     def get_action(self, obs):
         """Get actions according to the given observation.
@@ -127,7 +126,7 @@ class AveDQN(Base):
         max_a = np.argmax(q, axis=1)
 
         # Epsilon greedy method.
-        global_step = self.sess.run(tf.train.get_global_step())
+        global_step = self.global_step
         batch_size = obs.shape[0]
         actions = np.random.randint(self._dim_act, size=batch_size)
         idx = np.random.uniform(size=batch_size) > self._epsilon_schedule(global_step)
@@ -139,16 +138,16 @@ class AveDQN(Base):
         s_batch, a_batch, r_batch, d_batch, next_s_batch = databatch
 
         for _ in range(self._train_epoch):
-            self.sess.run(self._train_op,
-                          feed_dict={
-                              self._observation: s_batch,
-                              self._action: a_batch,
-                              self._reward: r_batch,
-                              self._done: d_batch,
-                              self._next_observation: next_s_batch
-                          })
+            self._run_with_metrics(self._train_op,
+                                   feed_dict={
+                                       self._observation: s_batch,
+                                       self._action: a_batch,
+                                       self._reward: r_batch,
+                                       self._done: d_batch,
+                                       self._next_observation: next_s_batch
+                                   })
 
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        global_step = self._increment_step()
 
         # Store model.
         if global_step % self._save_model_freq == 0:
@@ -157,14 +156,3 @@ class AveDQN(Base):
         # Update target policy.
         if global_step % self._update_target_freq == 0:
             self.sess.run(self.update_target_op)
-
-        if global_step % self._log_freq == 0:
-            log = self.sess.run(self._log_op,
-                                feed_dict={
-                                    self._observation: s_batch,
-                                    self._action: a_batch,
-                                    self._reward: r_batch,
-                                    self._done: d_batch,
-                                    self._next_observation: next_s_batch
-                                })
-            self.sw.add_scalars("avedqn", log, global_step=global_step)
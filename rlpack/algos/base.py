@@ -8,6 +8,9 @@ from tensorboardX import SummaryWriter
 class Base(ABC):
     """Algorithm base class."""
 
+    # Build variables as resource variables, required by `_build_multi_step`.
+    _use_resource = False
+
     def __init__(self, save_path=None, rnd=1):
         self.rnd = rnd
         self.save_path = save_path
@@ -19,12 +22,17 @@ class Base(ABC):
         # tf.Variable(0, name="global_step", trainable=False)
         # self.increment_global_step = tf.assign_add(tf.train.get_global_step(), 1)
         self.sw = SummaryWriter(log_dir=self.save_path)
+        self._stage_index = None
+        self._stage_loads = {}
+        self._metrics = {}
+        self._logged_step = None
 
-        # ------------------------ Build network ------------------------
-        self._build_network()
+        with tf.variable_scope(tf.get_variable_scope(), use_resource=self._use_resource):
+            # ------------------------ Build network ------------------------
+            self._build_network()
 
-        # ------------------------ Build algorithm ------------------------
-        self._build_algorithm()
+            # ------------------------ Build algorithm ------------------------
+            self._build_algorithm()
 
         # ------------------------ Initialize model store and reload. ------------------------
         self._prepare()
@@ -41,9 +49,12 @@ class Base(ABC):
 
     def _prepare(self):
         # ------------------------ 初始化保存。 ------------------------
-        self.saver = tf.train.Saver(max_to_keep=5)
-        tf.Variable(0, name="global_step", trainable=False)
+        # global_step须在Saver之前创建，才会随模型保存和恢复。
+        tf.Variable(0, name="global_step", trainable=False, dtype=tf.int64)
         self.increment_global_step = tf.assign_add(tf.train.get_global_step(), 1)
+        self._global_step_ph = tf.placeholder(tf.int64, [], "global_step_value")
+        self._sync_global_step = tf.assign(tf.train.get_global_step(), self._global_step_ph)
+        self.saver = tf.train.Saver(max_to_keep=5)
 
         # ------------------------ 初始化session. ------------------------
         conf = tf.ConfigProto(allow_soft_placement=True)
@@ -52,10 +63,19 @@ class Base(ABC):
 
         # ------------------------ 初始化变量。  ------------------------
         self.sess.run(tf.global_variables_initializer())
+        self.sess.run(tf.local_variables_initializer())
 
         # ------------------------ 如果有模型，加载模型。 ------------------------
         self.load_model()
 
+        # ------------------------ 训练步数在本地计数，只在保存模型时写入global_step变量。 ------------------------
+        self.global_step = self.sess.run(tf.train.get_global_step())
+
+    def _increment_step(self, n=1):
+        """Advance the host-side step counter by `n` and return the new value."""
+        self.global_step += n
+        return self.global_step
+
     @abstractmethod
     def get_action(self, obs):
         """Return action according to the observations.
@@ -76,7 +96,8 @@ class Base(ABC):
         """Save model to `save_path`."""
         save_dir = os.path.join(self.save_path, "model")
         os.makedirs(save_dir, exist_ok=True)
-        global_step = self.sess.run(tf.train.get_global_step())
+        global_step = self.global_step
+        self.sess.run(self._sync_global_step, feed_dict={self._global_step_ph: global_step})
         self.saver.save(
             self.sess,
             os.path.join(save_dir, "model"),
@@ -89,12 +110,196 @@ class Base(ABC):
         latest_checkpoint = tf.train.latest_checkpoint(os.path.join(self.save_path, "model"))
         if latest_checkpoint:
             print("## Loading model checkpoint {} ...".format(latest_checkpoint))
-            self.saver.restore(self.sess, latest_checkpoint)
+            try:
+                self.saver.restore(self.sess, latest_checkpoint)
+            except tf.errors.NotFoundError:
+                self._restore_partial(latest_checkpoint)
         else:
             print("## New start!")
 
+    def _restore_partial(self, checkpoint):
+        """Restore a checkpoint written by an older version that lacks some variables.
+
+        Variables found in the checkpoint are restored, the others keep their initial value.
+        Target networks saved as one variable per parameter are loaded into their flat variable.
+        A missing global_step is recovered from the checkpoint suffix `model-<step>`.
+        """
+        reader = tf.train.NewCheckpointReader(checkpoint)
+        saved = reader.get_variable_to_shape_map()
+        found = [v for v in tf.global_variables() if v.op.name in saved]
+        tf.train.Saver(found).restore(self.sess, checkpoint)
+
+        restored = {v.op.name for v in found}
+        for target in vars(self).values():
+            if isinstance(target, TargetNetwork) and target.restore_per_variable(self.sess, reader):
+                restored.add(target.flat_name)
+        missing = [v.op.name for v in tf.global_variables() if v.op.name not in restored]
+        print("## Variables not in checkpoint: {}".format(missing))
+
+        if "global_step" not in saved:
+            self.sess.run(self._sync_global_step, feed_dict={self._global_step_ph: int(checkpoint.rsplit("-", 1)[1])})
+
+    def _rollout_placeholder(self, dtype, shape, name=None, staged=False):
+        """Return a placeholder for one row-wise input of a rollout.
+
+        If `staged`, the placeholder defaults to rows `self._stage_index` of a local
+        staging variable. The rollout is then copied once per update by
+        `_stage_feed`, and each training step only feeds the minibatch indices.
+        It can still be fed directly, e.g. to compute actions.
+        """
+        if not staged:
+            return tf.placeholder(dtype, shape, name)
+
+        if self._stage_index is None:
+            self._stage_index = tf.placeholder(tf.int32, [None], "stage_index")
+        var = tf.Variable(tf.zeros([0, *shape[1:]], dtype), trainable=False, validate_shape=False,
+                          collections=[tf.GraphKeys.LOCAL_VARIABLES])
+        load_ph = tf.placeholder(dtype, shape)
+        ph = tf.placeholder_with_default(tf.gather(var, self._stage_index), shape, name)
+        self._stage_loads[ph] = (load_ph, tf.assign(var, load_ph, validate_shape=False))
+        return ph
+
+    def _stage_feed(self, feed_dict):
+        """Copy the staged entries of `feed_dict` into their staging variables in one run.
+
+        Return the remaining, unstaged entries, to be fed with `self._stage_index`.
+        """
+        staged = {k: v for k, v in feed_dict.items() if k in self._stage_loads}
+        if staged:
+            self.sess.run([self._stage_loads[k][1] for k in staged],
+                          feed_dict={self._stage_loads[k][0]: v for k, v in staged.items()})
+        return {k: v for k, v in feed_dict.items() if k not in self._stage_loads}
+
+    def _build_multi_step(self, phs, step_fn):
+        """Build an op running one training step per minibatch of stacked inputs in a single tf.while_loop.
+
+        Each placeholder in `phs` gets a stacked counterpart with a leading minibatch axis.
+        `step_fn(k, *inputs)` builds the networks and the step on the k-th minibatch, reusing
+        the existing variables, and returns the op of the step. It is called in the loop body
+        under a control dependency on `k`, so with resource variables every step reads the
+        variables written by the previous one.
+
+        Return (stacked placeholders, op).
+        """
+        assert self._use_resource, "multi-step updates require resource variables."
+        stacked_phs = [tf.placeholder(ph.dtype, [None, *ph.shape.as_list()], f"stacked_{i}") for i, ph in enumerate(phs)]
+
+        def body(k):
+            with tf.control_dependencies([k]):
+                step_op = step_fn(k, *[x[k] for x in stacked_phs])
+            with tf.control_dependencies([step_op]):
+                return k + 1
+
+        n = tf.shape(stacked_phs[0])[0]
+        op = tf.while_loop(lambda k: k < n, body, [tf.constant(0)], parallel_iterations=1)
+        return stacked_phs, op
+
+    def _minibatch_indices(self, n, batch_size=None):
+        """Shuffle range(n) and yield it in index arrays of `batch_size`; one array of all if None."""
+        indices = np.random.permutation(n)
+        batch_size = n if batch_size is None else batch_size
+        for start in range(0, n, batch_size):
+            yield indices[start: start + batch_size]
+
+    def _bootstrap_values(self, dones, earlystops, nextstates):
+        """State values `self.v` of `nextstates`, evaluated only where an episode is truncated and zero elsewhere.
+
+        For on-policy algorithms whose value network reads `self._obs`.
+        """
+        index = np.flatnonzero(np.asarray(earlystops).astype(bool) & ~np.asarray(dones).astype(bool))
+        nextvalues = np.zeros(len(dones))
+        if len(index) > 0:
+            nextvalues[index] = self.sess.run(self.v, feed_dict={self._obs: [nextstates[i] for i in index]})
+        return nextvalues
+
+    def _register_metric(self, name, tensor):
+        """Register a scalar tensor to be logged by `_run_with_metrics`."""
+        self._metrics[name] = tensor
+
+    def _run_with_metrics(self, fetches, feed_dict=None):
+        """Run `fetches` and return their values.
+
+        On logging steps, i.e. when the step about to be counted is a multiple of `self._log_freq`,
+        the registered metrics are fetched in the same run and written once under the class name.
+        They are never run otherwise.
+        """
+        step = self.global_step + 1
+        if not self._metrics or step % self._log_freq != 0 or self._logged_step == step:
+            return self.sess.run(fetches, feed_dict=feed_dict)
+
+        results, metrics = self.sess.run([fetches, self._metrics], feed_dict=feed_dict)
+        self.sw.add_scalars(type(self).__name__.lower(), metrics, global_step=step)
+        self._logged_step = step
+        return results
+
     def add_scalar(self, *args):
         return self.sw.add_scalar(*args)
 
     def add_scalars(self, *args):
         return self.sw.add_scalars(*args)
+
+
+class TargetNetwork(object):
+    """Target copy of the trainable variables under `main_scope`, stored in one flat variable.
+
+    Build the target network with the same function as the main one under
+    `tf.variable_scope(target_scope, custom_getter=target.getter)`; its parameters are
+    then slices of the flat variable, so a soft update or a hard copy is a single assign.
+    The main network must be built first. The target starts as a copy of the main network.
+    """
+
+    def __init__(self, main_scope, target_scope):
+        self._main_scope = main_scope
+        self._target_scope = target_scope
+        self._flat = None
+
+    def getter(self, getter, name, *args, **kwargs):
+        if self._flat is None:
+            self._build()
+        start, shape = self._offsets[name[len(self._target_scope) + 1:]]
+        return tf.reshape(self._flat[start: start + int(np.prod(shape))], shape)
+
+    def _build(self):
+        self._main_vars = sorted(tf.trainable_variables(self._main_scope), key=lambda v: v.name)
+        self._offsets = {}
+        start = 0
+        for var in self._main_vars:
+            shape = var.shape.as_list()
+            self._offsets[var.op.name[len(self._main_scope) + 1:]] = (start, shape)
+            start += int(np.prod(shape))
+
+        # 同initialized_value，但资源变量也适用。
+        init = [tf.cond(tf.is_variable_initialized(v), v.read_value, lambda v=v: v.initial_value)
+                for v in self._main_vars]
+        with tf.name_scope(None):
+            self._flat = tf.Variable(self._flatten(init), trainable=False, name=self.flat_name)
+
+    @property
+    def flat_name(self):
+        return f"{self._target_scope}/flat_params"
+
+    def restore_per_variable(self, sess, reader):
+        """Load the flat variable from a checkpoint `reader` holding the target as one variable per parameter,
+        as saved before the target was flattened. Return False if the checkpoint does not hold them all.
+        """
+        if self._flat is None:
+            return False
+        names = [f"{self._target_scope}/{rel}" for rel in sorted(self._offsets, key=lambda r: self._offsets[r][0])]
+        if not all(reader.has_tensor(name) for name in names):
+            return False
+        self._flat.load(np.concatenate([reader.get_tensor(name).ravel() for name in names]), sess)
+        return True
+
+    def _flatten(self, ts):
+        return tf.concat([tf.reshape(t, [-1]) for t in ts], axis=0)
+
+    def update_op(self, rho=0.):
+        """Op setting target = rho * target + (1 - rho) * main, a hard copy if `rho` is 0.
+
+        Variables are read when the op is created, so it respects the control dependencies
+        it is created under.
+        """
+        main = self._flatten([v.read_value() for v in self._main_vars])
+        if rho == 0:
+            return tf.assign(self._flat, main)
+        return tf.assign(self._flat, rho * self._flat.read_value() + (1 - rho) * main)
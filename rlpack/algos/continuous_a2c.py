@@ -3,6 +3,7 @@ import math
 import numpy as np
 import tensorflow as tf
 
+from ..utils import discount_cumsum
 from .base import Base
 
 
@@ -83,7 +84,7 @@ class A2C(Base):
         self.critic_loss = tf.reduce_mean(tf.square(self.state_value - self.span_reward))
 
         # Update by adam.
-        self.train_critic_op = self.critic_optimizer.minimize(self.critic_loss, global_step=tf.train.get_global_step())
+        self.train_critic_op = self.critic_optimizer.minimize(self.critic_loss)
 
         # ---------- Build action. ----------
         self.sampled_act = (self.mu + tf.exp(self.log_var / 2.0) * tf.random_normal(shape=[self._dim_act], dtype=tf.float32))
@@ -102,29 +103,21 @@ class A2C(Base):
             - update_ratio: float scalar in (0, 1).
 
         Returns:
-            - training infomation.
+            - training infomation. global_step counts calls to update, not critic minibatches.
         """
         s_batch, a_batch, r_batch, d_batch = minibatch
         assert s_batch.shape == (self.n_env, self.trajectory_length + 1, *self._dim_obs)
 
         # Compute advantage batch.
-        advantage_batch = np.empty([self.n_env, self.trajectory_length], dtype=np.float32)
-        target_value_batch = np.empty([self.n_env, self.trajectory_length], dtype=np.float32)
+        state_value_batch = self.sess.run(self.state_value, feed_dict={
+            self.observation: s_batch.reshape(self.n_env * (self.trajectory_length + 1), *self._dim_obs)})
+        state_value_batch = state_value_batch.reshape(self.n_env, self.trajectory_length + 1)
 
-        for i in range(self.n_env):
-            state_value_batch = self.sess.run(self.state_value, feed_dict={self.observation: s_batch[i, ...]})
+        delta_value_batch = r_batch + self.discount * (1 - d_batch) * state_value_batch[:, 1:] - state_value_batch[:, :-1]
+        advantage_batch = discount_cumsum(delta_value_batch, self.discount * self.gae * (1 - d_batch)).astype(np.float32)
 
-            delta_value_batch = r_batch[i, :] + self.discount * (1 - d_batch[i, :]) * state_value_batch[1:] - state_value_batch[:-1]
-            assert state_value_batch.shape == (self.trajectory_length + 1,)
-            assert delta_value_batch.shape == (self.trajectory_length,)
-
-            last_advantage = 0
-            for t in reversed(range(self.trajectory_length)):
-                advantage_batch[i, t] = delta_value_batch[t] + self.discount * self.gae * (1 - d_batch[i, t]) * last_advantage
-                last_advantage = advantage_batch[i, t]
-
-            # Compute target value.
-            target_value_batch[i, :] = state_value_batch[:-1] + advantage_batch[i, :]
+        # Compute target value.
+        target_value_batch = state_value_batch[:, :-1] + advantage_batch
 
         # Flat the batch values.
         s_batch = s_batch[:, :-1, ...].reshape(self.n_env * self.trajectory_length, *self._dim_obs)
@@ -165,14 +158,15 @@ class A2C(Base):
                 try:
                     mb_s, mb_target_value = next(batch_generator)
 
-                    _, global_step, critic_loss = self.sess.run([self.train_critic_op, tf.train.get_global_step(), self.critic_loss],
-                                                                feed_dict={
-                                                                self.observation: mb_s,
-                                                                self.span_reward: mb_target_value})
+                    _, critic_loss = self.sess.run([self.train_critic_op, self.critic_loss],
+                                                   feed_dict={
+                                                   self.observation: mb_s,
+                                                   self.span_reward: mb_target_value})
                 except StopIteration:
                     del batch_generator
                     break
 
+        global_step = self._increment_step()
         return {"critic_loss": critic_loss, "global_step": global_step}
 
     def get_action(self, ob):
@@ -161,7 +161,7 @@ class SAC(Base):
             self.next_observation: next_s_batch})
 
         # Save model.
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        global_step = self._increment_step()
         if global_step % self.save_model_freq == 0:
             self.save_model()
 
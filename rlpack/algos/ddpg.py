@@ -2,7 +2,7 @@
 import numpy as np
 import tensorflow as tf
 
-from .base import Base
+from .base import Base, TargetNetwork
 
 
 class DDPG(Base):
@@ -15,9 +15,12 @@ class DDPG(Base):
                  discount=0.99,
                  train_epoch=1, policy_lr=1e-3, value_lr=1e-3,
                  epsilon_schedule=lambda x: max(0.1, (1e4-x) / 1e4),
-                 target_update_rate=0.995,
+                 target_update_rate=0.995, multi_step=False,
                  save_path="./log", log_freq=10, save_model_freq=100,
                  ):
+        """
+        multi_step：构建update_stacked，在一次sess.run中对多个minibatch依次训练value、policy并更新target。
+        """
 
         self._dim_obs = dim_obs
         self._dim_act = dim_act
@@ -31,6 +34,8 @@ class DDPG(Base):
         self._value_lr = value_lr
 
         self._update_target_rate = target_update_rate
+        self._multi_step = multi_step
+        self._use_resource = multi_step
 
         self._save_model_freq = save_model_freq
         self._log_freq = log_freq
@@ -46,44 +51,68 @@ class DDPG(Base):
         self._obs2 = tf.placeholder(tf.float32, [None, *self._dim_obs], name="next_observation")
         self.all_phs = [self._obs, self._act, self._reward, self._done, self._obs2]
 
-        with tf.variable_scope("main/policy"):
-            self.act = self._policy_fn(self._obs)
+        self._target_policy = TargetNetwork("main/policy", "target/policy")
+        self._target_value = TargetNetwork("main/value", "target/value")
+        self.act, self.q_act = self._build_policy_q(self._obs)
+        self.q, self.q_targ = self._build_q(self._obs, self._act, self._obs2)
 
-        with tf.variable_scope("main/value"):
-            self.q = self._value_fn(self._obs, self._act)
+    def _build_policy_q(self, obs):
+        with tf.variable_scope("main/policy", reuse=tf.AUTO_REUSE):
+            act = self._policy_fn(obs)
 
+        with tf.variable_scope("main/value", reuse=tf.AUTO_REUSE):
+            q_act = self._value_fn(obs, act)
+        return act, q_act
+
+    def _build_q(self, obs, act, obs2):
         with tf.variable_scope("main/value", reuse=True):
-            self.q_act = self._value_fn(self._obs, self.act)
+            q = self._value_fn(obs, act)
 
-        with tf.variable_scope("target/policy"):
-            self.act_targ = self._policy_fn(self._obs2)
+        with tf.variable_scope("target/policy", custom_getter=self._target_policy.getter):
+            act_targ = self._policy_fn(obs2)
 
-        with tf.variable_scope("target/value"):
-            self.q_targ = self._value_fn(self._obs2, self.act_targ)
+        with tf.variable_scope("target/value", custom_getter=self._target_value.getter):
+            q_targ = self._value_fn(obs2, act_targ)
+        return q, q_targ
 
     def _build_algorithm(self):
         """Build networks for algorithm."""
+        self._policy_optimizer = tf.train.AdamOptimizer(self._policy_lr)
+        self._value_optimizer = tf.train.AdamOptimizer(self._value_lr)
+
+        self.train_policy_op = self._build_policy_train_op(self.q_act)
+        self.train_value_op = self._build_value_train_op(self.q, self.q_targ, self._reward, self._done)
+
+        self._update_target_op = tf.group(self._target_policy.update_op(self._update_target_rate),
+                                          self._target_value.update_op(self._update_target_rate))
+        self._init_target_op = tf.group(self._target_policy.update_op(), self._target_value.update_op())
+
+        if self._multi_step:
+            self._stacked_phs, self._multi_step_op = self._build_multi_step(self.all_phs, self._build_one_step)
+
+    def _build_policy_train_op(self, q_act):
         policy_vars = tf.trainable_variables("main/policy")
-        value_vars = tf.trainable_variables("main/value")
+        policy_loss = -tf.reduce_mean(q_act)
+        return self._policy_optimizer.minimize(policy_loss, var_list=policy_vars)
 
-        policy_loss = -tf.reduce_mean(self.q_act)
-        qbackup = tf.stop_gradient(self._reward + self._discount * (1 - self._done) * self.q_targ)
-        value_loss = tf.reduce_mean(tf.squared_difference(self.q, qbackup))
+    def _build_value_train_op(self, q, q_targ, reward, done):
+        value_vars = tf.trainable_variables("main/value")
+        qbackup = tf.stop_gradient(reward + self._discount * (1 - done) * q_targ)
+        value_loss = tf.reduce_mean(tf.squared_difference(q, qbackup))
+        return self._value_optimizer.minimize(value_loss, var_list=value_vars)
 
-        self.train_policy_op = tf.train.AdamOptimizer(self._policy_lr).minimize(policy_loss, var_list=policy_vars)
-        self.train_value_op = tf.train.AdamOptimizer(self._value_lr).minimize(value_loss, var_list=value_vars)
+    def _build_one_step(self, k, obs, act, reward, done, obs2):
+        """Value step, policy step on the updated value, then the target update, on the k-th stacked minibatch."""
+        q, q_targ = self._build_q(obs, act, obs2)
+        train_value_op = self._build_value_train_op(q, q_targ, reward, done)
 
-        def _update_target(net1, net2, rho=0):
-            variables1 = tf.trainable_variables(net1)
-            variables1 = sorted(variables1, key=lambda v: v.name)
-            variables2 = tf.trainable_variables(net2)
-            variables2 = sorted(variables2, key=lambda v: v.name)
-            assert len(variables1) == len(variables2)
-            return [v1.assign(rho*v1 + (1-rho)*v2) for v1, v2 in zip(variables1, variables2)]
+        with tf.control_dependencies([train_value_op]):
+            _, q_act = self._build_policy_q(obs)
+            train_policy_op = self._build_policy_train_op(q_act)
 
-        self._update_target_op = tf.group(_update_target("target/policy", "main/policy", rho=self._update_target_rate)
-                                          + _update_target("target/value", "main/value", rho=self._update_target_rate))
-        self._init_target_op = tf.group(_update_target("target/policy", "main/policy") + _update_target("target/value", "main/value"))
+        with tf.control_dependencies([train_policy_op]):
+            return tf.group(self._target_policy.update_op(self._update_target_rate),
+                            self._target_value.update_op(self._update_target_rate))
 
     def update(self, databatch):
         s_batch, a_batch, r_batch, d_batch, next_s_batch = databatch
@@ -97,11 +126,23 @@ class DDPG(Base):
 
         self.sess.run(self._update_target_op)
 
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        global_step = self._increment_step()
 
         if global_step % self._save_model_freq == 0:
             self.save_model()
 
+    def update_stacked(self, databatch):
+        """databatch同update，每个元素多一个表示minibatch的第0维。每个minibatch训练一步并更新target，计为一次update。
+        与update不同，不受train_epoch影响：train_epoch>1时与update不等价。
+        """
+        n_step = len(databatch[0])
+        self.sess.run(self._multi_step_op, feed_dict=dict(zip(self._stacked_phs, databatch)))
+
+        global_step = self._increment_step(n_step)
+
+        if global_step // self._save_model_freq != (global_step - n_step) // self._save_model_freq:
+            self.save_model()
+
     def get_action(self, obs):
         """动作添加高斯扰动。
         """
@@ -2,13 +2,14 @@ import numpy as np
 import tensorflow as tf
 
 
-from .base import Base
+from ..utils import observation_input
+from .base import Base, TargetNetwork
 
 
 class DistDQN(Base):
     def __init__(self,
                  rnd=0,
-                 dim_obs=None, n_act=None,
+                 dim_obs=None, n_act=None, obs_dtype=np.float32,
                  policy_fn=None,
                  discount=0.99,
                  update_target_rate=0.9,
@@ -24,6 +25,7 @@ class DistDQN(Base):
         self._split_points = np.linspace(self._vmin, self._vmax, self._n_histogram)
 
         self._dim_obs = dim_obs
+        self._obs_dtype = obs_dtype
         self._n_act = n_act
         self._policy_fn = policy_fn
         self._discount = discount
@@ -39,16 +41,18 @@ class DistDQN(Base):
 
     def _build_network(self):
         """Build networks for algorithm."""
-        self._obs = tf.placeholder(shape=[None, *self._dim_obs], dtype=tf.float32, name="observation")
+        self._obs, obs = observation_input(self._dim_obs, self._obs_dtype, name="observation")
         self._act = tf.placeholder(tf.int32, [None], name="action")
-        self._new_p_act = tf.placeholder(tf.float32, [None, self._n_histogram], name="next_input")
-        self._obs2 = tf.placeholder(shape=[None, *self._dim_obs], dtype=tf.float32, name="next_observation")
+        self._rew = tf.placeholder(tf.float32, [None], name="reward")
+        self._done = tf.placeholder(tf.float32, [None], name="done")
+        self._obs2, obs2 = observation_input(self._dim_obs, self._obs_dtype, name="next_observation")
 
         with tf.variable_scope("main"):
-            self.logits = self._policy_fn(self._obs)
+            self.logits = self._policy_fn(obs)
 
-        with tf.variable_scope("target"):
-            self.logits_targ = tf.stop_gradient(self._policy_fn(self._obs2))
+        self._target = TargetNetwork("main", "target")
+        with tf.variable_scope("target", custom_getter=self._target.getter):
+            self.logits_targ = tf.stop_gradient(self._policy_fn(obs2))
 
     def _build_algorithm(self):
         """Build networks for algorithm."""
@@ -58,6 +62,8 @@ class DistDQN(Base):
         self._p_act = tf.nn.softmax(tf.reshape(self.logits, [-1, self._n_act, self._n_histogram]))
         self._p_act_targ = tf.nn.softmax(tf.reshape(self.logits_targ, [-1, self._n_act, self._n_histogram]))
 
+        self._new_p_act = tf.stop_gradient(self._project_target(batch_size))
+
         action_index = tf.stack([tf.range(batch_size), self._act], axis=1)
         self.action_probs = tf.gather_nd(self._p_act, action_index)
         self.action_probs_clip = tf.clip_by_value(self.action_probs, 0.00001, 0.99999)
@@ -66,19 +72,34 @@ class DistDQN(Base):
         self.train_policy_op = tf.train.AdamOptimizer(self._policy_lr).minimize(loss, var_list=value_vars)
 
         # Update target network.
-        def _update_target(net1, net2, rho=0):
-            params1 = tf.trainable_variables(net1)
-            params1 = sorted(params1, key=lambda v: v.name)
-            params2 = tf.trainable_variables(net2)
-            params2 = sorted(params2, key=lambda v: v.name)
-            assert len(params1) == len(params2)
-            update_ops = []
-            for param1, param2 in zip(params1, params2):
-                update_ops.append(param1.assign(rho*param1 + (1-rho)*param2))
-            return update_ops
-
-        self.update_target_op = _update_target("target", "main", rho=self._update_target_rate)
-        self.init_target_op = _update_target("target", "main")
+        self.update_target_op = self._target.update_op(self._update_target_rate)
+        self.init_target_op = self._target.update_op()
+        with tf.control_dependencies([self.train_policy_op]):
+            self.train_and_update_target_op = self._target.update_op(self._update_target_rate)
+
+    def _project_target(self, batch_size):
+        """Project the target distribution of the greedy next action onto the support, in float64.
+
+        Like the per-sample loop it replaces, an atom landing exactly on a support point gets
+        zero mass, since its lower and upper neighbours coincide.
+        """
+        split_points = tf.constant(self._split_points, dtype=tf.float64)
+        next_q_vals = tf.reduce_sum(self._p_act_targ * tf.cast(split_points, tf.float32), axis=-1)
+        best_action = tf.argmax(next_q_vals, axis=1, output_type=tf.int32)
+        prob = tf.gather_nd(self._p_act_targ, tf.stack([tf.range(batch_size), best_action], axis=1))
+        prob = tf.cast(prob, tf.float64)
+
+        rew = tf.cast(self._rew, tf.float64)[:, None]
+        not_done = 1 - tf.cast(self._done, tf.float64)[:, None]
+        projection = (tf.clip_by_value(rew + self._discount * not_done * split_points,
+                                       self._vmin, self._vmax) - self._vmin) / self._delta
+        l, u = tf.floor(projection), tf.ceil(projection)
+
+        offset = (tf.range(batch_size) * self._n_histogram)[:, None]
+        n_segments = batch_size * self._n_histogram
+        m = tf.unsorted_segment_sum(prob * (u - projection), tf.to_int32(l) + offset, n_segments) + \
+            tf.unsorted_segment_sum(prob * (projection - l), tf.to_int32(u) + offset, n_segments)
+        return tf.cast(tf.reshape(m, [-1, self._n_histogram]), tf.float32)
 
     def get_action(self, obs):
         probs = self.sess.run(self._p_act, feed_dict={self._obs: obs})
@@ -88,38 +109,21 @@ class DistDQN(Base):
 
     def update(self, databatch):
         s_batch, a_batch, r_batch, d_batch, next_s_batch = databatch
-        next_q_probs = self.sess.run(self._p_act_targ, feed_dict={self._obs2: next_s_batch})
-        next_q_vals = np.sum(next_q_probs * self._split_points, axis=-1)
-        best_action = np.argmax(next_q_vals, axis=1)
-
-        def compute_histogram(reward, probability, done):
-            m = np.zeros(self._n_histogram, dtype=np.float32)
-            projection = (np.clip(reward + self._discount * (1 - done) * self._split_points,
-                                  self._vmin, self._vmax) - self._vmin) / self._delta
-            for p, b in zip(probability, projection):
-                l = np.floor(b).astype(np.int32)
-                u = np.ceil(b).astype(np.int32)
-                m[l] += p * (u - b)
-                m[u] += p * (b - l)
-            return m
-
-        new_p_act = []
-        for rew, prob, d in zip(r_batch, next_q_probs[np.arange(best_action.shape[0]), best_action], d_batch):
-            new_p_act.append(compute_histogram(rew, prob, d))
-        new_p_act = np.array(new_p_act)
-
-        for _ in range(self._train_epoch):
-            self.sess.run(self.train_policy_op,
-                          feed_dict={
-                              self._obs: s_batch,
-                              self._act: a_batch,
-                              self._new_p_act: new_p_act
-                          })
-
-        self.sess.run(self.update_target_op)
+        inputs = {
+            self._obs: s_batch,
+            self._act: a_batch,
+            self._rew: r_batch,
+            self._done: d_batch,
+            self._obs2: next_s_batch,
+        }
 
-        # Save model.
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        for _ in range(self._train_epoch - 1):
+            self.sess.run(self.train_policy_op, feed_dict=inputs)
 
+        # The last epoch and the target update share one run.
+        self.sess.run(self.train_and_update_target_op, feed_dict=inputs)
+        global_step = self._increment_step()
+
+        # Save model.
         if global_step % self._save_model_freq == 0:
             self.save_model()
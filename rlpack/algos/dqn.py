@@ -2,20 +2,26 @@
 import numpy as np
 import tensorflow as tf
 
-from .base import Base
+from ..utils import float_observation, observation_input
+from .base import Base, TargetNetwork
 
 
 class DQN(Base):
     def __init__(self,
                  rnd=0,
-                 dim_obs=None, n_act=None,
+                 dim_obs=None, n_act=None, obs_dtype=np.float32,
                  value_fn=None,
                  discount=0.99,
                  train_epoch=1, value_lr=1e-3,
                  update_target_rate=0.8, max_grad_norm=40,
+                 multi_step=False,
                  save_path="./log", log_freq=10, save_model_freq=1000,
                  ):
+        """
+        multi_step：构建update_stacked，在一次sess.run中对多个minibatch依次训练并更新target。
+        """
         self._dim_obs = dim_obs
+        self._obs_dtype = obs_dtype
         self._n_act = n_act
         self._value_fn = value_fn
 
@@ -24,6 +30,8 @@ class DQN(Base):
         self._value_lr = value_lr
         self._update_target_rate = update_target_rate
         self._max_grad_norm = max_grad_norm
+        self._multi_step = multi_step
+        self._use_resource = multi_step
 
         self._log_freq = log_freq
         self._save_model_freq = save_model_freq
@@ -33,53 +41,59 @@ class DQN(Base):
 
     def _build_network(self):
         """Build networks for algorithm."""
-        self._obs = tf.placeholder(tf.float32, shape=[None, *self._dim_obs], name="observation")
+        self._obs, obs = observation_input(self._dim_obs, self._obs_dtype, name="observation")
         self._act = tf.placeholder(dtype=tf.int32, shape=[None], name="action")
         self._reward = tf.placeholder(dtype=tf.float32, shape=[None], name="reward")
         self._done = tf.placeholder(dtype=tf.float32, shape=[None], name="done")
-        self._obs2 = tf.placeholder(dtype=tf.float32, shape=[None, *self._dim_obs], name="next_observation")
+        self._obs2, obs2 = observation_input(self._dim_obs, self._obs_dtype, name="next_observation")
         self.all_phs = [self._obs, self._act, self._reward, self._done, self._obs2]
 
-        with tf.variable_scope("main/q"):
-            self.q = self._value_fn(self._obs)
+        self._target = TargetNetwork("main/q", "target/q")
+        self.q, self.q_targ = self._build_q(obs, obs2)
 
-        with tf.variable_scope("target/q"):
-            self.q_targ = self._value_fn(self._obs2)
+    def _build_q(self, obs, obs2):
+        with tf.variable_scope("main/q", reuse=tf.AUTO_REUSE):
+            q = self._value_fn(obs)
+
+        with tf.variable_scope("target/q", custom_getter=self._target.getter):
+            q_targ = self._value_fn(obs2)
+        return q, q_targ
 
     def _build_algorithm(self):
         """Build networks for algorithm."""
+        self._optimizer = tf.train.AdamOptimizer(self._value_lr)
+        self._train_op = self._build_train_op(self.q, self.q_targ, self._act, self._reward, self._done)
+
+        # Update target network.
+        self.update_target_op = self._target.update_op(self._update_target_rate)
+        self.init_target_op = self._target.update_op()
 
+        if self._multi_step:
+            self._stacked_phs, self._multi_step_op = self._build_multi_step(self.all_phs, self._build_one_step)
+
+    def _build_train_op(self, q, q_targ, act, reward, done):
         value_vars = tf.trainable_variables("main/q")
 
         # Compute the state value.
-        batch_size = tf.shape(self._done)[0]
-        action_index = tf.stack([tf.range(batch_size), self._act], axis=1)
-        action_q = tf.gather_nd(self.q, action_index)
+        batch_size = tf.shape(done)[0]
+        action_index = tf.stack([tf.range(batch_size), act], axis=1)
+        action_q = tf.gather_nd(q, action_index)
 
         # Compute back up.
-        q_backup = tf.stop_gradient(self._reward + self._discount * (1 - self._done) * tf.reduce_max(self.q_targ, axis=1))
+        q_backup = tf.stop_gradient(reward + self._discount * (1 - done) * tf.reduce_max(q_targ, axis=1))
 
         # Compute loss and optimize the object.
         loss = tf.reduce_mean(tf.squared_difference(q_backup, action_q))   # 损失值。
 
         grads = tf.gradients(loss, value_vars)
         clipped_grads, _ = tf.clip_by_global_norm(grads, self._max_grad_norm)
-        self._train_op = tf.train.AdamOptimizer(self._value_lr).apply_gradients(zip(clipped_grads, value_vars))
+        return self._optimizer.apply_gradients(zip(clipped_grads, value_vars))
 
-        # Update target network.
-        def _update_target(net1, net2, rho=0):
-            params1 = tf.trainable_variables(net1)
-            params1 = sorted(params1, key=lambda v: v.name)
-            params2 = tf.trainable_variables(net2)
-            params2 = sorted(params2, key=lambda v: v.name)
-            assert len(params1) == len(params2)
-            update_ops = []
-            for param1, param2 in zip(params1, params2):
-                update_ops.append(param1.assign(rho*param1 + (1-rho)*param2))
-            return update_ops
-
-        self.update_target_op = _update_target("target/q", "main/q", rho=self._update_target_rate)
-        self.init_target_op = _update_target("target/q", "main/q")
+    def _build_one_step(self, k, obs, act, reward, done, obs2):
+        """One gradient step followed by the target update, on the k-th stacked minibatch."""
+        q, q_targ = self._build_q(float_observation(obs), float_observation(obs2))
+        with tf.control_dependencies([self._build_train_op(q, q_targ, act, reward, done)]):
+            return self._target.update_op(self._update_target_rate)
 
     def get_action(self, obs):
         q = self.sess.run(self.q, feed_dict={self._obs: obs})
@@ -95,7 +109,19 @@ class DQN(Base):
 
         self.sess.run(self.update_target_op)
 
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        global_step = self._increment_step()
 
         if global_step % self._save_model_freq == 0:
             self.save_model()
+
+    def update_stacked(self, databatch):
+        """databatch同update，每个元素多一个表示minibatch的第0维。每个minibatch训练一步并更新target，计为一次update。
+        与update不同，不受train_epoch影响：train_epoch>1时与update不等价。
+        """
+        n_step = len(databatch[0])
+        self.sess.run(self._multi_step_op, feed_dict=dict(zip(self._stacked_phs, databatch)))
+
+        global_step = self._increment_step(n_step)
+
+        if global_step // self._save_model_freq != (global_step - n_step) // self._save_model_freq:
+            self.save_model()
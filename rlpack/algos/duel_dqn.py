@@ -1,20 +1,27 @@
 import numpy as np
 import tensorflow as tf
 
-from .base import Base
+from ..utils import concat_batch_call, float_observation, observation_input
+from .base import Base, TargetNetwork
 
 
 class DuelDQN(Base):
     def __init__(self,
                  rnd=0,
-                 dim_obs=None, n_act=None,
+                 dim_obs=None, n_act=None, obs_dtype=np.float32,
                  value_fn=None,
                  discount=0.99,
                  train_epoch=1, value_lr=1e-3,
                  update_target_rate=0.8, max_grad_norm=40,
+                 multi_step=False, concat_forward=False,
                  save_path="./log", log_freq=10, save_model_freq=1000,
                  ):
+        """
+        multi_step：构建update_stacked，在一次sess.run中对多个minibatch依次训练并更新target。
+        concat_forward：训练时把obs和obs2沿batch维拼接，只做一次main网络前向再切分。
+        """
         self._dim_obs = dim_obs
+        self._obs_dtype = obs_dtype
         self._n_act = n_act
         self._value_fn = value_fn
 
@@ -23,6 +30,9 @@ class DuelDQN(Base):
         self._value_lr = value_lr
         self._update_target_rate = update_target_rate
         self._max_grad_norm = max_grad_norm
+        self._multi_step = multi_step
+        self._use_resource = multi_step
+        self._concat_forward = concat_forward
 
         self._log_freq = log_freq
         self._save_model_freq = save_model_freq
@@ -32,60 +42,79 @@ class DuelDQN(Base):
 
     def _build_network(self):
         """Build networks for algorithm."""
-        self._obs = tf.placeholder(tf.float32, shape=[None, *self._dim_obs], name="observation")
+        self._obs, obs = observation_input(self._dim_obs, self._obs_dtype, name="observation")
         self._act = tf.placeholder(dtype=tf.int32, shape=[None], name="action")
         self._reward = tf.placeholder(dtype=tf.float32, shape=[None], name="reward")
         self._done = tf.placeholder(dtype=tf.float32, shape=[None], name="done")
-        self._obs2 = tf.placeholder(dtype=tf.float32, shape=[None, *self._dim_obs], name="next_observation")
+        self._obs2, obs2 = observation_input(self._dim_obs, self._obs_dtype, name="next_observation")
         self.all_phs = [self._obs, self._act, self._reward, self._done, self._obs2]
 
-        with tf.variable_scope("main"):
-            self.v, self.adv = self._value_fn(self._obs)
-
-        with tf.variable_scope("main", reuse=True):
-            self.v2, self.adv2 = self._value_fn(self._obs2)
-            self.v2 = tf.stop_gradient(self.v2)
-            self.adv2 = tf.stop_gradient(self.adv2)
-
-        with tf.variable_scope("target"):
-            self.v_targ, self.adv_targ = self._value_fn(self._obs2)
-            self.v_targ = tf.stop_gradient(self.v_targ)
-            self.adv_targ = tf.stop_gradient(self.adv_targ)
+        self._target = TargetNetwork("main", "target")
+        self._q_train, self.q2, self.q_targ = self._build_q(obs, obs2)
+
+        # 拼接前向依赖obs2，get_action只喂obs，需要单独的前向。
+        if self._concat_forward:
+            with tf.variable_scope("main", reuse=True):
+                v, adv = self._value_fn(obs)
+            self.q = v + (adv - tf.reduce_mean(adv, axis=1, keepdims=True))
+        else:
+            self.q = self._q_train
+
+    def _build_q(self, obs, obs2):
+        if self._concat_forward:
+            with tf.variable_scope("main", reuse=tf.AUTO_REUSE):
+                (v, adv), (v2, adv2) = concat_batch_call(self._value_fn, (obs,), (obs2,))
+        else:
+            with tf.variable_scope("main", reuse=tf.AUTO_REUSE):
+                v, adv = self._value_fn(obs)
+
+            with tf.variable_scope("main", reuse=True):
+                v2, adv2 = self._value_fn(obs2)
+        v2 = tf.stop_gradient(v2)
+        adv2 = tf.stop_gradient(adv2)
+
+        with tf.variable_scope("target", custom_getter=self._target.getter):
+            v_targ, adv_targ = self._value_fn(obs2)
+            v_targ = tf.stop_gradient(v_targ)
+            adv_targ = tf.stop_gradient(adv_targ)
+
+        q = v + (adv - tf.reduce_mean(adv, axis=1, keepdims=True))
+        q2 = v2 + (adv2 - tf.reduce_mean(adv2, axis=1, keepdims=True))
+        q_targ = v_targ + (adv_targ - tf.reduce_mean(adv_targ, axis=1, keepdims=True))
+        return q, q2, q_targ
 
     def _build_algorithm(self):
         """Build networks for algorithm."""
-        value_vars = tf.trainable_variables("main")
+        self._optimizer = tf.train.AdamOptimizer(self._value_lr)
+        self.train_op = self._build_train_op(self._q_train, self.q2, self.q_targ, self._act, self._reward, self._done)
+
+        # Update target network.
+        self.update_target_op = self._target.update_op(self._update_target_rate)
+        self.init_target_op = self._target.update_op()
 
-        batch_size = tf.shape(self._obs)[0]
-        self.q = self.v + (self.adv - tf.reduce_mean(self.adv, axis=1, keepdims=True))
-        self.q2 = self.v2 + (self.adv2 - tf.reduce_mean(self.adv2, axis=1, keepdims=True))
-        self.q_targ = self.v_targ + (self.adv_targ - tf.reduce_mean(self.adv_targ, axis=1, keepdims=True))
+        if self._multi_step:
+            self._stacked_phs, self._multi_step_op = self._build_multi_step(self.all_phs, self._build_one_step)
 
-        max_act = tf.argmax(self.q2, axis=1, output_type=tf.int32)
+    def _build_train_op(self, q, q2, q_targ, act, reward, done):
+        value_vars = tf.trainable_variables("main")
+
+        batch_size = tf.shape(q)[0]
+        max_act = tf.argmax(q2, axis=1, output_type=tf.int32)
         act_index = tf.stack([tf.range(batch_size), max_act], axis=1)
-        q_backup = self._reward + (1 - self._done) * self._discount * tf.gather_nd(self.q_targ, act_index)
+        q_backup = reward + (1 - done) * self._discount * tf.gather_nd(q_targ, act_index)
 
-        act_index = tf.stack([tf.range(batch_size), self._act], axis=1)
-        action_q = tf.gather_nd(self.q, act_index)
+        act_index = tf.stack([tf.range(batch_size), act], axis=1)
+        action_q = tf.gather_nd(q, act_index)
 
         loss = tf.reduce_mean(tf.squared_difference(q_backup, action_q))
 
-        self.train_op = tf.train.AdamOptimizer(self._value_lr).minimize(loss, var_list=value_vars)
+        return self._optimizer.minimize(loss, var_list=value_vars)
 
-        # Update target network.
-        def _update_target(net1, net2, rho=0):
-            params1 = tf.trainable_variables(net1)
-            params1 = sorted(params1, key=lambda v: v.name)
-            params2 = tf.trainable_variables(net2)
-            params2 = sorted(params2, key=lambda v: v.name)
-            assert len(params1) == len(params2)
-            update_ops = []
-            for param1, param2 in zip(params1, params2):
-                update_ops.append(param1.assign(rho*param1 + (1-rho)*param2))
-            return update_ops
-
-        self.update_target_op = _update_target("target", "main", rho=self._update_target_rate)
-        self.init_target_op = _update_target("target", "main")
+    def _build_one_step(self, k, obs, act, reward, done, obs2):
+        """One gradient step followed by the target update, on the k-th stacked minibatch."""
+        q, q2, q_targ = self._build_q(float_observation(obs), float_observation(obs2))
+        with tf.control_dependencies([self._build_train_op(q, q2, q_targ, act, reward, done)]):
+            return self._target.update_op(self._update_target_rate)
 
     def get_action(self, obs):
         """Get actions according to the given observation.
@@ -108,7 +137,19 @@ class DuelDQN(Base):
 
         self.sess.run(self.update_target_op)
 
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        global_step = self._increment_step()
 
         if global_step % self._save_model_freq == 0:
             self.save_model()
+
+    def update_stacked(self, databatch):
+        """databatch同update，每个元素多一个表示minibatch的第0维。每个minibatch训练一步并更新target，计为一次update。
+        与update不同，不受train_epoch影响：train_epoch>1时与update不等价。
+        """
+        n_step = len(databatch[0])
+        self.sess.run(self._multi_step_op, feed_dict=dict(zip(self._stacked_phs, databatch)))
+
+        global_step = self._increment_step(n_step)
+
+        if global_step // self._save_model_freq != (global_step - n_step) // self._save_model_freq:
+            self.save_model()
@@ -7,6 +7,7 @@
 import numpy as np
 import tensorflow as tf
 
+from ..utils import discount_cumsum
 from .base import Base
 
 
@@ -57,21 +58,14 @@ class PG(Base):
         for _ in range(self._train_epoch):
             self.sess.run(self.train_policy_op, feed_dict=inputs)
 
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        global_step = self._increment_step()
 
     def _parse_databatch(self, states, actions, rewards, dones, earlystops, nextstates):
 
-        batch_size = len(dones)
-        returns = np.zeros(batch_size)
+        dones = np.asarray(dones).astype(bool)
+        if np.any(np.asarray(earlystops).astype(bool) & ~dones):
+            raise Exception("PG算法采用MCMC方法计算状态值，最后一个状态必须是终止状态。")
 
-        for i in reversed(range(batch_size)):
-
-            if dones[i]:
-                prev_return = 0
-            elif earlystops[i]:
-                raise Exception("PG算法采用MCMC方法计算状态值，最后一个状态必须是终止状态。")
-
-            returns[i] = rewards[i] + self._discount * prev_return * (1 - dones[i])
-            prev_return = returns[i]
+        returns = discount_cumsum(rewards, self._discount * ~dones)
 
         return [states, actions, returns]
@@ -10,6 +10,7 @@ policy loss需要计算当前policy和old policy在当前state上的ratio。
 import numpy as np
 import tensorflow as tf
 
+from ..utils import compute_returns_advantages
 from .base import Base
 
 
@@ -20,7 +21,14 @@ class PPO(Base):
                  policy_fn=None, value_fn=None,
                  discount=0.99, gae=0.95, clip_ratio=0.2,
                  train_epoch=40, policy_lr=1e-3, value_lr=1e-3,
+                 batch_size=None, fuse_update=False, target_kl=None, stage_rollout=False,
                  save_path="./log", log_freq=10, save_model_freq=100):
+        """
+        batch_size：每次训练的minibatch大小，每个epoch打乱一次顺序。None表示整个batch。
+        fuse_update：policy和value在同一次sess.run中更新。
+        target_kl：一个epoch的平均近似KL超过1.5倍target_kl时，停止更新policy，value继续更新。
+        stage_rollout：每次更新只把数据拷贝进图中的变量一次，之后每步只输入minibatch的下标。
+        """
         self._dim_obs = dim_obs
         self._dim_act = dim_act
         self._policy_fn = policy_fn
@@ -32,6 +40,10 @@ class PPO(Base):
         self._train_epoch = train_epoch
         self._policy_lr = policy_lr
         self._value_lr = value_lr
+        self._batch_size = batch_size
+        self._fuse_update = fuse_update
+        self._target_kl = target_kl
+        self._stage_rollout = stage_rollout
 
         self._log_freq = log_freq
         self._save_model_freq = save_model_freq
@@ -40,15 +52,18 @@ class PPO(Base):
 
     def _build_network(self):
         """Build tensorflow operations for algorithms."""
-        self._obs = tf.placeholder(tf.float32, [None, *self._dim_obs])
-        self._act = tf.placeholder(tf.float32, [None, self._dim_act])
+        self._obs = self._rollout_placeholder(tf.float32, [None, *self._dim_obs], staged=self._stage_rollout)
+        self._act = self._rollout_placeholder(tf.float32, [None, self._dim_act], staged=self._stage_rollout)
 
-        self._adv = tf.placeholder(tf.float32, [None])
-        self._ret = tf.placeholder(tf.float32, [None])
-        self._logp_old = tf.placeholder(tf.float32, [None])
+        self._adv = self._rollout_placeholder(tf.float32, [None], staged=self._stage_rollout)
+        self._ret = self._rollout_placeholder(tf.float32, [None], staged=self._stage_rollout)
+        self._logp_old = self._rollout_placeholder(tf.float32, [None], staged=self._stage_rollout)
         self.all_phs = [self._obs, self._act, self._adv, self._ret, self._logp_old]
 
-        self.pi, self.logp = self._policy_fn(self._obs, self._act)
+        # policy_fn returns (pi, logp) or (pi, logp, logp_pi); logp_pi is needed by get_action(return_info=True).
+        policy_outputs = self._policy_fn(self._obs, self._act)
+        self.pi, self.logp = policy_outputs[:2]
+        self.logp_pi = policy_outputs[2] if len(policy_outputs) > 2 else None
         self.v = self._value_fn(self._obs)
 
     def _build_algorithm(self):
@@ -59,70 +74,77 @@ class PPO(Base):
         surr2 = tf.clip_by_value(ratio, 1.0 - self._clip_ratio, 1.0 + self._clip_ratio) * self._adv
         self.policy_loss = -tf.reduce_mean(tf.minimum(surr1, surr2))
         self.value_loss = tf.reduce_mean((self.v - self._ret)**2)
+        self.approx_kl = tf.reduce_mean(self._logp_old - self.logp)
 
         self._train_policy_op = tf.train.AdamOptimizer(self._policy_lr).minimize(self.policy_loss)
         self._train_value_op = tf.train.AdamOptimizer(self._value_lr).minimize(self.value_loss)
 
-    def get_action(self, obs) -> np.ndarray:
+        self._register_metric("policy_loss", self.policy_loss)
+        self._register_metric("value_loss", self.value_loss)
+        self._register_metric("approx_kl", self.approx_kl)
+
+    def get_action(self, obs, return_info=False):
         """Return action according to the observations.
         :param obs: the observation that could be image or real-number features
-        :return: actions
+        :param return_info: also return {"logp": log-probability of the actions, "value": state values},
+            computed in the same run, to be passed to `update` as `act_info`.
+        :return: actions, or (actions, info)
         """
-        a = self.sess.run(self.pi, feed_dict={self._obs: obs})
-        return a
+        if not return_info:
+            a = self.sess.run(self.pi, feed_dict={self._obs: obs})
+            return a
 
-    def update(self, databatch):
+        assert self.logp_pi is not None, "policy_fn must return (pi, logp, logp_pi)."
+        a, logp, v = self.sess.run([self.pi, self.logp_pi, self.v], feed_dict={self._obs: obs})
+        return a, {"logp": logp, "value": v}
+
+    def update(self, databatch, act_info=None):
         """
         参数:
             databatch：一个列表，分别是state, action, reward, done, early_stop, next_state。每个是矩阵或向量。
             state是状态，action是动作，reward是奖励，done是是否完结，early_stop是是否提前结束，next_state是下一个状态。
+            act_info：可选，get_action(return_info=True)返回的信息按行拼接，每个值与state一一对应。提供时不再重新计算logp和value。
         """
-        preprocess_databatch = self._parse_databatch(*databatch)
-
-        inputs = {k: v for k, v in zip(self.all_phs, preprocess_databatch)}
-        pi_l_old, v_l_old = self.sess.run([self.policy_loss, self.value_loss], feed_dict=inputs)
+        preprocess_databatch = [np.asarray(x) for x in self._parse_databatch(*databatch, act_info=act_info)]
+        n_sample = len(preprocess_databatch[0])
+        if self._stage_rollout:
+            self._stage_feed(dict(zip(self.all_phs, preprocess_databatch)))
 
         # Training
+        train_policy = True
         for i in range(self._train_epoch):
-            self.sess.run(self._train_policy_op, feed_dict=inputs)
-        for i in range(self._train_epoch):
-            self.sess.run(self._train_value_op, feed_dict=inputs)
-
-        pi_l_new, v_l_new = self.sess.run([self.policy_loss, self.value_loss], feed_dict=inputs)
-
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+            kls = []
+            for index in self._minibatch_indices(n_sample, self._batch_size):
+                if self._stage_rollout:
+                    inputs = {self._stage_index: index}
+                else:
+                    inputs = {k: v[index] for k, v in zip(self.all_phs, preprocess_databatch)}
+                if train_policy and self._fuse_update:
+                    kl, _, _ = self._run_with_metrics([self.approx_kl, self._train_policy_op, self._train_value_op], inputs)
+                    kls.append(kl)
+                    continue
+                if train_policy:
+                    kl, _ = self.sess.run([self.approx_kl, self._train_policy_op], feed_dict=inputs)
+                    kls.append(kl)
+                self._run_with_metrics(self._train_value_op, inputs)
+
+            if train_policy and self._target_kl is not None and np.mean(kls) > 1.5 * self._target_kl:
+                train_policy = False
+
+        global_step = self._increment_step()
         if global_step % self._save_model_freq == 0:
             self.save_model()
 
-    def _parse_databatch(self, states, actions, rewards, dones, earlystops, nextstates):
-
-        batch_size = len(dones)
-        oldlogproba, values = self.sess.run([self.logp, self.v], feed_dict={self._obs: states, self._act: actions})
-        nextvalues = self.sess.run(self.v, feed_dict={self._obs: nextstates})
-
-        returns = np.zeros(batch_size)
-        deltas = np.zeros(batch_size)
-        advantages = np.zeros(batch_size)
-
-        for i in reversed(range(batch_size)):
-
-            if dones[i]:
-                prev_return = 0
-                prev_value = 0
-                prev_advantage = 0
-            elif earlystops[i]:
-                prev_return = nextvalues[i]
-                prev_value = prev_return
-                prev_advantage = 0
+    def _parse_databatch(self, states, actions, rewards, dones, earlystops, nextstates, act_info=None):
 
-            returns[i] = rewards[i] + self._discount * prev_return * (1 - dones[i])
-            deltas[i] = rewards[i] + self._discount * prev_value * (1 - dones[i]) - values[i]
-            # ref: https://arxiv.org/pdf/1506.02438.pdf (generalization advantage estimate)
-            advantages[i] = deltas[i] + self._discount * self._gae * prev_advantage * (1 - dones[i])
+        if act_info is None:
+            oldlogproba, values = self.sess.run([self.logp, self.v], feed_dict={self._obs: states, self._act: actions})
+        else:
+            oldlogproba, values = act_info["logp"], act_info["value"]
+        nextvalues = self._bootstrap_values(dones, earlystops, nextstates)
 
-            prev_return = returns[i]
-            prev_value = values[i]
-            prev_advantage = advantages[i]
+        returns, _, advantages = compute_returns_advantages(rewards, values, nextvalues, dones, earlystops,
+                                                            self._discount, self._gae)
 
         advantages = (advantages - advantages.mean()) / advantages.std()
 
@@ -1,7 +1,8 @@
 import numpy as np
 import tensorflow as tf
 
-from .base import Base
+from ..utils import concat_batch_call
+from .base import Base, TargetNetwork
 
 
 class SAC(Base):
@@ -13,7 +14,11 @@ class SAC(Base):
                  train_epoch=1, policy_lr=1e-3, value_lr=1e-3,
                  target_update_rate=0.995,
                  save_path="./log", log_freq=10, save_model_freq=100,
-                 update_target_ratio=0.995):
+                 update_target_ratio=0.995, multi_step=False, concat_forward=False):
+        """
+        multi_step：构建update_stacked，在一次sess.run中对多个minibatch依次训练并更新target。
+        concat_forward：把(obs, act)和(obs, pi)沿batch维拼接，每个action_value网络只做一次前向再切分。
+        """
         self._dim_obs = dim_obs
         self._dim_act = dim_act
         self._policy_fn = policy_fn
@@ -32,6 +37,9 @@ class SAC(Base):
         self._save_model_freq = save_model_freq
 
         self._update_target_ratio = update_target_ratio
+        self._multi_step = multi_step
+        self._use_resource = multi_step
+        self._concat_forward = concat_forward
 
         super().__init__(save_path=save_path, rnd=rnd)
         self.sess.run(self._init_target_op)
@@ -52,59 +60,78 @@ class SAC(Base):
         self._obs2 = tf.placeholder(tf.float32, [None, *self._dim_obs], name="next_observation")
         self.all_phs = [self._obs, self._act, self._reward, self._done, self._obs2]
 
-        with tf.variable_scope("main/policy"):
-            self.pi, self.logp_pi = self._policy_fn(self._obs, self._act)
+        self._target = TargetNetwork("main/state_value", "target/state_value")
+        (self.pi, self.logp_pi, self.q1, self.q2, self.q1_pi, self.q2_pi,
+         self.v, self.v_targ) = self._build_networks(self._obs, self._act, self._obs2)
 
-        with tf.variable_scope("main/action_value/1"):
-            self.q1 = self._qvalue_fn(self._obs, self._act)
+    def _build_networks(self, obs, act, obs2):
+        with tf.variable_scope("main/policy", reuse=tf.AUTO_REUSE):
+            pi, logp_pi = self._policy_fn(obs, act)
 
-        with tf.variable_scope("main/action_value/2"):
-            self.q2 = self._qvalue_fn(self._obs, self._act)
+        if self._concat_forward:
+            with tf.variable_scope("main/action_value/1", reuse=tf.AUTO_REUSE):
+                q1, q1_pi = concat_batch_call(self._qvalue_fn, (obs, act), (obs, pi))
 
-        with tf.variable_scope("main/action_value/1", reuse=True):
-            self.q1_pi = self._qvalue_fn(self._obs, self.pi)
+            with tf.variable_scope("main/action_value/2", reuse=tf.AUTO_REUSE):
+                q2, q2_pi = concat_batch_call(self._qvalue_fn, (obs, act), (obs, pi))
+        else:
+            with tf.variable_scope("main/action_value/1", reuse=tf.AUTO_REUSE):
+                q1 = self._qvalue_fn(obs, act)
 
-        with tf.variable_scope("main/action_value/2", reuse=True):
-            self.q2_pi = self._qvalue_fn(self._obs, self.pi)
+            with tf.variable_scope("main/action_value/2", reuse=tf.AUTO_REUSE):
+                q2 = self._qvalue_fn(obs, act)
 
-        with tf.variable_scope("main/state_value"):
-            self.v = self._value_fn(self._obs)
+            with tf.variable_scope("main/action_value/1", reuse=True):
+                q1_pi = self._qvalue_fn(obs, pi)
 
-        with tf.variable_scope("target/state_value"):
-            self.v_targ = self._value_fn(self._obs2)
+            with tf.variable_scope("main/action_value/2", reuse=True):
+                q2_pi = self._qvalue_fn(obs, pi)
+
+        with tf.variable_scope("main/state_value", reuse=tf.AUTO_REUSE):
+            v = self._value_fn(obs)
+
+        with tf.variable_scope("target/state_value", custom_getter=self._target.getter):
+            v_targ = self._value_fn(obs2)
+        return pi, logp_pi, q1, q2, q1_pi, q2_pi, v, v_targ
 
     def _build_algorithm(self):
+        self._policy_optimizer = tf.train.AdamOptimizer(self._policy_lr)
+        self._value_optimizer = tf.train.AdamOptimizer(self._value_lr)
+
+        self.train_policy_op, self.train_value_op = self._build_train_ops(
+            self.logp_pi, self.q1, self.q2, self.q1_pi, self.q2_pi, self.v, self.v_targ, self._reward, self._done)
+
+        # with tf.control_dependencies([self.train_value_op]):
+        self._update_target_op = self._target.update_op(self._target_update_rate)
+        self._init_target_op = self._target.update_op()
+
+        if self._multi_step:
+            self._stacked_phs, self._multi_step_op = self._build_multi_step(self.all_phs, self._build_one_step)
+
+    def _build_train_ops(self, logp_pi, q1, q2, q1_pi, q2_pi, v, v_targ, reward, done):
         policy_vars = tf.trainable_variables("main/policy")
         value_vars = tf.trainable_variables("main/action_value") + tf.trainable_variables("main/state_value")
 
-        min_q = tf.minimum(self.q1_pi, self.q2_pi)
-        v_backup = tf.stop_gradient(min_q - self._alpha * self.logp_pi)
-        v_loss = 0.5 * tf.reduce_mean((v_backup - self.v)**2)
-        q_backup = tf.stop_gradient(self._reward + self._discount * (1 - self._done) * self.v_targ)
-        q1_loss = 0.5 * tf.reduce_mean((q_backup - self.q1)**2)
-        q2_loss = 0.5 * tf.reduce_mean((q_backup - self.q2)**2)
+        min_q = tf.minimum(q1_pi, q2_pi)
+        v_backup = tf.stop_gradient(min_q - self._alpha * logp_pi)
+        v_loss = 0.5 * tf.reduce_mean((v_backup - v)**2)
+        q_backup = tf.stop_gradient(reward + self._discount * (1 - done) * v_targ)
+        q1_loss = 0.5 * tf.reduce_mean((q_backup - q1)**2)
+        q2_loss = 0.5 * tf.reduce_mean((q_backup - q2)**2)
         value_loss = q1_loss + q2_loss + v_loss
 
-        policy_loss = tf.reduce_mean(self._alpha * self.logp_pi - self.q1_pi)
+        policy_loss = tf.reduce_mean(self._alpha * logp_pi - q1_pi)
 
-        self.train_policy_op = tf.train.AdamOptimizer(self._policy_lr).minimize(policy_loss, var_list=policy_vars)
-        self.train_value_op = tf.train.AdamOptimizer(self._value_lr).minimize(value_loss, var_list=value_vars)
+        train_policy_op = self._policy_optimizer.minimize(policy_loss, var_list=policy_vars)
+        train_value_op = self._value_optimizer.minimize(value_loss, var_list=value_vars)
+        return train_policy_op, train_value_op
 
-        # Update target network.
-        def _update_target(net1, net2, alpha=0):
-            params1 = tf.trainable_variables(net1)
-            params1 = sorted(params1, key=lambda v: v.name)
-            params2 = tf.trainable_variables(net2)
-            params2 = sorted(params2, key=lambda v: v.name)
-            assert len(params1) == len(params2)
-            update_ops = []
-            for param1, param2 in zip(params1, params2):
-                update_ops.append(param1.assign(alpha * param1 + (1-alpha) * param2))
-            return update_ops
-
-        # with tf.control_dependencies([self.train_value_op]):
-        self._update_target_op = _update_target("target/state_value", "main/state_value", alpha=self._target_update_rate)
-        self._init_target_op = _update_target("target/state_value", "main/state_value", alpha=0)
+    def _build_one_step(self, k, obs, act, reward, done, obs2):
+        """Policy and value step followed by the target update, on the k-th stacked minibatch."""
+        _, logp_pi, q1, q2, q1_pi, q2_pi, v, v_targ = self._build_networks(obs, act, obs2)
+        train_ops = self._build_train_ops(logp_pi, q1, q2, q1_pi, q2_pi, v, v_targ, reward, done)
+        with tf.control_dependencies(train_ops):
+            return self._target.update_op(self._target_update_rate)
 
     def get_action(self, obs):
         pi = self.sess.run(self.pi, feed_dict={self._obs: obs})
@@ -120,7 +147,19 @@ class SAC(Base):
         self.sess.run(self._update_target_op)
 
         # Save model.
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        global_step = self._increment_step()
 
         if global_step % self._save_model_freq == 0:
             self.save_model()
+
+    def update_stacked(self, databatch):
+        """databatch同update，每个元素多一个表示minibatch的第0维。每个minibatch训练一步并更新target，计为一次update。
+        与update不同，不受train_epoch影响：train_epoch>1时与update不等价。
+        """
+        n_step = len(databatch[0])
+        self.sess.run(self._multi_step_op, feed_dict=dict(zip(self._stacked_phs, databatch)))
+
+        global_step = self._increment_step(n_step)
+
+        if global_step // self._save_model_freq != (global_step - n_step) // self._save_model_freq:
+            self.save_model()
@@ -2,7 +2,8 @@
 import numpy as np
 import tensorflow as tf
 
-from .base import Base
+from ..utils import concat_batch_call
+from .base import Base, TargetNetwork
 
 
 class TD3(Base):
@@ -12,9 +13,14 @@ class TD3(Base):
                  policy_fn=None, value_fn=None,
                  discount=0.99, gae=0.95,
                  train_epoch=20, policy_lr=1e-3, value_lr=1e-3, policy_delay=2,
-                 target_update_rate=0.995, noise_std=0.2, noise_clip=0.5,
+                 target_update_rate=0.995, noise_std=0.2, noise_clip=0.5, multi_step=False, concat_forward=False,
                  save_path="./log", log_freq=10, save_model_freq=100,
                  ):
+        """
+        multi_step：构建update_stacked，在一次sess.run中对多个minibatch依次训练，policy和target仍按policy_delay延迟更新。
+        concat_forward：在update_stacked的每一步中把(obs, act)和(obs, policy(obs))沿batch维拼接，value/1只做一次前向再切分。
+            update分两次sess.run训练value和policy，拼接只会让两次都多算一半，因此不受影响。
+        """
         self._dim_obs = dim_obs
         self._dim_act = dim_act
         self._act_limit = act_limit
@@ -26,6 +32,9 @@ class TD3(Base):
         self._policy_decay = policy_delay
         self._target_update_ratio = target_update_rate
         self._noise_std, self._noise_clip = noise_std, noise_clip
+        self._multi_step = multi_step
+        self._use_resource = multi_step
+        self._concat_forward = concat_forward
 
         self._log_freq = log_freq
         self._save_model_freq = save_model_freq
@@ -45,62 +54,101 @@ class TD3(Base):
 
         self.all_phs = [self._obs, self._act, self._reward, self._done, self._obs2]
 
-        with tf.variable_scope("main/policy"):
-            self.act = self._policy_fn(self._obs)
+        self._target_policy = TargetNetwork("main/policy", "target/policy")
+        self._target_value = TargetNetwork("main/value", "target/value")
+        self.act, self.q_act = self._build_policy_q(self._obs)
+        self.q1, self.q2, self.q1_targ, self.q2_targ = self._build_q(self._obs, self._act, self._obs2)
 
-        with tf.variable_scope("main/value/1"):
-            self.q1 = self._value_fn(self._obs, self._act)
+    def _build_policy_q(self, obs, act=None):
+        """给定act时与q_act拼接前向，同时返回value/1在act上的输出。"""
+        with tf.variable_scope("main/policy", reuse=tf.AUTO_REUSE):
+            act_pi = self._policy_fn(obs)
 
-        with tf.variable_scope("main/value/2"):
-            self.q2 = self._value_fn(self._obs, self._act)
+        with tf.variable_scope("main/value/1", reuse=tf.AUTO_REUSE):
+            if act is None:
+                return act_pi, self._value_fn(obs, act_pi)
+            q_act, q1 = concat_batch_call(self._value_fn, (obs, act_pi), (obs, act))
+        return act_pi, q_act, q1
 
-        with tf.variable_scope("main/value/1", reuse=True):
-            self.q_act = self._value_fn(self._obs, self.act)
+    def _build_q(self, obs, act, obs2, q1=None):
+        if q1 is None:
+            with tf.variable_scope("main/value/1", reuse=True):
+                q1 = self._value_fn(obs, act)
 
-        with tf.variable_scope("target/policy"):
-            self.act_targ = self._policy_fn(self._obs2)
+        with tf.variable_scope("main/value/2", reuse=tf.AUTO_REUSE):
+            q2 = self._value_fn(obs, act)
 
-        epsilon = tf.random_normal(tf.shape(self.act_targ), stddev=self._noise_std)
+        with tf.variable_scope("target/policy", custom_getter=self._target_policy.getter):
+            act_targ = self._policy_fn(obs2)
+
+        epsilon = tf.random_normal(tf.shape(act_targ), stddev=self._noise_std)
         epsilon = tf.clip_by_value(epsilon, -self._noise_clip, self._noise_clip)
-        a2 = self.act_targ + epsilon
+        a2 = act_targ + epsilon
         a2 = tf.clip_by_value(a2, -self._act_limit, self._act_limit)
-        with tf.variable_scope("target/value/1"):
-            self.q1_targ = self._value_fn(self._obs2, a2)
-
-        with tf.variable_scope("target/value/2"):
-            self.q2_targ = self._value_fn(self._obs2, a2)
-
-    def _update_target(self, net1, net2, rho=0):
-        params1 = tf.trainable_variables(net1)
-        params1 = sorted(params1, key=lambda v: v.name)
-        params2 = tf.trainable_variables(net2)
-        params2 = sorted(params2, key=lambda v: v.name)
-        assert len(params1) == len(params2)
-        update_ops = []
-        for param1, param2 in zip(params1, params2):
-            update_ops.append(param1.assign(rho*param1 + (1-rho)*param2))
-        return update_ops
+        with tf.variable_scope("target/value/1", custom_getter=self._target_value.getter):
+            q1_targ = self._value_fn(obs2, a2)
+
+        with tf.variable_scope("target/value/2", custom_getter=self._target_value.getter):
+            q2_targ = self._value_fn(obs2, a2)
+        return q1, q2, q1_targ, q2_targ
 
     def _build_algorithm(self):
-        policy_vars = tf.trainable_variables("main/policy")
-        value_vars = tf.trainable_variables("main/value")
+        self._policy_optimizer = tf.train.AdamOptimizer(self._policy_lr)
+        self._value_optimizer = tf.train.AdamOptimizer(self._value_lr)
 
         policy_loss = -tf.reduce_mean(self.q_act)
+        self.train_policy_op = self._policy_optimizer.minimize(policy_loss, var_list=tf.trainable_variables("main/policy"))
+        self.train_value_op = self._build_value_train_op(self.q1, self.q2, self.q1_targ, self.q2_targ, self._reward, self._done)
+
+        self._update_target_policy_op = self._target_policy.update_op(self._target_update_ratio)
+        self._update_target_value_op = self._target_value.update_op(self._target_update_ratio)
+
+        self._init_target_policy_op = self._target_policy.update_op()
+        self._init_target_value_op = self._target_value.update_op()
+
+        if self._multi_step:
+            self._start_step = tf.placeholder(tf.int32, [], "start_step")
+            self._stacked_phs, self._multi_step_op = self._build_multi_step(self.all_phs, self._build_one_step)
 
-        min_q_targ = tf.minimum(self.q1_targ, self.q2_targ)
-        backup = tf.stop_gradient(self._reward + self._discount*(1-self._done)*min_q_targ)
-        q1_loss = tf.reduce_mean((self.q1-backup)**2)
-        q2_loss = tf.reduce_mean((self.q2-backup)**2)
+    def _build_value_train_op(self, q1, q2, q1_targ, q2_targ, reward, done):
+        value_vars = tf.trainable_variables("main/value")
+
+        min_q_targ = tf.minimum(q1_targ, q2_targ)
+        backup = tf.stop_gradient(reward + self._discount*(1-done)*min_q_targ)
+        q1_loss = tf.reduce_mean((q1-backup)**2)
+        q2_loss = tf.reduce_mean((q2-backup)**2)
         value_loss = q1_loss + q2_loss
 
-        self.train_policy_op = tf.train.AdamOptimizer(self._policy_lr).minimize(policy_loss, var_list=policy_vars)
-        self.train_value_op = tf.train.AdamOptimizer(self._value_lr).minimize(value_loss, var_list=value_vars)
+        return self._value_optimizer.minimize(value_loss, var_list=value_vars)
 
-        self._update_target_policy_op = self._update_target("target/policy", "main/policy", self._target_update_ratio)
-        self._update_target_value_op = self._update_target("target/value", "main/value", self._target_update_ratio)
+    def _build_one_step(self, k, obs, act, reward, done, obs2):
+        """Value step on the k-th stacked minibatch, then every `policy_delay` steps a policy step and the target update.
 
-        self._init_target_policy_op = self._update_target("target/policy", "main/policy")
-        self._init_target_value_op = self._update_target("target/value", "main/value")
+        With `concat_forward`, q_act comes from the same value/1 forward as q1, so the policy step uses
+        value/1 from before this value step, unlike `update` which reruns the forward after it.
+        """
+        if self._concat_forward:
+            _, q_act, q1 = self._build_policy_q(obs, act)
+        else:
+            q_act, q1 = None, None
+        q1, q2, q1_targ, q2_targ = self._build_q(obs, act, obs2, q1)
+        train_value_op = self._build_value_train_op(q1, q2, q1_targ, q2_targ, reward, done)
+
+        with tf.control_dependencies([train_value_op]):
+            if q_act is None:
+                _, q_act = self._build_policy_q(obs)
+            grads_and_vars = self._policy_optimizer.compute_gradients(-tf.reduce_mean(q_act),
+                                                                      var_list=tf.trainable_variables("main/policy"))
+
+            def policy_step():
+                with tf.control_dependencies([self._policy_optimizer.apply_gradients(grads_and_vars)]):
+                    update_ops = [self._target_value.update_op(self._target_update_ratio),
+                                  self._target_policy.update_op(self._target_update_ratio)]
+                with tf.control_dependencies(update_ops):
+                    return tf.identity(k)
+
+            global_step = self._start_step + k
+            return tf.cond(tf.equal(global_step % self._policy_decay, 0), policy_step, lambda: tf.identity(k))
 
     def get_action(self, obs):
         """动作添加扰动。
@@ -109,11 +157,26 @@ class TD3(Base):
         noised_action = action + 0.1 * np.random.randn(*action.shape)
         return noised_action
 
+    def update_stacked(self, databatch):
+        """databatch同update，每个元素多一个表示minibatch的第0维。每个minibatch计为一次update，与update一样每次只训练一步value。
+        """
+        n_step = len(databatch[0])
+        inputs = dict(zip(self._stacked_phs, databatch))
+        self.sess.run(self._multi_step_op, feed_dict={**inputs, self._start_step: self.global_step})
+
+        # 同update，按每步之前的步数判断是否保存。
+        last_step = self._increment_step(n_step) - 1
+
+        if last_step // self._save_model_freq != (last_step - n_step) // self._save_model_freq:
+            self.save_model()
+
     def update(self, databatch):
         s_batch, a_batch, r_batch, d_batch, next_s_batch = databatch
         inputs = {k: v for k, v in zip(self.all_phs, [s_batch, a_batch, r_batch, d_batch, next_s_batch])}
 
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
+        # 按本次update之前的步数延迟更新和保存，第一次update即更新策略并保存。
+        global_step = self.global_step
+        self._increment_step()
 
         # 更新值函数。
         self.sess.run(self.train_value_op, feed_dict=inputs)
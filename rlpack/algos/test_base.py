@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("tensorboardX")
+
+from rlpack.algos.base import Base, TargetNetwork
+
+
+class Counter(Base):
+    def __init__(self, save_path):
+        super().__init__(save_path=save_path, rnd=0)
+
+    def _build_network(self):
+        self.w = tf.get_variable("w", [2], initializer=tf.zeros_initializer())
+
+    def _build_algorithm(self):
+        self._add = tf.assign_add(self.w, tf.ones([2]))
+
+    def get_action(self, obs):
+        return obs
+
+    def update(self, minibatch):
+        self.sess.run(self._add)
+        return self._increment_step()
+
+
+def test_global_step_saved_and_restored(tmp_path):
+    with tf.Graph().as_default():
+        agent = Counter(str(tmp_path))
+        assert agent.global_step == 0
+        for _ in range(3):
+            agent.update(None)
+        agent.save_model()
+
+    with tf.Graph().as_default():
+        agent = Counter(str(tmp_path))
+        assert agent.global_step == 3
+        np.testing.assert_array_equal(agent.sess.run(agent.w), [3, 3])
+
+
+def test_restore_checkpoint_without_global_step(tmp_path):
+    with tf.Graph().as_default():
+        w = tf.Variable([5., 5.], name="w")
+        with tf.Session() as sess:
+            sess.run(w.initializer)
+            os.makedirs(tmp_path / "model")
+            tf.train.Saver([w]).save(sess, str(tmp_path / "model" / "model"), 7)
+
+    with tf.Graph().as_default():
+        agent = Counter(str(tmp_path))
+        assert agent.global_step == 7
+        np.testing.assert_array_equal(agent.sess.run(agent.w), [5, 5])
+
+
+def _net(x):
+    h = tf.layers.dense(x, 5, tf.tanh)
+    return tf.layers.dense(tf.layers.dense(h, 4), 2)
+
+
+class WithTarget(Base):
+    def __init__(self, save_path):
+        super().__init__(save_path=save_path, rnd=0)
+
+    def _build_network(self):
+        self._x = tf.placeholder(tf.float32, [None, 3])
+        with tf.variable_scope("main"):
+            self.y = _net(self._x)
+        self._target = TargetNetwork("main", "target")
+        with tf.variable_scope("target", custom_getter=self._target.getter):
+            self.y_targ = _net(self._x)
+
+    def _build_algorithm(self):
+        self.main_vars = sorted(tf.trainable_variables("main"), key=lambda v: v.name)
+        self.perturb = tf.group(*[tf.assign_add(v, tf.random_normal(tf.shape(v))) for v in self.main_vars])
+
+    def get_action(self, obs):
+        return self.sess.run(self.y, feed_dict={self._x: obs})
+
+    def update(self, minibatch):
+        pass
+
+
+def test_target_network_update_op(tmp_path):
+    with tf.Graph().as_default():
+        agent = WithTarget(str(tmp_path))
+        sess = agent.sess
+        x = np.random.RandomState(0).randn(6, 3)
+        y, y_targ = sess.run([agent.y, agent.y_targ], feed_dict={agent._x: x})
+        np.testing.assert_array_equal(y, y_targ)
+
+        copy_op, soft_op = agent._target.update_op(0.), agent._target.update_op(0.9)
+        sess.run(agent.perturb)
+        sess.run(copy_op)
+        y, y_targ = sess.run([agent.y, agent.y_targ], feed_dict={agent._x: x})
+        np.testing.assert_array_equal(y, y_targ)
+
+        target = sess.run(agent.main_vars)
+        sess.run(agent.perturb)
+        main = sess.run(agent.main_vars)
+        sess.run(soft_op)
+        flat = sess.run(agent._target._flat)
+        expected = np.concatenate([(0.9 * t + (1 - 0.9) * m).ravel() for t, m in zip(target, main)])
+        np.testing.assert_allclose(flat, expected, rtol=1e-6, atol=1e-7)
+
+
+def test_restore_per_variable_target(tmp_path):
+    # 旧版本的target每个参数一个变量。
+    rng = np.random.RandomState(0)
+    with tf.Graph().as_default():
+        x = tf.placeholder(tf.float32, [None, 3])
+        for scope in ("main", "target"):
+            with tf.variable_scope(scope):
+                _net(x)
+        variables = tf.global_variables()
+        with tf.Session() as sess:
+            for v in variables:
+                v.load(rng.randn(*v.shape.as_list()), sess)
+            old = {v.op.name: sess.run(v) for v in variables}
+            os.makedirs(tmp_path / "model")
+            tf.train.Saver().save(sess, str(tmp_path / "model" / "model"), 4)
+
+    with tf.Graph().as_default():
+        agent = WithTarget(str(tmp_path))
+        assert agent.global_step == 4
+        names = sorted(v.op.name[len("main/"):] for v in agent.main_vars)
+        np.testing.assert_array_equal(agent.sess.run(agent._target._flat),
+                                      np.concatenate([old["target/" + n].ravel() for n in names]))
+        for v in agent.main_vars:
+            np.testing.assert_array_equal(agent.sess.run(v), old[v.op.name])
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("tensorboardX")
+
+from rlpack.algos.dist_dqn import DistDQN
+from rlpack.utils import mlp
+
+# 41个支撑点时间距为0.5，在float32中精确，原子可以恰好落在支撑点上。
+N_ACT, N_HISTOGRAM = 3, 41
+
+
+def policy_fn(x):
+    return mlp(x, [32, N_ACT * N_HISTOGRAM], activation=tf.tanh)
+
+
+def _loop_projection(agent, next_q_probs, r_batch, d_batch):
+    """The per-sample, per-atom projection DistDQN.update used to run on the host."""
+    next_q_vals = np.sum(next_q_probs * agent._split_points, axis=-1)
+    best_action = np.argmax(next_q_vals, axis=1)
+
+    def compute_histogram(reward, probability, done):
+        m = np.zeros(agent._n_histogram, dtype=np.float32)
+        projection = (np.clip(reward + agent._discount * (1 - done) * agent._split_points,
+                              agent._vmin, agent._vmax) - agent._vmin) / agent._delta
+        for p, b in zip(probability, projection):
+            l = np.floor(b).astype(np.int32)
+            u = np.ceil(b).astype(np.int32)
+            m[l] += p * (u - b)
+            m[u] += p * (b - l)
+        return m
+
+    probs = next_q_probs[np.arange(best_action.shape[0]), best_action]
+    return np.array([compute_histogram(r, p, d) for r, p, d in zip(r_batch, probs, d_batch)])
+
+
+@pytest.mark.parametrize("discount", [0.99, 1.0])
+def test_projection_matches_loop(tmp_path, discount):
+    with tf.Graph().as_default():
+        agent = DistDQN(dim_obs=(4,), n_act=N_ACT, policy_fn=policy_fn, discount=discount,
+                        n_histogram=N_HISTOGRAM, save_path=str(tmp_path))
+        rng = np.random.RandomState(0)
+        n = 64
+        obs2 = rng.randn(n, 4).astype(np.float32)
+        # 前一半随机回报，后一半取支撑点间距的整数倍，使原子恰好落在支撑点上。
+        rew = np.concatenate([rng.uniform(-12, 12, n // 2), agent._delta * rng.randint(-30, 30, n // 2)])
+        rew = rew.astype(np.float32)
+        done = (rng.rand(n) < 0.25).astype(np.float32)
+        feed = {agent._obs: obs2, agent._obs2: obs2, agent._rew: rew, agent._done: done}
+
+        next_q_probs, new_p_act = agent.sess.run([agent._p_act_targ, agent._new_p_act], feed_dict=feed)
+
+    expected = _loop_projection(agent, next_q_probs, rew, done)
+    np.testing.assert_allclose(new_p_act, expected, rtol=0, atol=1e-5)
@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("tensorboardX")
+
+from rlpack.algos.ddpg import DDPG
+from rlpack.algos.double_dqn import DoubleDQN
+from rlpack.algos.dqn import DQN
+from rlpack.algos.duel_dqn import DuelDQN
+from rlpack.algos.sac import SAC
+from rlpack.algos.td3 import TD3
+from rlpack.utils import mlp, mlp_gaussian_policy2
+
+DIM_OBS, N_ACT, DIM_ACT = 4, 3, 2
+K, BATCH = 4, 16
+
+
+def q_fn(x):
+    return mlp(x, [16, N_ACT])
+
+
+def duel_fn(x):
+    h = tf.layers.dense(x, 16, tf.tanh)
+    return tf.layers.dense(h, 1), tf.layers.dense(h, N_ACT)
+
+
+def policy_fn(x):
+    return mlp(x, [16, DIM_ACT], output_activation=tf.tanh)
+
+
+def value_fn(x, a):
+    return tf.squeeze(mlp(tf.concat([x, a], axis=1), [16, 1]), axis=1)
+
+
+def sac_policy_fn(x, a):
+    _, pi, logp_pi = mlp_gaussian_policy2(x, a, [16])
+    return pi, logp_pi
+
+
+def sac_value_fn(x):
+    return tf.squeeze(mlp(x, [16, 1]), axis=1)
+
+
+def _make(name, save_path):
+    if name in ("DQN", "DoubleDQN", "DuelDQN"):
+        cls = {"DQN": DQN, "DoubleDQN": DoubleDQN, "DuelDQN": DuelDQN}[name]
+        return cls(dim_obs=(DIM_OBS,), n_act=N_ACT, value_fn=duel_fn if name == "DuelDQN" else q_fn,
+                   multi_step=True, save_path=save_path)
+    if name == "DDPG":
+        return DDPG(dim_obs=(DIM_OBS,), dim_act=DIM_ACT, act_limit=1., policy_fn=policy_fn, value_fn=value_fn,
+                    multi_step=True, save_path=save_path)
+    if name == "TD3":
+        # 目标策略噪声为0时TD3是确定性的。
+        return TD3(dim_obs=(DIM_OBS,), dim_act=DIM_ACT, act_limit=1., policy_fn=policy_fn, value_fn=value_fn,
+                   noise_std=0., noise_clip=0., multi_step=True, save_path=save_path)
+    return SAC(dim_obs=(DIM_OBS,), dim_act=DIM_ACT, policy_fn=sac_policy_fn, value_fn=sac_value_fn,
+               qvalue_fn=value_fn, multi_step=True, save_path=save_path)
+
+
+def _stacked_batches(name, rng):
+    obs = rng.randn(K, BATCH, DIM_OBS).astype(np.float32)
+    if name in ("DQN", "DoubleDQN", "DuelDQN"):
+        act = rng.randint(N_ACT, size=(K, BATCH))
+    else:
+        act = rng.uniform(-1, 1, size=(K, BATCH, DIM_ACT)).astype(np.float32)
+    rew = rng.randn(K, BATCH).astype(np.float32)
+    done = (rng.rand(K, BATCH) < 0.2).astype(np.float32)
+    obs2 = rng.randn(K, BATCH, DIM_OBS).astype(np.float32)
+    return [obs, act, rew, done, obs2]
+
+
+def _run_both(name, tmp_path):
+    """Return variables after K stacked steps and after K sequential updates, from the same start."""
+    with tf.Graph().as_default():
+        agent = _make(name, str(tmp_path))
+        # global_step变量只在保存时同步，比较的是主机上的计数。
+        variables = [v for v in tf.global_variables() if v.op.name != "global_step"]
+        start, start_step = agent.sess.run(variables), agent.global_step
+        databatch = _stacked_batches(name, np.random.RandomState(0))
+
+        agent.update_stacked(databatch)
+        stacked = agent.sess.run(variables)
+        assert agent.global_step == start_step + K
+
+        for var, value in zip(variables, start):
+            var.load(value, agent.sess)
+        agent.global_step = start_step
+        for k in range(K):
+            agent.update([x[k] for x in databatch])
+        sequential = agent.sess.run(variables)
+        return [v.op.name for v in variables], start, stacked, sequential
+
+
+@pytest.mark.parametrize("name", ["DQN", "DoubleDQN", "DuelDQN", "DDPG"])
+def test_stacked_matches_sequential(tmp_path, name):
+    names, start, stacked, sequential = _run_both(name, tmp_path)
+    assert any(not np.array_equal(a, b) for a, b in zip(start, stacked))
+    for n, a, b in zip(names, stacked, sequential):
+        np.testing.assert_array_equal(a, b, err_msg=n)
+
+
+def test_td3_stacked_close_to_sequential(tmp_path):
+    # update在同一次sess.run中训练policy和更新target，target可能读到训练前的policy；
+    # update_stacked总是先训练再更新target。target因此相差约(1-rate)*lr，其余只差float32舍入。
+    names, start, stacked, sequential = _run_both("TD3", tmp_path)
+    assert any(not np.array_equal(a, b) for a, b in zip(start, stacked))
+    lr, rate = 1e-3, 0.995
+    for n, a, b in zip(names, stacked, sequential):
+        if n.startswith("target/"):
+            np.testing.assert_allclose(a, b, atol=K * (1 - rate) * lr, err_msg=n)
+        else:
+            np.testing.assert_allclose(a, b, rtol=1e-4, atol=1e-6, err_msg=n)
+
+
+def test_sac_stacked_close_to_sequential(tmp_path):
+    # 策略采样噪声不同，只要求走了相同步数且差异在K步Adam的步长内。
+    names, start, stacked, sequential = _run_both("SAC", tmp_path)
+    lr = 1e-3
+    for n, s, a, b in zip(names, start, stacked, sequential):
+        if "power" in n:
+            np.testing.assert_allclose(a, b, rtol=1e-6, err_msg=n)
+        elif "main/" in n and "Adam" not in n:
+            assert np.abs(a - s).max() > 0, n
+            assert np.abs(a - b).max() <= 2 * K * lr * 1.01, n
+
+
+def test_td3_concat_forward_multi_step(tmp_path):
+    # 每个stacked step中value/1只做一次（拼接的）前向。
+    with tf.Graph().as_default():
+        agent = TD3(dim_obs=(DIM_OBS,), dim_act=DIM_ACT, act_limit=1., policy_fn=policy_fn, value_fn=value_fn,
+                    multi_step=True, concat_forward=True, save_path=str(tmp_path))
+        value1 = [op for op in tf.get_default_graph().get_operations()
+                  if op.name.startswith("while/main/value/1") and op.type == "MatMul"]
+        assert len(value1) == 2  # 两层dense，各一个matmul。
+
+        variables = tf.trainable_variables()
+        start = agent.sess.run(variables)
+        agent.update_stacked(_stacked_batches("TD3", np.random.RandomState(0)))
+        assert agent.global_step == K
+        assert all(np.isfinite(v).all() for v in agent.sess.run(variables))
+        assert any(not np.array_equal(a, b) for a, b in zip(start, agent.sess.run(variables)))
+
+
+def test_td3_concat_forward_only_in_multi_step(tmp_path):
+    # update的value步不运行policy，value/1只处理B行。
+    with tf.Graph().as_default():
+        agent = TD3(dim_obs=(DIM_OBS,), dim_act=DIM_ACT, act_limit=1., policy_fn=policy_fn, value_fn=value_fn,
+                    multi_step=True, concat_forward=True, save_path=str(tmp_path))
+        run_metadata = tf.RunMetadata()
+        batch = [x[0] for x in _stacked_batches("TD3", np.random.RandomState(0))]
+        agent.sess.run(agent.train_value_op, feed_dict=dict(zip(agent.all_phs, batch)),
+                       options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE), run_metadata=run_metadata)
+        ran = {node.node_name for dev in run_metadata.step_stats.dev_stats for node in dev.node_stats}
+        assert not any(name.startswith("main/policy/") for name in ran)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("tensorboardX")
+
+from rlpack.algos.td3 import TD3
+from rlpack.utils import mlp
+
+
+def policy_fn(x):
+    return mlp(x, [16, 2], output_activation=tf.tanh)
+
+
+def value_fn(x, a):
+    return tf.squeeze(mlp(tf.concat([x, a], axis=1), [16, 1]), axis=1)
+
+
+def test_policy_delay_schedule(tmp_path):
+    # 同baseline：按update之前的步数判断，第1、3次update训练策略，第1次update保存模型。
+    rng = np.random.RandomState(0)
+    with tf.Graph().as_default():
+        agent = TD3(dim_obs=(4,), dim_act=2, act_limit=1., policy_fn=policy_fn, value_fn=value_fn,
+                    save_path=str(tmp_path))
+        policy_vars = tf.trainable_variables("main/policy")
+        changed = []
+        for _ in range(4):
+            databatch = [rng.randn(8, 4), rng.uniform(-1, 1, (8, 2)), rng.randn(8), np.zeros(8), rng.randn(8, 4)]
+            before = agent.sess.run(policy_vars)
+            agent.update(databatch)
+            changed.append(any(not np.array_equal(a, b) for a, b in zip(before, agent.sess.run(policy_vars))))
+        assert changed == [True, False, True, False]
+        assert tf.train.latest_checkpoint(str(tmp_path / "model")).endswith("model-1")
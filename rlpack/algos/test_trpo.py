@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+pytest.importorskip("tensorboardX")
+
+from rlpack.algos.trpo import TRPO
+from rlpack.utils import mlp, mlp_gaussian_policy
+
+
+def policy_fn(x, a):
+    return mlp_gaussian_policy(x, a, hidden_sizes=[16], activation=tf.tanh)
+
+
+def value_fn(x):
+    return tf.squeeze(mlp(x, [16, 1]), axis=1)
+
+
+def _databatch(rng, n=64, dim_obs=3, dim_act=2):
+    states = rng.randn(n, dim_obs)
+    actions = rng.randn(n, dim_act)
+    rewards = rng.randn(n)
+    dones = np.zeros(n)
+    earlystops = np.zeros(n)
+    earlystops[-1] = 1
+    return [states, actions, rewards, dones, earlystops, rng.randn(n, dim_obs)]
+
+
+@pytest.mark.parametrize("in_graph", [False, True])
+def test_graph_does_not_grow_across_updates(tmp_path, in_graph):
+    with tf.Graph().as_default() as graph:
+        agent = TRPO(dim_obs=(3,), dim_act=2, policy_fn=policy_fn, value_fn=value_fn,
+                     train_epoch=2, in_graph=in_graph, save_path=str(tmp_path), save_model_freq=2)
+        rng = np.random.RandomState(0)
+        agent.update(_databatch(rng))
+        n_ops = len(graph.get_operations())
+        for _ in range(3):
+            agent.update(_databatch(rng))
+        assert len(graph.get_operations()) == n_ops
+
+
+def test_flat_roundtrip(tmp_path):
+    with tf.Graph().as_default():
+        agent = TRPO(dim_obs=(3,), dim_act=2, policy_fn=policy_fn, value_fn=value_fn, save_path=str(tmp_path))
+        theta = agent.get_flat()
+        agent.set_flat(theta + 1)
+        assert np.allclose(agent.get_flat(), theta + 1)
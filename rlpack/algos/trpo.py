@@ -2,7 +2,7 @@
 import numpy as np
 import tensorflow as tf
 
-from ..utils import diagonal_gaussian_kl
+from ..utils import compute_returns_advantages, diagonal_gaussian_kl
 from .base import Base
 
 
@@ -13,8 +13,14 @@ class TRPO(Base):
                  policy_fn=None, value_fn=None,
                  discount=0.99, gae=0.95, delta=0.01,
                  train_epoch=40, policy_lr=1e-3, value_lr=1e-3, max_grad_norm=40,
+                 stage_rollout=False, in_graph=False, fvp_subsample=None, cg_iters=20, max_backtrack=10,
                  save_path="./log", log_freq=10, save_model_freq=100,
                  ):
+        """
+        stage_rollout：每次更新只把数据拷贝进图中的变量一次，value训练、共轭梯度和线搜索不再重复输入数据。
+        in_graph：共轭梯度和线搜索在一次sess.run中完成。共轭梯度展开为cg_iters步，线搜索使用tf.while_loop。
+        fvp_subsample：计算Fisher-vector product时随机使用的样本比例，None表示使用全部样本。
+        """
         self._dim_obs = dim_obs
         self._dim_act = dim_act
         self._policy_fn = policy_fn
@@ -27,6 +33,11 @@ class TRPO(Base):
         self._policy_lr = policy_lr
         self._value_lr = value_lr
         self._max_grad_norm = max_grad_norm
+        self._stage_rollout = stage_rollout
+        self._in_graph = in_graph
+        self._fvp_subsample = fvp_subsample
+        self._cg_iters = cg_iters
+        self._max_backtrack = max_backtrack
 
         self._log_freq = log_freq
         self._save_model_freq = save_model_freq
@@ -34,13 +45,13 @@ class TRPO(Base):
         super().__init__(save_path=save_path, rnd=rnd)
 
     def _build_network(self):
-        self._obs = tf.placeholder(tf.float32, [None, *self._dim_obs], "observation")
-        self._act = tf.placeholder(tf.float32, [None, self._dim_act], "action")
+        self._obs = self._rollout_placeholder(tf.float32, [None, *self._dim_obs], "observation", self._stage_rollout)
+        self._act = self._rollout_placeholder(tf.float32, [None, self._dim_act], "action", self._stage_rollout)
 
-        self._logp_old = tf.placeholder(tf.float32, [None])
-        self._adv = tf.placeholder(tf.float32, [None])
-        self._ret = tf.placeholder(tf.float32, [None])
-        self._old_mu = tf.placeholder(tf.float32, [None, self._dim_act])
+        self._logp_old = self._rollout_placeholder(tf.float32, [None], staged=self._stage_rollout)
+        self._adv = self._rollout_placeholder(tf.float32, [None], staged=self._stage_rollout)
+        self._ret = self._rollout_placeholder(tf.float32, [None], staged=self._stage_rollout)
+        self._old_mu = self._rollout_placeholder(tf.float32, [None, self._dim_act], staged=self._stage_rollout)
         self._old_log_std = tf.placeholder(tf.float32, [self._dim_act])
 
         with tf.variable_scope("pi"):
@@ -70,34 +81,140 @@ class TRPO(Base):
         self._policy_grad_op = self._flat_param_list(tf.gradients(self.policy_loss, self.policy_vars))
         self._train_value_op = tf.train.AdamOptimizer(self._value_lr).minimize(value_loss)
 
-    def update(self, databatch):
+        # Prebuilt flat view of the policy parameters, so reading and writing them adds no ops to the graph.
+        self._get_flat_op = self._flat_param_list(self.policy_vars)
+        self._flat_ph = tf.placeholder(tf.float32, self._get_flat_op.shape, "flat_policy_params")
+        self._set_flat_op = self._assign_flat(self._flat_ph)
+
+        if self._in_graph:
+            self._build_in_graph_policy_update()
+
+    def _build_in_graph_policy_update(self):
+        """Build the conjugate gradient solve, the backtracking line search and the assignment
+        of the accepted parameters as one op, `self._train_policy_op`.
+
+        tf.gradients cannot be taken inside a tf.while_loop body, so the CG iterations are
+        unrolled `cg_iters` times; converged iterations take zero steps.
+        """
+        # Fisher-vector products on a random subsample of the batch.
+        n = tf.shape(self._obs)[0]
+        index = tf.range(n)
+        if self._fvp_subsample is not None:
+            k = tf.maximum(1, tf.to_int32(tf.to_float(n) * self._fvp_subsample))
+            index = tf.random_shuffle(index)[:k]
+        with tf.variable_scope("pi", reuse=True):
+            _, _, _, mu, log_std = self._policy_fn(tf.gather(self._obs, index), tf.gather(self._act, index))
+        d_kl = diagonal_gaussian_kl(mu, log_std, tf.gather(self._old_mu, index), self._old_log_std)
+        g_kl = self._flat_param_list(tf.gradients(d_kl, self.policy_vars))
+
+        def fvp(v):
+            return self._flat_param_list(tf.gradients(tf.reduce_sum(g_kl * tf.stop_gradient(v)), self.policy_vars))
+
+        # Conjugate gradient, same recursion as `_conjugate_gradient`.
+        g = self._policy_grad_op
+        x, p, r = tf.zeros_like(g), g, -g
+        rr = tf.reduce_sum(r * r)
+        active = tf.constant(True)
+        for _ in range(self._cg_iters):
+            Ap = fvp(p)
+            alpha = tf.where(active, rr / tf.reduce_sum(p * Ap), 0.)
+            x = x + alpha * p
+            r = r + alpha * Ap
+            rr_new = tf.reduce_sum(r * r)
+            beta = tf.where(active, rr_new / rr, 0.)
+            p = -r + beta * p
+            rr = tf.where(active, rr_new, rr)
+            active = tf.logical_and(active, rr >= 1e-8)
+
+        # Backtracking line search, evaluating the surrogate at candidate parameters without assigning them.
+        old_theta = self._get_flat_op
+        step = tf.sqrt(2 * self._delta / tf.reduce_sum(g * x)) * x
+
+        def cond(i, accepted):
+            return tf.logical_and(i < self._max_backtrack, tf.logical_not(accepted))
+
+        def body(i, accepted):
+            theta = old_theta - tf.pow(0.5, tf.to_float(i)) * step
+            new_loss, new_kl = self._surrogate_at(theta)
+            return i + 1, tf.logical_and(new_kl < self._delta, new_loss < self.policy_loss)
+
+        self._n_backtrack, self._accepted = tf.while_loop(cond, body, [tf.constant(0), tf.constant(False)])
+        new_theta = tf.cond(self._accepted,
+                            lambda: old_theta - tf.pow(0.5, tf.to_float(self._n_backtrack - 1)) * step,
+                            lambda: old_theta)
+        self._train_policy_op = self._assign_flat(new_theta)
+
+    def _surrogate_at(self, theta):
+        """Policy loss and KL of the policy network evaluated with flat parameters `theta`."""
+        offsets = {}
+        start = 0
+        for var in self.policy_vars:
+            size = int(np.prod(var.shape.as_list()))
+            offsets[var.op.name] = (start, size, var.shape.as_list())
+            start += size
+
+        def getter(getter, name, *args, **kwargs):
+            start, size, shape = offsets[name]
+            return tf.reshape(theta[start: start + size], shape)
+
+        with tf.variable_scope("pi", reuse=True, custom_getter=getter):
+            _, logp, _, mu, log_std = self._policy_fn(self._obs, self._act)
+        loss = -tf.reduce_mean(tf.exp(logp - self._logp_old) * self._adv)
+        return loss, diagonal_gaussian_kl(mu, log_std, self._old_mu, self._old_log_std)
+
+    def _assign_flat(self, theta):
+        """Op assigning the flat vector `theta` to the policy variables."""
+        assigns = []
+        start = 0
+        for var in self.policy_vars:
+            shape = var.shape.as_list()
+            size = int(np.prod(shape))
+            assigns.append(tf.assign(var, tf.reshape(theta[start: start + size], shape)))
+            start += size
+        return tf.group(*assigns)
+
+    def update(self, databatch, act_info=None):
         """
         参数:
             databatch：一个列表，分别是state, action, reward, done, early_stop, next_state。每个是矩阵或向量。
             state是状态，action是动作，reward是奖励，done是是否完结，early_stop是是否提前结束，next_state是下一个状态。
+            act_info：可选，get_action(return_info=True)返回的信息按行拼接，每个值与state一一对应。提供时不再重新计算logp、value和分布参数。
         """
-        preprocess_databatch = self._parse_databatch(*databatch)
+        preprocess_databatch = self._parse_databatch(*databatch, act_info=act_info)
 
         inputs = {k: v for k, v in zip(self.all_phs, preprocess_databatch)}
+        if self._stage_rollout:
+            inputs = {**self._stage_feed(inputs), self._stage_index: np.arange(len(preprocess_databatch[0]))}
 
         for i in range(self._train_epoch):
             self.sess.run(self._train_value_op, feed_dict=inputs)
 
-        old_policy_vars = self.sess.run(self._flat_param_list(self.policy_vars))
+        if self._in_graph:
+            _, n_backtrack, accepted = self.sess.run([self._train_policy_op, self._n_backtrack, self._accepted],
+                                                     feed_dict=inputs)
+            if accepted:
+                print(f"line search finished in the {n_backtrack - 1}th backtrack")
+            else:
+                print("line search failed.")
+        else:
+            self._update_policy(inputs)
+
+        # Save model.
+        global_step = self._increment_step()
+        if global_step % self._save_model_freq == 0:
+            self.save_model()
+
+    def _update_policy(self, inputs):
+        old_policy_vars = self.get_flat()
         policy_grad = self.sess.run(self._policy_grad_op, feed_dict=inputs)
-        step_direction = self._conjugate_gradient(policy_grad, inputs)
+        step_direction = self._conjugate_gradient(policy_grad, inputs, epoch=self._cg_iters)
         max_step_length = np.sqrt(2*self._delta/np.dot(policy_grad, step_direction))
 
         def func(theta):
             self._recover_param_list(theta)
             return self.sess.run([self.policy_loss, self.d_kl], feed_dict=inputs)
 
-        self._line_search(old_policy_vars, step_direction, max_step_length, func)
-
-        # Save model.
-        global_step, _ = self.sess.run([tf.train.get_global_step(), self.increment_global_step])
-        if global_step % self._save_model_freq == 0:
-            self.save_model()
+        self._line_search(old_policy_vars, step_direction, max_step_length, func, self._max_backtrack)
 
     def _line_search(self, old_theta, step_dir, step_len, target_func, max_backtrack=10):
         fval, _ = target_func(old_theta)
@@ -116,16 +233,15 @@ class TRPO(Base):
         return tf.concat([tf.reshape(t, [-1]) for t in ts], axis=0)
 
     def _recover_param_list(self, ts):
-        res = []
-        start = 0
-        for param in self.policy_vars:
-            shape = param.shape.as_list()
-            param_np = np.reshape(ts[start: start + np.prod(shape)], shape)
-            res.append(param_np)
-            start += np.prod(shape)
+        self.set_flat(ts)
 
-        assign_weight_op = [x.assign(y) for x, y in zip(self.policy_vars, res)]
-        self.sess.run(assign_weight_op)
+    def get_flat(self):
+        """Return the policy parameters as one flat vector."""
+        return self.sess.run(self._get_flat_op)
+
+    def set_flat(self, theta):
+        """Assign the flat vector `theta` to the policy parameters."""
+        self.sess.run(self._set_flat_op, feed_dict={self._flat_ph: theta})
 
     def _conjugate_gradient(self, g, inputs, residual_tol=1e-8, cg_damping=0.1, epoch=20):
         """计算H^{-1} g
@@ -148,43 +264,31 @@ class TRPO(Base):
                 break
         return x
 
-    def _parse_databatch(self, states, actions, rewards, dones, earlystops, nextstates):
-
-        batch_size = len(dones)
-        oldlogproba, values, old_mu, old_log_std = self.sess.run([self.logp, self.v, self.mu, self.log_std],
-                                                                 feed_dict={self._obs: states, self._act: actions})
-        nextvalues = self.sess.run(self.v, feed_dict={self._obs: nextstates})
-
-        returns = np.zeros(batch_size)
-        deltas = np.zeros(batch_size)
-        advantages = np.zeros(batch_size)
+    def _parse_databatch(self, states, actions, rewards, dones, earlystops, nextstates, act_info=None):
 
-        for i in reversed(range(batch_size)):
+        if act_info is None:
+            oldlogproba, values, old_mu, old_log_std = self.sess.run([self.logp, self.v, self.mu, self.log_std],
+                                                                     feed_dict={self._obs: states, self._act: actions})
+        else:
+            oldlogproba, values, old_mu = act_info["logp"], act_info["value"], act_info["mu"]
+            # log_std is state independent, every row holds the same vector.
+            old_log_std = np.reshape(act_info["log_std"], (-1, self._dim_act))[0]
+        nextvalues = self._bootstrap_values(dones, earlystops, nextstates)
 
-            if dones[i]:
-                prev_return = 0
-                prev_value = 0
-                prev_advantage = 0
-            elif earlystops[i]:
-                prev_return = nextvalues[i]
-                prev_value = prev_return
-                prev_advantage = 0
-
-            returns[i] = rewards[i] + self._discount * prev_return * (1 - dones[i])
-            deltas[i] = rewards[i] + self._discount * prev_value * (1 - dones[i]) - values[i]
-            # ref: https://arxiv.org/pdf/1506.02438.pdf (generalization advantage estimate)
-            advantages[i] = deltas[i] + self._discount * self._gae * prev_advantage * (1 - dones[i])
-
-            prev_return = returns[i]
-            prev_value = values[i]
-            prev_advantage = advantages[i]
+        returns, _, advantages = compute_returns_advantages(rewards, values, nextvalues, dones, earlystops,
+                                                            self._discount, self._gae)
 
         advantages = (advantages - advantages.mean()) / advantages.std()
 
         return [states, actions, advantages, returns, oldlogproba, old_mu, old_log_std]
 
-    def get_action(self, obs) -> np.ndarray:
+    def get_action(self, obs, return_info=False):
         """给定状态，返回动作。状态大小是(batchsize, *obs.dim)
+        return_info为True时，同时返回{"logp", "value", "mu", "log_std"}，用作update的act_info。
         """
-        a = self.sess.run(self.pi, feed_dict={self._obs: obs})
-        return a
+        if not return_info:
+            a = self.sess.run(self.pi, feed_dict={self._obs: obs})
+            return a
+
+        a, logp, v, mu, log_std = self.sess.run([self.pi, self.logp_pi, self.v, self.mu, self.log_std], feed_dict={self._obs: obs})
+        return a, {"logp": logp, "value": v, "mu": mu, "log_std": log_std}
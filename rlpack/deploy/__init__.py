@@ -0,0 +1 @@
+from .numpy_policy import NumpyPolicy
@@ -0,0 +1,70 @@
+"""
+Export policies built with `rlpack.utils.network` to the `.npz` format read by `NumpyPolicy`.
+
+This module needs TensorFlow and is not imported by `rlpack.deploy`.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+from .numpy_policy import ACTIVATIONS, KINDS
+
+
+def _activation_name(fn):
+    name = "" if fn is None else fn.__name__
+    assert name in ACTIVATIONS, f"Activation {name} is not supported by NumpyPolicy."
+    return name
+
+
+def _quantize(w, dtype, name, arrays):
+    if dtype == "float32":
+        arrays[name] = w.astype(np.float32)
+    elif dtype == "float16":
+        arrays[name] = w.astype(np.float16)
+    elif dtype == "int8":
+        # 按输出列对称量化。
+        scale = np.maximum(np.abs(w).max(axis=0), 1e-8) / 127.
+        arrays[name] = np.round(w / scale).astype(np.int8)
+        arrays[f"{name}_scale"] = scale.astype(np.float32)
+    else:
+        raise ValueError(f"Unsupported weight dtype {dtype}.")
+
+
+def export_policy(sess, scope, path, kind="gaussian", activation=tf.nn.relu, output_activation=None,
+                  weight_dtype="float32", log_std_min=-20, log_std_max=2):
+    """Save the policy under variable `scope` to `path`.
+
+    kind："mlp"、"gaussian"或"gaussian2"，分别对应mlp、mlp_gaussian_policy、mlp_gaussian_policy2。
+    activation，output_activation：与构建策略时传入的一致。
+    weight_dtype："float32"、"float16"或"int8"，只影响kernel的存储。
+    log_std_min，log_std_max：与mlp_gaussian_policy2的LOG_STD_MIN、LOG_STD_MAX一致。
+    """
+    assert kind in KINDS, f"Unknown policy kind {kind}."
+    variables = tf.trainable_variables(scope)
+    log_std_vars = [v for v in variables if v.op.name.endswith("/log_std")]
+    dense_vars = [v for v in variables if not v.op.name.endswith("/log_std")]
+    assert len(dense_vars) % 2 == 0 and all(
+        k.op.name.endswith("/kernel") and b.op.name.endswith("/bias") for k, b in zip(dense_vars[::2], dense_vars[1::2])
+    ), f"Variables under {scope} are not a stack of dense layers."
+
+    values = sess.run(variables)
+    values = dict(zip(variables, values))
+
+    arrays = {
+        "kind": np.array(kind),
+        "activation": np.array(_activation_name(activation)),
+        "output_activation": np.array(_activation_name(output_activation)),
+        "n_layer": np.array(len(dense_vars) // 2),
+    }
+    for i, (kernel, bias) in enumerate(zip(dense_vars[::2], dense_vars[1::2])):
+        _quantize(values[kernel], weight_dtype, f"W{i}", arrays)
+        arrays[f"b{i}"] = values[bias].astype(np.float32)
+
+    if kind == "gaussian":
+        assert len(log_std_vars) == 1, f"Expect one log_std variable under {scope}."
+        arrays["log_std"] = values[log_std_vars[0]].astype(np.float32)
+    if kind == "gaussian2":
+        arrays["log_std_min"] = np.array(log_std_min, dtype=np.float32)
+        arrays["log_std_max"] = np.array(log_std_max, dtype=np.float32)
+
+    np.savez(path, **arrays)
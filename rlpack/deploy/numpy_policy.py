@@ -0,0 +1,134 @@
+"""
+A NumPy runtime for policies exported by `rlpack.deploy.export`.
+
+Only numpy is imported, so env workers can load a policy and act without
+TensorFlow. The dense layers run into preallocated activation buffers with
+in-place bias and activation. float16/int8 files are dequantized to float32
+once on load.
+
+File format (`.npz`):
+    kind: "mlp" | "gaussian" | "gaussian2", i.e. `mlp`, `mlp_gaussian_policy` or `mlp_gaussian_policy2`.
+    activation, output_activation: names in `ACTIVATIONS`, "" for none.
+    n_layer: number of dense layers, in creation order.
+    W{i}, b{i}: kernel [in, out] and bias of layer i. int8 kernels come with per-column `W{i}_scale`.
+    log_std: state independent log std for "gaussian".
+    log_std_min, log_std_max: bounds of the log std head for "gaussian2".
+"""
+
+import numpy as np
+
+KINDS = ("mlp", "gaussian", "gaussian2")
+
+
+def _relu(x):
+    np.maximum(x, 0, out=x)
+
+
+def _tanh(x):
+    np.tanh(x, out=x)
+
+
+def _sigmoid(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    x += 1
+    np.reciprocal(x, out=x)
+
+
+ACTIVATIONS = {"relu": _relu, "tanh": _tanh, "sigmoid": _sigmoid, "": None}
+
+
+def _dequantize(data, i):
+    w = data[f"W{i}"]
+    if w.dtype == np.int8:
+        return w.astype(np.float32) * data[f"W{i}_scale"]
+    return w.astype(np.float32)
+
+
+class NumpyPolicy(object):
+    def __init__(self, path, max_batch=1, seed=None):
+        """
+        path：export_policy导出的.npz文件。
+        max_batch：预分配激活的batch大小，更大的batch会重新分配。
+        """
+        with np.load(path) as data:
+            self.kind = str(data["kind"])
+            assert self.kind in KINDS, f"Unknown policy kind {self.kind}."
+            activation = ACTIVATIONS[str(data["activation"])]
+            output_activation = ACTIVATIONS[str(data["output_activation"])]
+            n_layer = int(data["n_layer"])
+            weights = [_dequantize(data, i) for i in range(n_layer)]
+            biases = [data[f"b{i}"].astype(np.float32) for i in range(n_layer)]
+
+            if self.kind == "gaussian":
+                self._std = np.exp(data["log_std"].astype(np.float32))
+            if self.kind == "gaussian2":
+                self._log_std_min = float(data["log_std_min"])
+                self._log_std_max = float(data["log_std_max"])
+
+        if self.kind == "gaussian2":
+            # mu和log_std两个head共享输入，合并成一次matmul。
+            weights[-2:] = [np.concatenate(weights[-2:], axis=1)]
+            biases[-2:] = [np.concatenate(biases[-2:])]
+            self.dim_act = len(biases[-1]) // 2
+            activations = [activation] * (len(weights) - 1) + [None]
+        else:
+            self.dim_act = len(biases[-1])
+            activations = [activation] * (len(weights) - 1) + [output_activation]
+        self._output_activation = output_activation
+
+        self._layers = list(zip(weights, biases, activations))
+        self.dim_obs = weights[0].shape[0]
+        self._rng = np.random.RandomState(seed)
+        self._allocate(max_batch)
+
+    def _allocate(self, max_batch):
+        self._max_batch = max_batch
+        self._buffers = [np.empty((max_batch, w.shape[1]), dtype=np.float32) for w, _, _ in self._layers]
+
+    def _forward(self, obs):
+        """返回最后一层输出，是内部buffer的视图。"""
+        x = np.asarray(obs, dtype=np.float32).reshape(-1, self.dim_obs)
+        n = len(x)
+        if n > self._max_batch:
+            self._allocate(n)
+
+        for (w, b, activation), buf in zip(self._layers, self._buffers):
+            out = buf[:n]
+            np.dot(x, w, out=out)
+            out += b
+            if activation is not None:
+                activation(out)
+            x = out
+        return x
+
+    def mu(self, obs):
+        """确定性动作，对应TF中的mu（gaussian2已经过tanh）。"""
+        out = self._forward(obs)
+        if self.kind == "gaussian2":
+            mu = out[:, :self.dim_act].copy()
+            if self._output_activation is not None:
+                self._output_activation(mu)
+            return np.tanh(mu, out=mu)
+        return out.copy()
+
+    def pi(self, obs):
+        """采样动作，对应TF中的pi。"""
+        out = self._forward(obs)
+        if self.kind == "mlp":
+            return out.copy()
+
+        noise = self._rng.standard_normal((len(out), self.dim_act)).astype(np.float32)
+        if self.kind == "gaussian":
+            return out + noise * self._std
+
+        mu = out[:, :self.dim_act].copy()
+        if self._output_activation is not None:
+            self._output_activation(mu)
+        log_std = np.tanh(out[:, self.dim_act:])
+        log_std = self._log_std_min + 0.5 * (self._log_std_max - self._log_std_min) * (log_std + 1)
+        pi = mu + noise * np.exp(log_std)
+        return np.tanh(pi, out=pi)
+
+    def get_action(self, obs, deterministic=False):
+        return self.mu(obs) if deterministic else self.pi(obs)
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from rlpack.deploy import NumpyPolicy
+
+
+def _save(path, kind, layers, activation="relu", output_activation="", **extra):
+    arrays = {"kind": np.array(kind), "activation": np.array(activation),
+              "output_activation": np.array(output_activation), "n_layer": np.array(len(layers))}
+    for i, (w, b) in enumerate(layers):
+        arrays[f"W{i}"], arrays[f"b{i}"] = w, b
+    arrays.update(extra)
+    np.savez(path, **arrays)
+
+
+def _layers(sizes, rng):
+    return [(rng.randn(m, n).astype(np.float32), rng.randn(n).astype(np.float32)) for m, n in zip(sizes[:-1], sizes[1:])]
+
+
+def _reference(x, layers, activation, output_activation=None):
+    for i, (w, b) in enumerate(layers):
+        x = x @ w + b
+        fn = activation if i < len(layers) - 1 else output_activation
+        if fn is not None:
+            x = fn(x)
+    return x
+
+
+def test_mlp_matches_reference(tmp_path):
+    rng = np.random.RandomState(0)
+    layers = _layers([5, 16, 16, 3], rng)
+    _save(tmp_path / "p.npz", "mlp", layers, output_activation="tanh")
+    policy = NumpyPolicy(tmp_path / "p.npz", max_batch=2)
+
+    for n in (1, 2, 7):
+        obs = rng.randn(n, 5).astype(np.float32)
+        expected = _reference(obs, layers, lambda x: np.maximum(x, 0), np.tanh)
+        np.testing.assert_allclose(policy.pi(obs), expected, rtol=1e-5, atol=1e-5)
+        np.testing.assert_allclose(policy.mu(obs), expected, rtol=1e-5, atol=1e-5)
+
+
+def test_gaussian2_heads(tmp_path):
+    rng = np.random.RandomState(1)
+    trunk = _layers([4, 8, 8], rng)
+    heads = _layers([8, 2], rng) + _layers([8, 2], rng)
+    _save(tmp_path / "p.npz", "gaussian2", trunk + heads, activation="tanh",
+          log_std_min=np.array(-20.), log_std_max=np.array(2.))
+    policy = NumpyPolicy(tmp_path / "p.npz", seed=0)
+
+    obs = rng.randn(6, 4).astype(np.float32)
+    net = _reference(obs, trunk, np.tanh, np.tanh)
+    mu = np.tanh(net @ heads[0][0] + heads[0][1])
+    np.testing.assert_allclose(policy.mu(obs), mu, rtol=1e-5, atol=1e-5)
+
+    pi = policy.pi(obs)
+    assert pi.shape == (6, 2)
+    assert np.all(np.abs(pi) <= 1)
+
+
+def test_gaussian_sampling(tmp_path):
+    rng = np.random.RandomState(2)
+    layers = _layers([3, 2], rng)
+    _save(tmp_path / "p.npz", "gaussian", layers, log_std=np.full(2, -0.5, dtype=np.float32))
+    policy = NumpyPolicy(tmp_path / "p.npz", seed=0)
+
+    obs = np.tile(rng.randn(1, 3).astype(np.float32), (20000, 1))
+    pi = policy.pi(obs)
+    np.testing.assert_allclose(pi.mean(axis=0), policy.mu(obs[:1])[0], atol=0.02)
+    np.testing.assert_allclose(pi.std(axis=0), np.exp(-0.5), atol=0.02)
+
+
+def test_int8_weights(tmp_path):
+    rng = np.random.RandomState(3)
+    layers = _layers([5, 32, 2], rng)
+    _save(tmp_path / "f.npz", "mlp", layers)
+    quantized = []
+    extra = {}
+    for i, (w, b) in enumerate(layers):
+        scale = np.abs(w).max(axis=0) / 127.
+        quantized.append((np.round(w / scale).astype(np.int8), b))
+        extra[f"W{i}_scale"] = scale.astype(np.float32)
+    _save(tmp_path / "q.npz", "mlp", quantized, **extra)
+
+    obs = rng.randn(10, 5).astype(np.float32)
+    expected = NumpyPolicy(tmp_path / "f.npz").mu(obs)
+    np.testing.assert_allclose(NumpyPolicy(tmp_path / "q.npz").mu(obs), expected, rtol=0.05, atol=0.1)
+
+
+@pytest.mark.parametrize("weight_dtype", ["float32", "float16"])
+def test_export_matches_tf(tmp_path, weight_dtype):
+    tf = pytest.importorskip("tensorflow")
+    from rlpack.deploy.export import export_policy
+    from rlpack.utils import mlp_gaussian_policy2
+
+    graph = tf.Graph()
+    with graph.as_default():
+        x = tf.placeholder(tf.float32, [None, 4])
+        a = tf.placeholder(tf.float32, [None, 2])
+        with tf.variable_scope("main/policy"):
+            mu, _, _ = mlp_gaussian_policy2(x, a, (16, 16))
+        sess = tf.Session(graph=graph)
+        sess.run(tf.global_variables_initializer())
+        export_policy(sess, "main/policy", tmp_path / "p.npz", kind="gaussian2", weight_dtype=weight_dtype)
+
+        obs = np.random.randn(5, 4).astype(np.float32)
+        expected = sess.run(mu, feed_dict={x: obs})
+
+    np.testing.assert_allclose(NumpyPolicy(tmp_path / "p.npz").mu(obs), expected, rtol=1e-2, atol=1e-2)
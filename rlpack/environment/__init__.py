@@ -4,4 +4,5 @@ from .env_wrapper import AtariWrapper
 from .env_wrapper import MujocoWrapper
 from .env_wrapper import AsyncEnvWrapper
 from .env_wrapper import ClassicControlWrapper
-from .atari_wrappers import make_ramatari, make_atari
+from .atari_wrappers import make_ramatari, make_atari, ResetCache
+from .vec_classic_control import make_vec_classic_control
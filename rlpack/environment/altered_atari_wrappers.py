@@ -6,6 +6,9 @@ import gym
 import numpy as np
 from gym import spaces
 
+from .atari_wrappers import RamStack as _RamStack
+from .atari_wrappers import RingFrameStack
+
 os.environ.setdefault('PATH', '')
 cv2.ocl.setUseOpenCL(False)
 
@@ -258,25 +261,15 @@ class NeverStop(gym.Wrapper):
         return self.env.action_space.sample()
 
 
-class RamStack(gym.Wrapper):
+class RamStack(_RamStack):
     def __init__(self, env):
-        gym.Wrapper.__init__(self, env)
-
-        self._dim_act = self.env.dim_action
-        self._dim_obs = self.env.dim_observation
+        """Stack the 4 last RAM vectors into a contiguous (128, 4) uint8 array."""
+        _RamStack.__init__(self, env, 4)
 
-    def reset(self):
-        ob = self.env.reset()
-        print("ob shape:", ob.shape, "dtype:", ob.dtype, "type:", type(ob))
-        input()
-        return ob.reshape(4, 128).swapaxes(0, 1)
-
-    def step(self, action):
-        ob, rew, done, info = self.env.step(action)
-        return ob.reshape(4, 128).swapaxes(0, 1), rew, done, info
+        self._dim_act = self.env.action_space.n
 
     def sample_action(self):
-        return self.env.sample_action()
+        return self.env.action_space.sample()
 
     @property
     def dim_action(self):
@@ -287,23 +280,18 @@ class RamStack(gym.Wrapper):
         return (128, 4)
 
 
-class RamStack2(gym.Wrapper):
+class RamStack2(_RamStack):
     def __init__(self, env):
-        gym.Wrapper.__init__(self, env)
-
-        self._dim_act = self.env.dim_action
-        self._dim_obs = self.env.dim_observation
+        """Stack the 4 last RAM vectors into a (512,) uint8 array, frame after frame.
 
-    def reset(self):
-        ob = self.env.reset()
-        return ob
+        Wraps NeverStop: when done, the stack restarts from the first frame of the next episode.
+        """
+        _RamStack.__init__(self, env, 4, flatten=True, refill_on_done=True)
 
-    def step(self, action):
-        ob, rew, done, info = self.env.step(action)
-        return ob, rew, done, info
+        self._dim_act = self.env.action_space.n
 
     def sample_action(self):
-        return self.env.sample_action()
+        return self.env.action_space.sample()
 
     @property
     def dim_action(self):
@@ -367,7 +355,7 @@ def old_make_atari(env_id, timelimit=True):
     return env
 
 
-def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False, warp=True):
+def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False, warp=True, ring_buffer=False):
     """Configure environment for DeepMind-style Atari.
     """
     if episode_life:
@@ -381,14 +369,14 @@ def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False,
     if clip_rewards:
         env = ClipRewardEnv(env)
     if frame_stack:
-        env = FrameStack(env, 4)
+        env = RingFrameStack(env, 4) if ring_buffer else FrameStack(env, 4)
     return env
 
 
-def make_atari(env_name):
+def make_atari(env_name, ring_buffer=False):
     assert "NoFrameskip" in env_name and "ramNoFrameskip" not in env_name
     env = old_make_atari(env_name)
-    env = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=True, scale=False)
+    env = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=True, scale=False, ring_buffer=ring_buffer)
     # env = NeverStop(env)
     return env
 
@@ -397,7 +385,7 @@ def make_ram_atari(env_name):
     assert "ramNoFrameskip" in env_name
 
     env = old_make_atari(env_name)
-    env = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=True, scale=False, warp=False)
+    env = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False, warp=False)
     # env = NeverStop(env)
     env = RamStack(env)
     return env
@@ -407,7 +395,7 @@ def make_ram_atari2(env_name):
     assert "ramNoFrameskip" in env_name
 
     env = old_make_atari(env_name)
-    env = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=True, scale=False, warp=False)
+    env = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False, warp=False)
     env = NeverStop(env)
     env = RamStack2(env)
     return env
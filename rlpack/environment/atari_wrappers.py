@@ -8,20 +8,82 @@ import cv2
 cv2.ocl.setUseOpenCL(False)
 
 
+class ResetCache(object):
+    def __init__(self, pool_size=32, refresh_prob=0.05, refresh="random", seed=None):
+        """A pool of post-reset emulator snapshots shared by `NoopResetEnv` and `FireResetEnv`.
+
+        Until the pool is full every reset is done for real and its final state
+        recorded. Afterwards a reset restores a uniformly chosen snapshot, except
+        that with probability `refresh_prob` it is done for real and replaces the
+        `"random"` or `"oldest"` entry, so start states keep being resampled.
+        Snapshots carry the emulator RNG and all choices use a RandomState seeded
+        by `seed`, so reset distributions are reproducible.
+        """
+        assert refresh in ("random", "oldest")
+        self.pool_size = pool_size
+        self.refresh_prob = refresh_prob
+        self.refresh = refresh
+        self.rng = np.random.RandomState(seed)
+        self.hit = False
+        self.fire = False
+        self._entries = []
+        self._oldest = 0
+        self._reset_pending = False
+
+    def lookup(self):
+        """Return a (state, obs) snapshot, or None if this reset must be done for real."""
+        self._reset_pending = True
+        if len(self._entries) < self.pool_size or self.rng.rand() < self.refresh_prob:
+            self.hit = False
+            return None
+        self.hit = True
+        return self._entries[self.rng.randint(len(self._entries))]
+
+    def take_reset(self):
+        """Return whether `lookup` ran since the last call, i.e. the emulator was really reset.
+
+        `FireResetEnv` sits outside `EpisodicLifeEnv`, so it is also reset on a lost life, which
+        must neither reuse `hit` nor record a mid-episode state.
+        """
+        pending, self._reset_pending = self._reset_pending, False
+        return pending
+
+    def record(self, state, obs):
+        entry = (state, np.array(obs))
+        if len(self._entries) < self.pool_size:
+            self._entries.append(entry)
+        elif self.refresh == "oldest":
+            self._entries[self._oldest] = entry
+            self._oldest = (self._oldest + 1) % self.pool_size
+        else:
+            self._entries[self.rng.randint(self.pool_size)] = entry
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class NoopResetEnv(gym.Wrapper):
-    def __init__(self, env, noop_max=30):
+    def __init__(self, env, noop_max=30, reset_cache=None):
         """Sample initial states by taking random number of no-ops on reset.
         No-op is assumed to be action 0.
+        With a `ResetCache`, reset restores a cached post-reset snapshot instead.
         """
         gym.Wrapper.__init__(self, env)
         self.noop_max = noop_max
         self.override_num_noops = None
         self.noop_action = 0
+        self.reset_cache = reset_cache
         assert env.unwrapped.get_action_meanings()[0] == 'NOOP'
 
     def reset(self, **kwargs):
         """ Do no-op action for a number of steps in [1, noop_max]."""
         self.env.reset(**kwargs)
+        if self.reset_cache is not None:
+            entry = self.reset_cache.lookup()
+            if entry is not None:
+                state, obs = entry
+                self.unwrapped.restore_full_state(state)
+                return obs.copy()
         if self.override_num_noops is not None:
             noops = self.override_num_noops
         else:
@@ -32,6 +94,8 @@ class NoopResetEnv(gym.Wrapper):
             obs, _, done, _ = self.env.step(self.noop_action)
             if done:
                 obs = self.env.reset(**kwargs)
+        if self.reset_cache is not None and not self.reset_cache.fire:
+            self.reset_cache.record(self.unwrapped.clone_full_state(), obs)
         return obs
 
     def step(self, ac):
@@ -39,20 +103,30 @@ class NoopResetEnv(gym.Wrapper):
 
 
 class FireResetEnv(gym.Wrapper):
-    def __init__(self, env):
-        """Take action on reset for environments that are fixed until firing."""
+    def __init__(self, env, reset_cache=None):
+        """Take action on reset for environments that are fixed until firing.
+        With a `ResetCache` (the one given to `NoopResetEnv`), the post-fire state is cached.
+        """
         gym.Wrapper.__init__(self, env)
         assert env.unwrapped.get_action_meanings()[1] == 'FIRE'
         assert len(env.unwrapped.get_action_meanings()) >= 3
+        self.reset_cache = reset_cache
+        if reset_cache is not None:
+            reset_cache.fire = True
 
     def reset(self, **kwargs):
-        self.env.reset(**kwargs)
+        obs = self.env.reset(**kwargs)
+        real_reset = self.reset_cache is not None and self.reset_cache.take_reset()
+        if real_reset and self.reset_cache.hit:
+            return obs
         obs, _, done, _ = self.env.step(1)
         if done:
             self.env.reset(**kwargs)
         obs, _, done, _ = self.env.step(2)
         if done:
             self.env.reset(**kwargs)
+        if real_reset:
+            self.reset_cache.record(self.unwrapped.clone_full_state(), obs)
         return obs
 
     def step(self, ac):
@@ -127,6 +201,65 @@ class MaxAndSkipEnv(gym.Wrapper):
         return self.env.reset(**kwargs)
 
 
+class GrayscaleMaxAndSkipEnv(gym.Wrapper):
+    def __init__(self, env, skip=4, width=84, height=84):
+        """Fused `MaxAndSkipEnv` + grayscale `WarpFrame`.
+
+        Acts on ALE directly and reads grayscale screens into preallocated
+        buffers only on the last two skipped frames, instead of fetching an RGB
+        frame every time. Output matches the unfused chain up to the rounding
+        of ALE's grayscale palette versus `cv2.cvtColor`.
+
+        Since `ale.act` bypasses `env.step`, gym's `TimeLimit` does not see these
+        frames; its limit is enforced here instead.
+        """
+        gym.Wrapper.__init__(self, env)
+        self._skip = skip
+        self.width = width
+        self.height = height
+        self._ale = env.unwrapped.ale
+        self._action_set = env.unwrapped._action_set
+        screen_width, screen_height = self._ale.getScreenDims()
+        self._screen_buffer = np.zeros((2, screen_height, screen_width), dtype=np.uint8)
+        self._max_episode_steps = env.spec.max_episode_steps if env.spec is not None else None
+        self._elapsed_steps = 0
+        self.observation_space = spaces.Box(low=0, high=255, shape=(height, width, 1), dtype=np.uint8)
+
+    def step(self, action):
+        """Repeat action, sum reward, and max over last two grayscale screens."""
+        total_reward = 0.0
+        done = False
+        info = {}
+        a = self._action_set[action]
+        for i in range(self._skip):
+            total_reward += self._ale.act(a)
+            self._elapsed_steps += 1
+            if i == self._skip - 2:
+                self._ale.getScreenGrayscale(self._screen_buffer[0])
+            if i == self._skip - 1:
+                self._ale.getScreenGrayscale(self._screen_buffer[1])
+            done = self._ale.game_over()
+            if self._max_episode_steps is not None and self._elapsed_steps >= self._max_episode_steps:
+                done = True
+                info['TimeLimit.truncated'] = True
+            if done:
+                break
+        info['ale.lives'] = self._ale.lives()
+        return self._observation(), total_reward, done, info
+
+    def reset(self, **kwargs):
+        self.env.reset(**kwargs)
+        self._elapsed_steps = 0
+        self._ale.getScreenGrayscale(self._screen_buffer[0])
+        self._screen_buffer[1] = self._screen_buffer[0]
+        return self._observation()
+
+    def _observation(self):
+        max_frame = np.maximum(self._screen_buffer[0], self._screen_buffer[1], out=self._screen_buffer[0])
+        frame = cv2.resize(max_frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        return frame[:, :, None]
+
+
 class ClipRewardEnv(gym.RewardWrapper):
     def __init__(self, env):
         gym.RewardWrapper.__init__(self, env)
@@ -189,6 +322,49 @@ class FrameStack(gym.Wrapper):
         return LazyFrames(list(self.frames))
 
 
+class RingFrameStack(gym.Wrapper):
+    def __init__(self, env, k):
+        """Stack k last frames in a preallocated ring buffer.
+
+        Every frame is written twice, at slot t and t + k of a buffer holding 2k
+        frames, so the k most recent frames are always adjacent and the
+        observation is a view `buffer[..., t*c:(t+k)*c]` without concatenation.
+        Stacking costs one frame copy per step instead of rebuilding the stack.
+
+        The returned view is only valid until the next `step`/`reset`. Call
+        `copy_to` (or `np.array`) to keep it, e.g. to fill a batch slot.
+        """
+        gym.Wrapper.__init__(self, env)
+        self.k = k
+        shp = env.observation_space.shape
+        self._c = shp[-1]
+        self._t = 0
+        self._buffer = np.zeros(shp[:-1] + (shp[-1] * 2 * k,), dtype=env.observation_space.dtype)
+        self.observation_space = spaces.Box(low=0, high=255, shape=(shp[:-1] + (shp[-1] * k,)), dtype=env.observation_space.dtype)
+
+    def reset(self):
+        ob = self.env.reset()
+        self._buffer[...] = np.tile(ob, 2 * self.k)
+        self._t = 0
+        return self._get_ob()
+
+    def step(self, action):
+        ob, reward, done, info = self.env.step(action)
+        c, t = self._c, self._t
+        self._buffer[..., t * c:(t + 1) * c] = ob
+        self._buffer[..., (t + self.k) * c:(t + self.k + 1) * c] = ob
+        self._t = (t + 1) % self.k
+        return self._get_ob(), reward, done, info
+
+    def _get_ob(self):
+        return self._buffer[..., self._t * self._c:(self._t + self.k) * self._c]
+
+    def copy_to(self, out):
+        """Copy the current stacked observation into `out`, e.g. a row of a batch array."""
+        np.copyto(out, self._get_ob(), casting='unsafe')
+        return out
+
+
 class ScaledFloatFrame(gym.ObservationWrapper):
     def __init__(self, env):
         gym.ObservationWrapper.__init__(self, env)
@@ -249,45 +425,73 @@ class TimeLimit(gym.Wrapper):
 
 
 class RamStack(gym.Wrapper):
-    def __init__(self, env):
+    def __init__(self, env, k=4, flatten=False, refill_on_done=False):
+        """Stack the k last RAM vectors into a contiguous (128, k) uint8 array.
+
+        Frames are written into a preallocated ring, one column per step, and
+        each observation is a single ordered copy of the ring (oldest frame
+        first), so no LazyFrames or transposed views are built. With `flatten`,
+        the observation is (128 * k,), frame after frame.
+        With `refill_on_done`, the wrapped env resets itself when done (e.g. NeverStop) and
+        returns the first frame of the next episode, which then refills the ring as a reset does.
+        """
         gym.Wrapper.__init__(self, env)
-        # self._dim_act = self.env.dim_action
-        # self._dim_obs = self.env.dim_observation
+        self.k = k
+        self.flatten = flatten
+        self.refill_on_done = refill_on_done
+        ram_size = env.observation_space.shape[0]
+        self._axis = 0 if flatten else 1
+        self._ring = np.zeros((k, ram_size) if flatten else (ram_size, k), dtype=np.uint8)
+        self._frames = np.moveaxis(self._ring, self._axis, 0)
+        self._order = [np.roll(np.arange(k), -t) for t in range(k)]
+        self._t = 0
+        shape = (ram_size * k,) if flatten else (ram_size, k)
+        self.observation_space = spaces.Box(low=0, high=255, shape=shape, dtype=np.uint8)
 
     def reset(self):
         ob = self.env.reset()
-        return np.array(ob).reshape(4, 128).swapaxes(0, 1)
+        self._frames[:] = ob
+        self._t = 0
+        return self._get_ob()
 
     def step(self, action):
         ob, rew, done, info = self.env.step(action)
-        return np.array(ob).reshape(4, 128).swapaxes(0, 1), rew, done, info
-
-    # @property
-    # def dim_action(self):
-    #     return self._dim_act
+        if done and self.refill_on_done:
+            self._frames[:] = ob
+            self._t = 0
+        else:
+            self._frames[self._t] = ob
+            self._t = (self._t + 1) % self.k
+        return self._get_ob(), rew, done, info
 
-    # @property
-    # def dim_observation(self):
-    #     return (128, 4)
+    def _get_ob(self):
+        ob = self._ring.take(self._order[self._t], axis=self._axis)
+        return ob.reshape(-1) if self.flatten else ob
 
 
-def make_oldatari(env_id, max_episode_steps=None):
+def make_oldatari(env_id, max_episode_steps=None, fused=False, reset_cache=None):
     env = gym.make(env_id)
     assert 'NoFrameskip' in env.spec.id
-    env = NoopResetEnv(env, noop_max=30)
-    env = MaxAndSkipEnv(env, skip=4)
+    # GrayscaleMaxAndSkipEnv reads the screen on reset, which a restored snapshot does not carry.
+    assert not (fused and reset_cache is not None)
+    env = NoopResetEnv(env, noop_max=30, reset_cache=reset_cache)
+    env = GrayscaleMaxAndSkipEnv(env, skip=4) if fused else MaxAndSkipEnv(env, skip=4)
     if max_episode_steps is not None:
         env = TimeLimit(env, max_episode_steps=max_episode_steps)
     return env
 
 
-def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False, warp=True):
+def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False, warp=True, ring_buffer=False,
+                  reset_cache=None):
     """Configure environment for DeepMind-style Atari.
+
+    With `ring_buffer`, frames are stacked by `RingFrameStack`, whose observations
+    are views overwritten on the next step, instead of `LazyFrames`.
     """
     if episode_life:
         env = EpisodicLifeEnv(env)
     if 'FIRE' in env.unwrapped.get_action_meanings():
-        env = FireResetEnv(env)
+        env = FireResetEnv(env, reset_cache=reset_cache)
     if warp:
         env = WarpFrame(env)
     if scale:
@@ -295,21 +499,24 @@ def wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False,
     if clip_rewards:
         env = ClipRewardEnv(env)
     if frame_stack:
-        env = FrameStack(env, 4)
+        env = RingFrameStack(env, 4) if ring_buffer else FrameStack(env, 4)
     return env
 
 
-def make_atari(env_id, max_episode_steps=None):
-    env = make_oldatari(env_id, max_episode_steps)
-    env = wrap_deepmind(env, frame_stack=True)
+def make_atari(env_id, max_episode_steps=None, ring_buffer=False, fused=False, reset_cache=None):
+    """With `fused`, frames are grayscaled, max-pooled and resized by `GrayscaleMaxAndSkipEnv`.
+    With a `ResetCache`, resets restore cached post-noop, post-fire snapshots.
+    """
+    env = make_oldatari(env_id, max_episode_steps, fused=fused, reset_cache=reset_cache)
+    env = wrap_deepmind(env, frame_stack=True, warp=not fused, ring_buffer=ring_buffer, reset_cache=reset_cache)
     return env
 
 
 def make_ramatari(env_id, max_episode_steps=None):
     env = make_oldatari(env_id, max_episode_steps)
     assert "ramNoFrameskip" in env.spec.id
-    env = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=True, scale=False, warp=False)
-    env = RamStack(env)
+    env = wrap_deepmind(env, episode_life=True, clip_rewards=True, frame_stack=False, scale=False, warp=False)
+    env = RamStack(env, 4)
     return env
 
 
@@ -14,11 +14,16 @@ signal.signal(signal.SIGINT, exit_gracefully)
 class DistributedEnvClient(Process):
     """
     Start on worker client.
+
+    `env` can be one environment or a list of environments. All environments
+    of a client share one action queue and one srd queue, and each message
+    carries the records of every environment stepped in that round.
     """
 
     def __init__(self, env, hostname='localhost', port=50000):
         super().__init__()
-        self.env = env
+        self.envs = list(env) if isinstance(env, (list, tuple)) else [env]
+        self.env = self.envs[0]
         self._dim_observation = self.env.dim_observation
         self._dim_action = self.env.dim_action
 
@@ -32,22 +37,25 @@ class DistributedEnvClient(Process):
         self.m = SharedMemoryManager(address=(hostname, port), authkey=b'abab')
         self.m.connect()
         config_queue = self.m.get_config()
-        config_json = config_queue.get()
-        self.env_id = config_json['env_id']
+        self.env_ids = [config_queue.get()['env_id'] for _ in self.envs]
+        self.env_id = self.env_ids[0]
         self.srd_queue = self.m.get_srd(self.env_id)
         self.a_queue = self.m.get_a(self.env_id)
 
-        s = self.env.reset()
-        self.srd_queue.put([s])
+        self.srd_queue.put([(env_id, env.reset()) for env_id, env in zip(self.env_ids, self.envs)])
 
     def run(self):
         """Run forever. If done, reset."""
+        id2env = dict(zip(self.env_ids, self.envs))
         while True:
-            action = self.a_queue.get()
+            batch = self.a_queue.get()
 
-            ob, reward, done, info = self.env.step(action)
+            records = []
+            for env_id, action in batch:
+                ob, reward, done, info = id2env[env_id].step(action)
+                records.append((env_id, ob, reward, done, info))
 
-            self.srd_queue.put((ob, reward, done, info))
+            self.srd_queue.put(records)
 
     @property
     def dim_observation(self):
@@ -1,6 +1,7 @@
 import signal
 import sys
 import time
+from collections import defaultdict, deque
 from multiprocessing.managers import BaseManager
 from queue import Empty, Queue
 from threading import Thread
@@ -19,6 +20,11 @@ signal.signal(signal.SIGINT, exit_gracefully)
 class DistributedEnvManager(Thread):
     """
     start on main gaming process.
+
+    A worker (`DistributedEnvClient`) may host several environments. Queues are
+    keyed by worker id, which is the first environment id the worker owns, and
+    every message carries the records of all environments of that worker. This
+    keeps the number of proxied queue operations per step O(workers).
     """
 
     def __init__(self, n_env, port=50000):
@@ -27,10 +33,12 @@ class DistributedEnvManager(Thread):
         self.config_queue = Queue()
         self.srd_pad = {}
         self.a_pad = {}
+        self._env_worker = {}
+        self._ready = deque()
 
-        for env_id in range(n_env):
-            self.srd_pad[env_id] = Queue()
-            self.a_pad[env_id] = Queue()
+        for worker_id in range(n_env):
+            self.srd_pad[worker_id] = Queue()
+            self.a_pad[worker_id] = Queue()
 
         class SharedMemoryManager(BaseManager):
             pass
@@ -55,35 +63,37 @@ class DistributedEnvManager(Thread):
         Returns:
             - 5 lists. environment_ids, next_observations, rewards, dones, infos.
         """
-        srdis = []
-        env_ids = []
-        m = 0
         p = 0
-        while m < n:
+        while len(self._ready) < n:
             if p == 0:
                 time.sleep(0.0001)
             try:
-                srdi = self.srd_pad[p].get(block=False)
-
-                env_ids.append(p)
-                m += 1
-                srdis.append(srdi)
-                p = (p + 1) % self.n_env
+                records = self.srd_pad[p].get(block=False)
+                for record in records:
+                    self._env_worker[record[0]] = p
+                self._ready.extend(records)
             except Empty:
-                p = (p + 1) % self.n_env
+                pass
+            p = (p + 1) % self.n_env
 
-        next_obs = [srdis[i][0] for i in range(n)]
+        records = [self._ready.popleft() for _ in range(n)]
+        env_ids = [r[0] for r in records]
+        next_obs = [r[1] for r in records]
 
         if state_only:
             return env_ids, next_obs
-        rewards = [srdis[i][1] for i in range(n)]
-        dones = [srdis[i][2] for i in range(n)]
-        infos = [srdis[i][3] for i in range(n)]
+        rewards = [r[2] for r in records]
+        dones = [r[3] for r in records]
+        infos = [r[4] for r in records]
         return env_ids, next_obs, rewards, dones, infos
 
     def step(self, actions: Dict):
+        """Send actions, one message per worker."""
+        batches = defaultdict(list)
         for env_id, a in actions.items():
-            self.a_pad[env_id].put(a)
+            batches[self._env_worker[env_id]].append((env_id, a))
+        for worker_id, batch in batches.items():
+            self.a_pad[worker_id].put(batch)
 
     def configure(self, configure_list: List[Dict] = []) -> None:
         if configure_list:
@@ -98,10 +98,39 @@ class AtariWrapper(StackEnv):
         if "ramNoFrameskip" in env_id:
             env = make_ram_atari(env_id)
         else:
-            env = make_atari(env_id)
+            env = make_atari(env_id, ring_buffer=True)
         env.seed(rank + 1)
         return env
 
+    def _new_batch(self):
+        return np.empty((self.n_env, *self.envs[0].observation_space.shape), dtype=self.envs[0].observation_space.dtype)
+
+    def reset(self) -> np.ndarray:
+        if not hasattr(self.envs[0], "copy_to"):
+            return super().reset()
+
+        obs = self._new_batch()
+        for i in range(self.n_env):
+            self.envs[i].reset()
+            self.envs[i].copy_to(obs[i])
+        return obs
+
+    def step(self, actions: List):
+        """Stacked frames are copied straight into the batch array."""
+        if not hasattr(self.envs[0], "copy_to"):
+            return super().step(actions)
+
+        next_obs, rewards, dones, infos = self._new_batch(), [], [], []
+        for i in range(self.n_env):
+            _, rew, done, info = self.envs[i].step(actions[i])
+            self.envs[i].copy_to(next_obs[i])
+
+            rewards.append(rew)
+            dones.append(done)
+            infos.append(info)
+
+        return next_obs, np.asarray(rewards), np.asarray(dones), infos
+
 
 class ClassicControlWrapper(StackEnv):
     def __init__(self, env_name: str, n_env: int = 1):
@@ -115,9 +144,14 @@ class ClassicControlWrapper(StackEnv):
 
 
 class AsyncMujocoWrapper(object):
-    def __init__(self, env_name: str, n_env: int = 8, n_inference: int = None, port: int = 50000):
+    def __init__(self, env_name: str, n_env: int = 8, n_inference: int = None, port: int = 50000, obs_dtype=None):
+        """
+        Parameters:
+            - obs_dtype: dtype of returned observations. None keeps the dtype produced by the environments.
+        """
         self.n_env = n_env
         self.n_inference = n_env if n_inference is None else n_inference
+        self.obs_dtype = obs_dtype
         self._env_ids = None
         self.env_manager = DistributedEnvManager(n_env, port=port)
         self.env_manager.configure()
@@ -158,12 +192,12 @@ class AsyncMujocoWrapper(object):
         act_dict = {env_id: act for env_id, act in zip(self._env_ids, actions)}
         self.env_manager.step(act_dict)
         self._env_ids, obs, rewards, dones, infos = self.env_manager.get_envs_to_inference(n=self.n_inference)
-        return np.asarray(obs, dtype=np.float32), np.asarray(rewards, dtype=np.float32), np.asarray(dones, dtype=np.float32), infos
+        return np.asarray(obs, dtype=self.obs_dtype), np.asarray(rewards, dtype=np.float32), np.asarray(dones, dtype=np.float32), infos
 
     def reset(self):
         """Reset environment."""
         self._env_ids, states = self.env_manager.get_envs_to_inference(n=self.n_env, state_only=True)
-        return np.asarray(states, dtype=np.float32)
+        return np.asarray(states, dtype=self.obs_dtype)
 
     @property
     def dim_observation(self):
@@ -197,9 +231,15 @@ class AsyncMujocoWrapper(object):
 
 
 class AsyncAtariWrapper(object):
-    def __init__(self, env_name: str, n_env: int = 4, n_inference: int = 4, port=50000):
+    def __init__(self, env_name: str, n_env: int = 4, n_inference: int = 4, port=50000, obs_dtype=None):
+        """
+        Parameters:
+            - obs_dtype: dtype of returned observations. None keeps the native uint8 frames,
+              to be scaled in-graph (see `rlpack.utils.observation_input`).
+        """
         self.n_env = n_env
         self.n_inference = n_inference
+        self.obs_dtype = obs_dtype
         self.env_ids = None
         self.env_manager = DistributedEnvManager(n_env, port=port)
         self.env_manager.configure()
@@ -219,7 +259,7 @@ class AsyncAtariWrapper(object):
         if "ramNoFrameskip" in env_name:
             env = make_ram_atari(env_name)
         else:
-            env = make_atari(env_name)
+            env = make_atari(env_name, ring_buffer=True)
         env.seed(1 + rank)
         return env
 
@@ -238,7 +278,7 @@ class AsyncAtariWrapper(object):
         act_dict = {env_id: act for env_id, act in zip(self.env_ids, actions)}
         self.env_manager.step(act_dict)
         self.env_ids, obs, rewards, dones, infos = self.env_manager.get_envs_to_inference(n=self.n_inference)
-        return np.asarray(obs, dtype=np.float32), np.asarray(rewards, dtype=np.float32), dones, infos
+        return np.asarray(obs, dtype=self.obs_dtype), np.asarray(rewards, dtype=np.float32), dones, infos
 
     def sample_action(self, n):
         return np.random.randint(self.dim_action, size=n)
@@ -246,7 +286,7 @@ class AsyncAtariWrapper(object):
     def reset(self):
         """Reset the environment."""
         self.env_ids, states = self.env_manager.get_envs_to_inference(n=self.n_env, state_only=True)
-        return np.asarray(states, dtype=np.float32)
+        return np.asarray(states, dtype=self.obs_dtype)
 
     @property
     def env_id(self):
@@ -265,7 +305,13 @@ class AsyncAtariWrapper(object):
 
 
 class AsyncEnvWrapper(ABC):
-    def __init__(self, n_env: int, n_inference: int, port=50000):
+    def __init__(self, n_env: int, n_inference: int, port=50000, envs_per_worker: int = 1):
+        """
+        Parameters:
+            - envs_per_worker: the number of environments stepped by each worker process.
+              Actions and results of one worker travel in a single message.
+        """
+        assert n_env % envs_per_worker == 0
         self.n_env = n_env
         self.n_inference = n_inference
         self.env_ids = None
@@ -274,8 +320,8 @@ class AsyncEnvWrapper(ABC):
         self.env_manager.configure()
         self.env_manager.start()
 
-        for i in range(n_env):
-            p = DistributedEnvClient(self._make_env(), port=port)
+        for i in range(n_env // envs_per_worker):
+            p = DistributedEnvClient([self._make_env() for _ in range(envs_per_worker)], port=port)
             p.daemon = True
             p.start()
 
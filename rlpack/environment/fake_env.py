@@ -1,3 +1,6 @@
+import time
+from typing import Callable, Tuple, Union
+
 import numpy as np
 from .env_wrapper import AsyncEnvWrapper
 
@@ -97,3 +100,162 @@ class AsyncFakeDiscreteEnv(AsyncEnvWrapper):
     def _make_env(self):
         env = FakeDiscreteEnv()
         return env
+
+
+class FakeEnv(object):
+    """
+    A configurable load generator standing in for a real environment.
+
+    Parameters:
+        - dim_observation: shape of one observation, e.g. (84, 84, 4).
+        - dtype: dtype of observations, e.g. np.uint8.
+        - dim_action: the number of actions if `discrete`, else the dimension of action.
+        - episode_length: every episode terminates after this many steps.
+        - latency: synthetic step time in seconds, either a constant or a function
+          of a np.random.RandomState returning one sample, e.g.
+          `lambda rng: rng.exponential(1e-3)`.
+        - busy_wait: spin instead of sleeping, so the latency also costs CPU.
+        - n_obs_pool: observations are drawn from a pool generated once, so
+          producing a payload costs nothing. They are read-only.
+    """
+
+    def __init__(self, dim_observation: Tuple = (11,), dtype=np.float32, dim_action: int = 2, discrete: bool = True,
+                 episode_length: int = 50, latency: Union[float, Callable] = 0., busy_wait: bool = False,
+                 n_obs_pool: int = 16, seed: int = None):
+        self._dim_observation = tuple(dim_observation)
+        self._dim_action = dim_action
+        self.discrete = discrete
+        self.episode_length = episode_length
+        self.latency = latency
+        self.busy_wait = busy_wait
+        self._rng = np.random.RandomState(seed)
+        self._obs_pool = _make_obs_pool(self._rng, n_obs_pool, self._dim_observation, dtype)
+        self.cnt = 0
+
+    def reset(self):
+        self.cnt = 0
+        return self._obs_pool[0]
+
+    def step(self, action):
+        _wait(_sample_latency(self.latency, self._rng), self.busy_wait)
+        self.cnt += 1
+        terminal = self.cnt >= self.episode_length
+        if terminal:
+            self.cnt = 0
+
+        rew = float(_reward(np.asarray(action)[None], self.discrete)[0])
+        return self._obs_pool[self._rng.randint(len(self._obs_pool))], rew, terminal, dict()
+
+    def sample_action(self):
+        if self.discrete:
+            return self._rng.randint(self.dim_action)
+        return self._rng.normal(size=(self.dim_action,))
+
+    @property
+    def dim_observation(self):
+        return self._dim_observation
+
+    @property
+    def dim_action(self):
+        return self._dim_action
+
+
+class BatchFakeEnv(object):
+    """
+    `n_env` `FakeEnv`s stepped at once, with the `StackEnv` interface.
+
+    Step latency is the sum of `n_env` samples, as for envs stepped serially on one core.
+    Observations are gathered from the pool into a new (n_env, *dim_observation) array.
+    """
+
+    def __init__(self, n_env: int = 1, dim_observation: Tuple = (11,), dtype=np.float32, dim_action: int = 2,
+                 discrete: bool = True, episode_length: int = 50, latency: Union[float, Callable] = 0.,
+                 busy_wait: bool = False, n_obs_pool: int = 16, seed: int = None):
+        self._n_env = n_env
+        self._dim_observation = tuple(dim_observation)
+        self._dim_action = dim_action
+        self.discrete = discrete
+        self.episode_length = episode_length
+        self.latency = latency
+        self.busy_wait = busy_wait
+        self._rng = np.random.RandomState(seed)
+        self._obs_pool = _make_obs_pool(self._rng, n_obs_pool, self._dim_observation, dtype)
+        self.cnt = np.zeros(n_env, dtype=np.int64)
+
+    def reset(self) -> np.ndarray:
+        self.cnt[:] = 0
+        return self._obs_pool[np.zeros(self._n_env, dtype=np.int64)]
+
+    def step(self, actions):
+        _wait(sum(_sample_latency(self.latency, self._rng) for _ in range(self._n_env)), self.busy_wait)
+        self.cnt += 1
+        dones = self.cnt >= self.episode_length
+        self.cnt[dones] = 0
+
+        obs = self._obs_pool[self._rng.randint(len(self._obs_pool), size=self._n_env)]
+        rews = _reward(np.asarray(actions), self.discrete)
+        return obs, rews, dones, [dict() for _ in range(self._n_env)]
+
+    def sample_action(self):
+        if self.discrete:
+            return self._rng.randint(self.dim_action, size=self._n_env)
+        return self._rng.normal(size=(self._n_env, self.dim_action))
+
+    def close(self):
+        pass
+
+    @property
+    def n_env(self):
+        return self._n_env
+
+    @property
+    def dim_observation(self):
+        return self._dim_observation
+
+    @property
+    def dim_action(self):
+        return self._dim_action
+
+
+class AsyncFakeEnv(AsyncEnvWrapper):
+    """`FakeEnv`s served by worker processes, to load `DistributedEnvManager` with realistic payloads."""
+
+    def __init__(self, n_env: int = 8, n_inference: int = None, port: int = 50000, envs_per_worker: int = 1, **env_kwargs):
+        self._env_kwargs = env_kwargs
+        super().__init__(n_env, n_env if n_inference is None else n_inference, port, envs_per_worker)
+
+    def _make_env(self):
+        env = FakeEnv(**self._env_kwargs)
+        return env
+
+
+def _make_obs_pool(rng, n_obs_pool, dim_observation, dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind in "iu":
+        info = np.iinfo(dtype)
+        pool = rng.randint(info.min, int(info.max) + 1, size=(n_obs_pool, *dim_observation)).astype(dtype)
+    else:
+        pool = rng.rand(n_obs_pool, *dim_observation).astype(dtype)
+    pool.flags.writeable = False
+    return pool
+
+
+def _sample_latency(latency, rng):
+    return latency(rng) if callable(latency) else latency
+
+
+def _wait(seconds, busy_wait):
+    if seconds <= 0:
+        return
+    if busy_wait:
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+    else:
+        time.sleep(seconds)
+
+
+def _reward(actions, discrete):
+    if discrete:
+        return (actions == 0).astype(np.float32)
+    return (actions.sum(axis=-1) > 0).astype(np.float32)
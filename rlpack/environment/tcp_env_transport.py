@@ -0,0 +1,349 @@
+"""
+An asyncio TCP transport between a learner and remote environment workers.
+
+`TcpEnvManager` runs on the learner and exposes the same `configure`/`step`/
+`get_envs_to_inference` interface as `DistributedEnvManager`. Each
+`TcpEnvClient` hosts several environments and multiplexes all of them over a
+single connection, so a host costs one socket no matter how many envs it runs.
+
+Wire format: every message is a frame `[body length: uint32][type: uint8][flags: uint8][body]`.
+Arrays are sent as a small header (dtype, shape) followed by their raw buffer,
+so observations never go through pickle. A frame body may be zlib-compressed,
+which is signalled by `_FLAG_ZLIB` in the header.
+"""
+
+import asyncio
+import json
+import struct
+import sys
+import threading
+import zlib
+from collections import defaultdict, deque
+from multiprocessing import Process
+from queue import Queue
+from typing import Dict, List
+
+import numpy as np
+
+_HEADER = struct.Struct("!IBB")
+_UINT32 = struct.Struct("!I")
+_STEP_RECORD = struct.Struct("!dB")
+
+_MSG_HELLO = 1
+_MSG_ASSIGN = 2
+_MSG_RESET = 3
+_MSG_STEP = 4
+_MSG_ACTION = 5
+
+_FLAG_ZLIB = 1
+
+
+# ------------------------ Frame encoding. ------------------------
+
+def _json_default(x):
+    if isinstance(x, np.generic):
+        return x.item()
+    if isinstance(x, np.ndarray):
+        return x.tolist()
+    raise TypeError(f"{type(x)} is not JSON serializable")
+
+
+def _pack_array(a, chunks: List):
+    a = np.asarray(a)
+    if not a.flags.c_contiguous:
+        a = np.ascontiguousarray(a)
+    dtype = a.dtype.str.encode("ascii")
+    chunks.append(struct.pack(f"!B{len(dtype)}sB{a.ndim}I", len(dtype), dtype, a.ndim, *a.shape))
+    chunks.append(a.data)
+
+
+def _unpack_array(buf: memoryview, offset: int):
+    n = buf[offset]
+    dtype = np.dtype(bytes(buf[offset + 1: offset + 1 + n]).decode("ascii"))
+    offset += 1 + n
+    ndim = buf[offset]
+    shape = struct.unpack_from(f"!{ndim}I", buf, offset + 1)
+    offset += 1 + 4 * ndim
+    count = int(np.prod(shape, dtype=np.int64))
+    a = np.frombuffer(buf, dtype=dtype, count=count, offset=offset).reshape(shape)
+    return a, offset + count * dtype.itemsize
+
+
+def _pack_json(obj, chunks: List):
+    data = json.dumps(obj, default=_json_default).encode("utf-8")
+    chunks.append(_UINT32.pack(len(data)))
+    chunks.append(data)
+
+
+def _unpack_json(buf: memoryview, offset: int):
+    (n,) = _UINT32.unpack_from(buf, offset)
+    offset += _UINT32.size
+    return json.loads(bytes(buf[offset: offset + n]).decode("utf-8")), offset + n
+
+
+def encode_frame(msg_type: int, chunks: List, compress_level: int = 0, compress_min_size: int = 1024) -> bytes:
+    """Join body chunks into one frame, compressing the body if requested and worthwhile."""
+    body = b"".join(chunks)
+    flags = 0
+    if compress_level and len(body) >= compress_min_size:
+        body = zlib.compress(body, compress_level)
+        flags |= _FLAG_ZLIB
+    return _HEADER.pack(len(body), msg_type, flags) + body
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """Read one frame. Return (msg_type, body as memoryview)."""
+    header = await reader.readexactly(_HEADER.size)
+    length, msg_type, flags = _HEADER.unpack(header)
+    body = await reader.readexactly(length)
+    if flags & _FLAG_ZLIB:
+        body = zlib.decompress(body)
+    return msg_type, memoryview(body)
+
+
+def encode_observations(env_ids: List[int], observations: List, compress_level: int = 0) -> bytes:
+    chunks = [_UINT32.pack(len(env_ids))]
+    for env_id, ob in zip(env_ids, observations):
+        chunks.append(_UINT32.pack(env_id))
+        _pack_array(ob, chunks)
+    return encode_frame(_MSG_RESET, chunks, compress_level)
+
+
+def encode_transitions(env_ids: List[int], observations: List, rewards: List, dones: List, infos: List,
+                       compress_level: int = 0) -> bytes:
+    chunks = [_UINT32.pack(len(env_ids))]
+    for env_id, ob, rew, done, info in zip(env_ids, observations, rewards, dones, infos):
+        chunks.append(_UINT32.pack(env_id))
+        _pack_array(ob, chunks)
+        chunks.append(_STEP_RECORD.pack(float(rew), bool(done)))
+        _pack_json(info if info is not None else {}, chunks)
+    return encode_frame(_MSG_STEP, chunks, compress_level)
+
+
+def encode_actions(env_ids: List[int], actions: List, compress_level: int = 0) -> bytes:
+    chunks = [_UINT32.pack(len(env_ids))]
+    for env_id, a in zip(env_ids, actions):
+        chunks.append(_UINT32.pack(env_id))
+        _pack_array(a, chunks)
+    return encode_frame(_MSG_ACTION, chunks, compress_level)
+
+
+def decode_records(msg_type: int, buf: memoryview):
+    """Decode a RESET/STEP/ACTION body into a list of per-environment tuples.
+
+    RESET -> (env_id, obs); STEP -> (env_id, obs, reward, done, info); ACTION -> (env_id, action).
+    Arrays are read-only views into the received buffer.
+    """
+    (n,) = _UINT32.unpack_from(buf, 0)
+    offset = _UINT32.size
+    records = []
+    for _ in range(n):
+        (env_id,) = _UINT32.unpack_from(buf, offset)
+        a, offset = _unpack_array(buf, offset + _UINT32.size)
+        if msg_type == _MSG_STEP:
+            rew, done = _STEP_RECORD.unpack_from(buf, offset)
+            info, offset = _unpack_json(buf, offset + _STEP_RECORD.size)
+            records.append((env_id, a, rew, bool(done), info))
+        elif msg_type == _MSG_ACTION:
+            records.append((env_id, a.item() if a.ndim == 0 else a))
+        else:
+            records.append((env_id, a))
+    return records
+
+
+# ------------------------ Learner side. ------------------------
+
+class _Connection(object):
+    """Server-side state of one worker host."""
+
+    def __init__(self, writer: asyncio.StreamWriter, max_pending: int):
+        self.writer = writer
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.frames = asyncio.Queue()
+
+    async def write_forever(self):
+        while True:
+            frame = await self.frames.get()
+            self.writer.write(frame)
+            await self.writer.drain()
+            self.pending.release()
+
+
+class TcpEnvManager(threading.Thread):
+    """
+    Start on main gaming process.
+
+    Workers connect with `TcpEnvClient`, announce how many environments they
+    host and get a block of environment ids back. Actions for all
+    environments of a host are sent in one frame per `step` call.
+
+    Backpressure: at most `max_pending` action frames may be queued for a host;
+    `step` blocks when a host falls behind instead of buffering without bound.
+    """
+
+    def __init__(self, n_env: int, port: int = 50000, compress_level: int = 0, max_pending: int = 4):
+        super().__init__()
+        self.daemon = True
+        self.n_env = n_env
+        self.port = port
+        self._compress_level = compress_level
+        self._max_pending = max_pending
+
+        self._configs = deque()
+        self._results = Queue()
+        self._env_conn = {}
+        self._loop = None
+        self._server = None
+        self._ready = threading.Event()
+
+    def configure(self, configure_list: List[Dict] = []) -> None:
+        if configure_list:
+            assert self.n_env == len(configure_list)
+            self._configs.extend(configure_list)
+        else:
+            self._configs.extend({'env_id': i} for i in range(self.n_env))
+
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, host='', port=self.port))
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self):
+        super().start()
+        self._ready.wait()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        msg_type, body = await read_frame(reader)
+        assert msg_type == _MSG_HELLO
+        hello = json.loads(bytes(body).decode("utf-8"))
+
+        configs = [self._configs.popleft() for _ in range(hello["n_env"])]
+        conn = _Connection(writer, self._max_pending)
+        for c in configs:
+            self._env_conn[c['env_id']] = conn
+        chunks = []
+        _pack_json(configs, chunks)
+        writer.write(encode_frame(_MSG_ASSIGN, chunks))
+        await writer.drain()
+
+        write_task = self._loop.create_task(conn.write_forever())
+        try:
+            while True:
+                msg_type, body = await read_frame(reader)
+                for record in decode_records(msg_type, body):
+                    self._results.put(record)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            write_task.cancel()
+            writer.close()
+
+    def get_envs_to_inference(self, n: int, state_only: bool = False):
+        """Get one step forward states, reward, dones, infos.
+
+        Parameters:
+            - n: an integer. the number of environments.
+            - state_only: True at the first step for reset.
+
+        Returns:
+            - 5 lists. environment_ids, next_observations, rewards, dones, infos.
+        """
+        records = [self._results.get() for _ in range(n)]
+        env_ids = [r[0] for r in records]
+        next_obs = [r[1] for r in records]
+
+        if state_only:
+            return env_ids, next_obs
+        rewards = [r[2] for r in records]
+        dones = [r[3] for r in records]
+        infos = [r[4] for r in records]
+        return env_ids, next_obs, rewards, dones, infos
+
+    def step(self, actions: Dict):
+        """Send actions, one frame per worker host."""
+        groups = defaultdict(lambda: ([], []))
+        for env_id, a in actions.items():
+            ids, acts = groups[self._env_conn[env_id]]
+            ids.append(env_id)
+            acts.append(a)
+
+        for conn, (ids, acts) in groups.items():
+            frame = encode_actions(ids, acts, self._compress_level)
+            conn.pending.acquire()
+            self._loop.call_soon_threadsafe(conn.frames.put_nowait, frame)
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+# ------------------------ Worker side. ------------------------
+
+class TcpEnvClient(Process):
+    """
+    Start on worker host. Hosts a list of environments behind one connection.
+    """
+
+    def __init__(self, envs, hostname: str = 'localhost', port: int = 50000, compress_level: int = 0):
+        super().__init__()
+        self.envs = list(envs) if isinstance(envs, (list, tuple)) else [envs]
+        self.env = self.envs[0]
+        self._hostname = hostname
+        self._port = port
+        self._compress_level = compress_level
+        self._dim_observation = self.env.dim_observation
+        self._dim_action = self.env.dim_action
+
+    def run(self):
+        """Run forever. Environments are expected to reset themselves at done."""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self._serve())
+        except (asyncio.IncompleteReadError, ConnectionError):
+            sys.exit(0)
+
+    async def _serve(self):
+        reader, writer = await asyncio.open_connection(self._hostname, self._port)
+        writer.write(encode_frame(_MSG_HELLO, [json.dumps({"n_env": len(self.envs)}).encode("utf-8")]))
+        await writer.drain()
+
+        msg_type, body = await read_frame(reader)
+        assert msg_type == _MSG_ASSIGN
+        configs, _ = _unpack_json(body, 0)
+        id2env = {c['env_id']: env for c, env in zip(configs, self.envs)}
+
+        env_ids = list(id2env.keys())
+        writer.write(encode_observations(env_ids, [id2env[i].reset() for i in env_ids], self._compress_level))
+        await writer.drain()
+
+        while True:
+            msg_type, body = await read_frame(reader)
+            assert msg_type == _MSG_ACTION
+            env_ids, obs, rewards, dones, infos = [], [], [], [], []
+            for env_id, action in decode_records(msg_type, body):
+                ob, reward, done, info = id2env[env_id].step(action)
+                env_ids.append(env_id)
+                obs.append(ob)
+                rewards.append(reward)
+                dones.append(done)
+                infos.append(info)
+            writer.write(encode_transitions(env_ids, obs, rewards, dones, infos, self._compress_level))
+            await writer.drain()
+
+    @property
+    def dim_observation(self):
+        """The dimension of observatin."""
+        return self._dim_observation
+
+    @property
+    def dim_action(self):
+        """The dimension of action.
+
+        For discrete-action game, it means the number of actions.
+        For continuous-action game, it means the dimension of action.
+        """
+        return self._dim_action
@@ -0,0 +1,239 @@
+import gym
+import numpy as np
+import pytest
+from gym import spaces
+
+from rlpack.environment.altered_atari_wrappers import NeverStop, RamStack2
+from rlpack.environment.atari_wrappers import (EpisodicLifeEnv, FireResetEnv, FrameStack, GrayscaleMaxAndSkipEnv,
+                                               MaxAndSkipEnv, NoopResetEnv, RamStack, ResetCache, RingFrameStack,
+                                               WarpFrame)
+
+
+class FakeAtariEnv(gym.Env):
+    """An ALE stand-in whose screens are gray, so RGB and grayscale paths see the same pixels.
+
+    It is its own `ale`: screens are drawn from a fixed pool by frame number and last action.
+    """
+
+    def __init__(self, episode_frames=103, n_act=4, seed=0):
+        rng = np.random.RandomState(seed)
+        self._screens = rng.randint(0, 256, size=(17, 210, 160), dtype=np.uint8)
+        self._episode_frames = episode_frames
+        self._action_set = np.arange(n_act)
+        self.ale = self
+        self.spec = None
+        self.observation_space = spaces.Box(low=0, high=255, shape=(210, 160, 3), dtype=np.uint8)
+        self.action_space = spaces.Discrete(n_act)
+        self._frame = 0
+        self._last_act = 0
+
+    # ------------------------ ALE interface. ------------------------
+    def getScreenDims(self):
+        return 160, 210
+
+    def act(self, a):
+        self._frame += 1
+        self._last_act = int(a)
+        return float(a == 1)
+
+    def getScreenGrayscale(self, out):
+        out[...] = self._screen()
+
+    def game_over(self):
+        return self._frame >= self._episode_frames
+
+    def lives(self):
+        return 3
+
+    def get_action_meanings(self):
+        return ["NOOP", "FIRE", "RIGHT", "LEFT"][:len(self._action_set)]
+
+    # ------------------------ gym interface. ------------------------
+    def reset(self, **kwargs):
+        self._frame = 0
+        self._last_act = 0
+        return self._rgb()
+
+    def step(self, action):
+        reward = self.act(self._action_set[action])
+        return self._rgb(), reward, self.game_over(), {}
+
+    def _screen(self):
+        return self._screens[(self._frame * 7 + self._last_act) % len(self._screens)]
+
+    def _rgb(self):
+        return np.repeat(self._screen()[:, :, None], 3, axis=2)
+
+
+class CountingEnv(gym.Env):
+    """Frames of shape (2, 3, c) filled with the step count, offset by the number of resets."""
+
+    def __init__(self, c=1):
+        self.observation_space = spaces.Box(low=0, high=255, shape=(2, 3, c), dtype=np.uint8)
+        self.action_space = spaces.Discrete(2)
+        self._c = c
+        self._t = 0
+        self._n_reset = 0
+
+    def reset(self, **kwargs):
+        self._t = 0
+        self._n_reset += 1
+        return self._frame()
+
+    def step(self, action):
+        self._t += 1
+        return self._frame(), 0., False, {}
+
+    def _frame(self):
+        frame = np.full((2, 3, self._c), 50 * self._n_reset + self._t, dtype=np.uint8)
+        frame[..., -1] += 100
+        return frame
+
+
+@pytest.mark.parametrize("c", [1, 3])
+def test_ring_frame_stack_matches_frame_stack(c):
+    k = 4
+    ring = RingFrameStack(CountingEnv(c), k)
+    lazy = FrameStack(CountingEnv(c), k)
+    assert ring.observation_space.shape == lazy.observation_space.shape
+
+    for n_step in (0, 3, k, 2 * k + 1):
+        ob = ring.reset()
+        np.testing.assert_array_equal(ob, np.array(lazy.reset()))
+        for _ in range(n_step):
+            ob, _, _, _ = ring.step(0)
+            lazy_ob, _, _, _ = lazy.step(0)
+            np.testing.assert_array_equal(ob, np.array(lazy_ob))
+
+            out = np.empty(ob.shape, dtype=np.float32)
+            np.testing.assert_array_equal(ring.copy_to(out), np.array(lazy_ob, dtype=np.float32))
+
+
+def test_grayscale_max_and_skip_matches_unfused_chain():
+    fused = GrayscaleMaxAndSkipEnv(FakeAtariEnv(), skip=4)
+    unfused = WarpFrame(MaxAndSkipEnv(FakeAtariEnv(), skip=4))
+    assert fused.observation_space.shape == unfused.observation_space.shape
+
+    rng = np.random.RandomState(1)
+    for _ in range(2):
+        np.testing.assert_array_equal(fused.reset(), unfused.reset())
+        done = False
+        while not done:
+            a = rng.randint(4)
+            ob, rew, done, _ = fused.step(a)
+            ob_ref, rew_ref, done_ref, _ = unfused.step(a)
+            assert rew == rew_ref and done == done_ref
+            # 提前结束时两者都只保证不读取无效帧，结束帧的观测不比较。
+            if not done:
+                np.testing.assert_array_equal(ob, ob_ref)
+
+
+class LivesEnv(gym.Env):
+    """A game that only advances after FIRE, which must be pressed again after every lost life."""
+
+    def __init__(self, frames_per_life=10, n_lives=3):
+        self.observation_space = spaces.Box(low=0, high=255, shape=(3,), dtype=np.int64)
+        self.action_space = spaces.Discrete(4)
+        self.ale = self
+        self._frames_per_life = frames_per_life
+        self._n_lives = n_lives
+        self.frame, self._lives, self.fired = 0, n_lives, False
+
+    def lives(self):
+        return self._lives
+
+    def get_action_meanings(self):
+        return ["NOOP", "FIRE", "RIGHT", "LEFT"]
+
+    def clone_full_state(self):
+        return self.frame, self._lives, self.fired
+
+    def restore_full_state(self, state):
+        self.frame, self._lives, self.fired = state
+
+    def reset(self, **kwargs):
+        self.frame, self._lives, self.fired = 0, self._n_lives, False
+        return self._obs()
+
+    def step(self, action):
+        self.fired = self.fired or action == 1
+        if self.fired:
+            self.frame += 1
+            if self.frame % self._frames_per_life == 0:
+                self._lives -= 1
+                self.fired = False
+        return self._obs(), 0., self._lives == 0, {}
+
+    def _obs(self):
+        return np.array([self.frame, self._lives, self.fired])
+
+
+def test_reset_cache_through_life_loss():
+    cache = ResetCache(pool_size=2, refresh_prob=0., seed=0)
+    game = LivesEnv()
+    noop = NoopResetEnv(game, noop_max=1, reset_cache=cache)
+    noop.override_num_noops = 1
+    env = FireResetEnv(EpisodicLifeEnv(noop), reset_cache=cache)
+
+    n_hit = 0
+    for _ in range(4 * 3):
+        env.reset()
+        n_hit += cache.hit
+        # 每条命开始时都必须已经FIRE，否则游戏停住。
+        assert game.fired
+        done, n_step = False, 0
+        while not done:
+            _, _, done, _ = env.step(2)
+            n_step += 1
+            assert n_step < 100
+        # 只有真正reset后的状态进入缓存。
+        for state, _ in cache._entries:
+            assert state[1] == 3 and state[0] == 2
+
+    assert len(cache) == 2 and n_hit > 0
+
+
+class RamEnv(gym.Env):
+    """128-byte RAM filled with 50 * episode + step; episodes last 3 steps."""
+
+    def __init__(self):
+        self.observation_space = spaces.Box(low=0, high=255, shape=(128,), dtype=np.uint8)
+        self.action_space = spaces.Discrete(2)
+        self._episode, self._t = 0, 0
+
+    def reset(self, **kwargs):
+        self._episode, self._t = self._episode + 1, 0
+        return self._ram()
+
+    def step(self, action):
+        self._t += 1
+        return self._ram(), 0., self._t == 3, {}
+
+    def _ram(self):
+        return np.full(128, 50 * self._episode + self._t, dtype=np.uint8)
+
+
+def test_ram_stack_matches_frame_stack():
+    ring, lazy = RamStack(RamEnv(), 4), FrameStack(RamEnv(), 4)
+    ob, lazy_ob = ring.reset(), lazy.reset()
+    for _ in range(3):
+        np.testing.assert_array_equal(ob, np.array(lazy_ob).reshape(4, 128).swapaxes(0, 1))
+        ob, _, done, _ = ring.step(0)
+        lazy_ob, _, _, _ = lazy.step(0)
+    # 结束帧同FrameStack，不重新填充。
+    assert done
+    np.testing.assert_array_equal(ob[0], [50, 51, 52, 53])
+
+
+def test_ram_stack2_refills_after_never_stop_reset():
+    env = RamStack2(NeverStop(RamEnv()))
+    assert env.reset().shape == (512,)
+    stacks = [env.reset().reshape(4, 128)[:, 0]]
+    for _ in range(5):
+        ob, _, done, _ = env.step(0)
+        stacks.append(ob.reshape(4, 128)[:, 0])
+
+    # 与在NeverStop之下堆叠时一样，新episode的观测只含新episode的帧。
+    expected = [[100] * 4, [100, 100, 100, 101], [100, 100, 101, 102], [150] * 4, [150, 150, 150, 151],
+                [150, 150, 151, 152]]
+    np.testing.assert_array_equal(stacks, expected)
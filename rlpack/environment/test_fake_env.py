@@ -1,12 +1,93 @@
-from rlpack.environment.fake_env import AsyncFakeContinuousEnv, AsyncFakeDiscreteEnv
+import socket
 
-# env = AsyncFakeDiscreteEnv(4, 4)
-env = AsyncFakeContinuousEnv(4, 4)
-s = env.reset()
-print(s.shape)
+import numpy as np
+import pytest
 
-for i in range(10000):
-    a = env.sample_action(4)
-    s, r, d, info = env.step(a)
+from rlpack.environment.distributed_env_wrapper import DistributedEnvManager
+from rlpack.environment.fake_env import (AsyncFakeContinuousEnv, AsyncFakeDiscreteEnv, AsyncFakeEnv, BatchFakeEnv,
+                                         FakeEnv)
 
-    print(f"s: {s.shape} a: {a.shape} r: {r.shape} d: {len(d)} info: {info}")
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize("discrete", [True, False])
+def test_fake_env_episodes(discrete):
+    env = FakeEnv(dim_observation=(4, 3), dtype=np.uint8, dim_action=3, discrete=discrete, episode_length=5, seed=0)
+    ob = env.reset()
+    assert ob.shape == (4, 3) and ob.dtype == np.uint8
+
+    dones = []
+    for _ in range(12):
+        ob, rew, done, info = env.step(env.sample_action())
+        assert ob.shape == (4, 3) and ob.dtype == np.uint8
+        assert rew in (0., 1.)
+        dones.append(done)
+    assert dones == [i % 5 == 4 for i in range(12)]
+    assert env.cnt == 2
+
+
+def test_fake_env_reward():
+    env = FakeEnv(discrete=True)
+    assert env.step(0)[1] == 1. and env.step(1)[1] == 0.
+    env = FakeEnv(dim_action=3, discrete=False)
+    assert env.step(np.ones(3))[1] == 1. and env.step(-np.ones(3))[1] == 0.
+
+
+def test_batch_fake_env_shapes_and_dones():
+    env = BatchFakeEnv(n_env=3, dim_observation=(2, 2), dtype=np.float32, dim_action=2, episode_length=4, seed=0)
+    obs = env.reset()
+    assert obs.shape == (3, 2, 2) and obs.dtype == np.float32
+
+    for i in range(9):
+        actions = env.sample_action()
+        assert actions.shape == (3,)
+        obs, rews, dones, infos = env.step(actions)
+        assert obs.shape == (3, 2, 2)
+        np.testing.assert_array_equal(rews, (actions == 0).astype(np.float32))
+        assert dones.shape == (3,) and np.all(dones == (i % 4 == 3))
+        assert len(infos) == 3
+
+    env.cnt[:] = [0, 1, 3]
+    _, _, dones, _ = env.step(env.sample_action())
+    np.testing.assert_array_equal(dones, [False, False, True])
+    np.testing.assert_array_equal(env.cnt, [1, 2, 0])
+
+
+def test_async_fake_env_shapes(monkeypatch):
+    # 管理线程永远serve，设为daemon以便测试进程退出。
+    start = DistributedEnvManager.start
+
+    def daemon_start(self):
+        self.daemon = True
+        start(self)
+    monkeypatch.setattr(DistributedEnvManager, "start", daemon_start)
+
+    n_env = 4
+    env = AsyncFakeEnv(n_env=n_env, port=_free_port(), envs_per_worker=2, dim_observation=(6,), dim_action=3,
+                       discrete=False, episode_length=3)
+    assert env.dim_observation == (6,) and env.dim_action == 3
+
+    obs = env.reset()
+    assert obs.shape == (n_env, 6)
+    for _ in range(7):
+        obs, rews, dones, infos = env.step(env.sample_action(n_env))
+        assert obs.shape == (n_env, 6)
+        assert rews.shape == (n_env,)
+        assert len(dones) == n_env and len(infos) == n_env
+
+
+if __name__ == "__main__":
+    # env = AsyncFakeDiscreteEnv(4, 4)
+    env = AsyncFakeContinuousEnv(4, 4)
+    s = env.reset()
+    print(s.shape)
+
+    for i in range(10000):
+        a = env.sample_action(4)
+        s, r, d, info = env.step(a)
+
+        print(f"s: {s.shape} a: {a.shape} r: {r.shape} d: {len(d)} info: {info}")
@@ -0,0 +1,65 @@
+import socket
+
+import numpy as np
+
+from rlpack.environment.tcp_env_transport import TcpEnvClient, TcpEnvManager
+
+
+class CountingEnv(object):
+    """Observation is a uint8 image filled with the number of steps taken."""
+
+    def __init__(self):
+        self.cnt = 0
+
+    def reset(self):
+        self.cnt = 0
+        return np.zeros((84, 84, 4), dtype=np.uint8)
+
+    def step(self, action):
+        self.cnt += 1
+        ob = np.full((84, 84, 4), self.cnt + action, dtype=np.uint8)
+        return ob, float(action), self.cnt % 5 == 0, {"cnt": self.cnt}
+
+    @property
+    def dim_observation(self):
+        return (84, 84, 4)
+
+    @property
+    def dim_action(self):
+        return 3
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
+
+
+def test_loopback_round_trip():
+    n_worker, env_per_worker = 2, 3
+    n_env = n_worker * env_per_worker
+    port = _free_port()
+
+    manager = TcpEnvManager(n_env, port=port, compress_level=1)
+    manager.configure()
+    manager.start()
+
+    for _ in range(n_worker):
+        p = TcpEnvClient([CountingEnv() for _ in range(env_per_worker)], port=port, compress_level=1)
+        p.daemon = True
+        p.start()
+
+    env_ids, obs = manager.get_envs_to_inference(n_env, state_only=True)
+    assert sorted(env_ids) == list(range(n_env))
+    assert all(ob.dtype == np.uint8 and ob.shape == (84, 84, 4) and ob.max() == 0 for ob in obs)
+
+    for t in range(1, 11):
+        manager.step({env_id: env_id % 3 for env_id in env_ids})
+        env_ids, obs, rewards, dones, infos = manager.get_envs_to_inference(n_env)
+        for env_id, ob, rew, done, info in zip(env_ids, obs, rewards, dones, infos):
+            assert np.all(ob == t + env_id % 3)
+            assert rew == env_id % 3
+            assert done == (t % 5 == 0)
+            assert info == {"cnt": t}
+
+    manager.close()
@@ -0,0 +1,47 @@
+import numpy as np
+
+from rlpack.environment.toy_wrapper import BatchGridWorld, BatchNChain, GridWorld, NChain
+
+
+def test_batch_nchain_matches_nchain_without_slip():
+    n_env, n_step = 8, 100
+    envs = [NChain(N=10, slip_p=0.) for _ in range(n_env)]
+    batch_env = BatchNChain(n_env=n_env, N=10, slip_p=0., seed=0)
+
+    obs = batch_env.reset()
+    assert np.array_equal(obs, np.asarray([env.reset() for env in envs]))
+    for _ in range(n_step):
+        actions = batch_env.sample_action()
+        obs, rewards, dones, _ = batch_env.step(actions)
+        results = [env.step(a) for env, a in zip(envs, actions)]
+        assert np.array_equal(obs, np.asarray([r[0] for r in results]))
+        assert np.allclose(rewards, [r[1] for r in results])
+        assert not dones.any()
+
+
+def test_batch_gridworld_matches_gridworld_without_slip():
+    n_env, n_step = 8, 200
+    envs = [GridWorld(N=4, slip_p=0.) for _ in range(n_env)]
+    batch_env = BatchGridWorld(n_env=n_env, N=4, slip_p=0., seed=0)
+
+    obs = batch_env.reset()
+    assert np.array_equal(obs, np.asarray([env.reset() for env in envs]))
+    for _ in range(n_step):
+        actions = batch_env.sample_action()
+        obs, rewards, dones, _ = batch_env.step(actions)
+        for i, (env, a) in enumerate(zip(envs, actions)):
+            s, r, d, _ = env.step(a)
+            assert r == rewards[i] and d == dones[i]
+            if d:
+                s = env.reset()
+            assert np.array_equal(obs[i], s)
+
+
+def test_batch_gridworld_slip_frequency():
+    n_env, slip_p = 100000, 0.1
+    batch_env = BatchGridWorld(n_env=n_env, N=5, slip_p=slip_p, seed=0)
+    batch_env.reset()
+    batch_env.state[:] = 12  # Center cell, every move is possible.
+    batch_env.step(np.zeros(n_env, dtype=np.int64))
+    moves = np.bincount(batch_env.state, minlength=25)[[7, 11, 17, 13]] / n_env
+    assert np.allclose(moves, [1 - 3 * slip_p, slip_p, slip_p, slip_p], atol=0.01)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from rlpack.environment.vec_classic_control import make_vec_classic_control
+
+ENV_NAMES = ["CartPole-v0", "CartPole-v1", "Acrobot-v1", "MountainCar-v0"]
+
+
+@pytest.mark.parametrize("env_name", ENV_NAMES)
+def test_episode_bookkeeping_and_auto_reset(env_name):
+    env = make_vec_classic_control(env_name, n_env=16, seed=0)
+    obs = env.reset()
+    assert obs.shape == (16, *env.dim_observation)
+
+    traj_len = np.zeros(16, dtype=np.int64)
+    n_done = 0
+    for _ in range(1000):
+        obs, rewards, dones, infos = env.step(env.sample_action())
+        traj_len += 1
+        assert obs.shape == (16, *env.dim_observation)
+        assert np.array_equal(rewards, np.where(dones, -1.0, 0.1))
+        for i in range(16):
+            assert ("episode" in infos[i]) == dones[i]
+            if dones[i]:
+                assert infos[i]["episode"]["l"] == traj_len[i] <= env.max_episode_steps
+                n_done += 1
+        traj_len[dones] = 0
+    assert n_done > 0
+
+
+@pytest.mark.parametrize("env_name", ENV_NAMES)
+def test_dynamics_match_gym(env_name):
+    gym = pytest.importorskip("gym")
+    env = make_vec_classic_control(env_name, n_env=1, seed=0)
+    gym_env = gym.make(env_name).unwrapped
+    gym_env.reset()
+    env.reset()
+
+    for _ in range(100):
+        gym_env.state = env.state[0].copy()
+        a = env.sample_action()
+        ob, r, d, _ = gym_env.step(a[0])
+        obs, _, dones, infos = env.step(a)
+        if dones[0]:
+            assert d or infos[0]["episode"]["l"] == env.max_episode_steps
+            continue
+        assert not d
+        assert np.allclose(obs[0], ob, atol=1e-6)
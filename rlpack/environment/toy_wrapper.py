@@ -158,3 +158,140 @@ def make_toy(env_name):
         env = NChain(N=20, slip_p=0.1)
     elif env_name == "GridWorld":
         env = GridWorld()
+
+
+class BatchNChain(object):
+    """
+    Step `n_env` NChain instances at once, with the same dynamics as `NChain`.
+
+    Slips are sampled for the whole batch in one call and moves are read from
+    a (state, action) lookup table. Observations are written into one reused
+    (n_env, N) buffer, so copy it if it must outlive the next `step`.
+    """
+
+    def __init__(self, n_env: int = 1, N: int = 20, slip_p: float = 0.1, seed: int = None):
+        self.N = N
+        self.slip_p = slip_p
+        self._n_env = n_env
+        self._rng = np.random.RandomState(seed)
+        self._batch = np.arange(n_env)
+
+        states = np.arange(N)
+        self._next_state = np.stack([np.maximum(0, states - 1), np.minimum(N - 1, states + 1)], axis=1)
+        self._reward = np.tile(np.array([0.01, 0.]), (N, 1))
+        self._reward[self._next_state == N - 1] = 1
+
+        self.state = np.zeros(n_env, dtype=np.int64)
+        self._obs = np.zeros((n_env, N), dtype=np.float64)
+        self._dones = np.zeros(n_env, dtype=bool)
+        self._infos = [None] * n_env
+
+    def reset(self) -> np.ndarray:
+        self.state[:] = 0
+        self._obs[:] = 0
+        self._obs[:, 0] = 1
+        return self._obs
+
+    def step(self, actions):
+        """
+        0: backward, 1: forward. Each action slips to the opposite one with probability `slip_p`.
+        """
+        real_act = np.asarray(actions) ^ (self._rng.rand(self._n_env) < self.slip_p)
+        rewards = self._reward[self.state, real_act]
+
+        self._obs[self._batch, self.state] = 0
+        self.state = self._next_state[self.state, real_act]
+        self._obs[self._batch, self.state] = 1
+        return self._obs, rewards, self._dones, self._infos
+
+    def sample_action(self):
+        return self._rng.randint(2, size=self._n_env)
+
+    def close(self):
+        pass
+
+    @property
+    def n_env(self):
+        return self._n_env
+
+    @property
+    def dim_observation(self):
+        return (self.N,)
+
+    @property
+    def dim_action(self):
+        return 2
+
+
+class BatchGridWorld(object):
+    """
+    Step `n_env` GridWorld instances at once, with the same dynamics as `GridWorld`.
+
+    An action is kept with probability 1 - 3 * slip_p and replaced by each of the
+    other three with probability slip_p. Moves come from a (cell, action) lookup
+    table and observations are one-hot grids written into one reused (n_env, N, N)
+    buffer. Environments that reach the goal are reset, so the observation
+    returned for them is the start cell.
+    """
+
+    def __init__(self, n_env: int = 1, N: int = 20, slip_p: float = 0.1, seed: int = None):
+        self.N = N
+        self.slip_p = slip_p
+        self._n_env = n_env
+        self._rng = np.random.RandomState(seed)
+        self._batch = np.arange(n_env)
+
+        rows, cols = np.divmod(np.arange(N * N), N)
+        self._next_state = np.stack([np.maximum(0, rows - 1) * N + cols,
+                                     rows * N + np.maximum(0, cols - 1),
+                                     np.minimum(N - 1, rows + 1) * N + cols,
+                                     rows * N + np.minimum(N - 1, cols + 1)], axis=1)
+        # Row a: the intended action, then the other three in increasing order.
+        self._slip_act = np.array([[a] + [b for b in range(4) if b != a] for a in range(4)])
+        self._slip_cdf = 1 - slip_p * np.array([3, 2, 1])
+        self._goal = N * N - 1
+
+        self.state = np.zeros(n_env, dtype=np.int64)
+        self._obs = np.zeros((n_env, N, N), dtype=np.float32)
+        self._flat_obs = self._obs.reshape(n_env, N * N)
+        self._infos = [None] * n_env
+
+    def reset(self) -> np.ndarray:
+        self.state[:] = 0
+        self._obs[:] = 0
+        self._obs[:, 0, 0] = 1
+        return self._obs
+
+    def step(self, actions):
+        """
+        a = 0: up, a = 1: left, a = 2: down, a = 3: right.
+        A reward of 1 is given at position (N-1, N-1), which ends the episode.
+        """
+        slip = np.searchsorted(self._slip_cdf, self._rng.rand(self._n_env), side='right')
+        real_act = self._slip_act[np.asarray(actions), slip]
+
+        self._flat_obs[self._batch, self.state] = 0
+        self.state = self._next_state[self.state, real_act]
+        dones = self.state == self._goal
+        rewards = dones.astype(np.float32)
+        self.state[dones] = 0
+        self._flat_obs[self._batch, self.state] = 1
+        return self._obs, rewards, dones, self._infos
+
+    def sample_action(self):
+        return self._rng.randint(4, size=self._n_env)
+
+    def close(self):
+        pass
+
+    @property
+    def n_env(self):
+        return self._n_env
+
+    @property
+    def dim_observation(self):
+        return (self.N, self.N)
+
+    @property
+    def dim_action(self):
+        return 4
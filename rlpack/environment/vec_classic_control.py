@@ -0,0 +1,225 @@
+"""
+NumPy-vectorized CartPole, Acrobot and MountainCar.
+
+Each class steps `n_env` copies of the gym environment at once and behaves like
+`n_env` `ClassicControl` instances: reward is -1 on done and 0.1 otherwise,
+`info["episode"]` holds the gym return and length of a finished episode, and
+finished environments are reset in the same call. Dynamics follow gym's
+implementations, including their time limits.
+"""
+
+from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+
+class VecClassicControl(ABC):
+    max_episode_steps = None
+    dim_obs = None
+    n_action = None
+
+    def __init__(self, n_env: int = 1, seed: int = None):
+        self._n_env = n_env
+        self._rng = np.random.RandomState(seed)
+        self.state = self._reset_state(n_env)
+        self._traj_len = np.zeros(n_env, dtype=np.int64)
+        self._traj_rew = np.zeros(n_env, dtype=np.float64)
+
+    @abstractmethod
+    def _reset_state(self, n: int) -> np.ndarray:
+        """Return `n` initial states."""
+        pass
+
+    @abstractmethod
+    def _step_state(self, actions: np.ndarray):
+        """Advance `self.state` in place. Return (gym rewards, terminal flags)."""
+        pass
+
+    def _observe(self, state: np.ndarray) -> np.ndarray:
+        return state.copy()
+
+    def reset(self) -> np.ndarray:
+        self.state = self._reset_state(self._n_env)
+        self._traj_len[:] = 0
+        self._traj_rew[:] = 0
+        return self._observe(self.state)
+
+    def step(self, actions: List):
+        gym_rewards, dones = self._step_state(np.asarray(actions))
+        self._traj_len += 1
+        self._traj_rew += gym_rewards
+        dones |= self._traj_len >= self.max_episode_steps
+
+        rewards = np.where(dones, -1.0, 0.1)
+        infos = [{} for _ in range(self._n_env)]
+        done_ids = np.flatnonzero(dones)
+        if len(done_ids) > 0:
+            for i in done_ids:
+                infos[i]["episode"] = {"r": self._traj_rew[i], "l": self._traj_len[i]}
+            self.state[done_ids] = self._reset_state(len(done_ids))
+            self._traj_len[done_ids] = 0
+            self._traj_rew[done_ids] = 0
+
+        return self._observe(self.state), rewards, dones, infos
+
+    def sample_action(self):
+        return self._rng.randint(self.n_action, size=self._n_env)
+
+    def seed(self, rnd):
+        self._rng = np.random.RandomState(rnd)
+
+    def close(self):
+        pass
+
+    @property
+    def n_env(self):
+        return self._n_env
+
+    @property
+    def dim_observation(self):
+        return self.dim_obs
+
+    @property
+    def dim_action(self):
+        return self.n_action
+
+
+class VecCartPole(VecClassicControl):
+    dim_obs = (4,)
+    n_action = 2
+    max_episode_steps = 500
+
+    gravity = 9.8
+    masscart = 1.0
+    masspole = 0.1
+    total_mass = masspole + masscart
+    length = 0.5
+    polemass_length = masspole * length
+    force_mag = 10.0
+    tau = 0.02
+    theta_threshold_radians = 12 * 2 * np.pi / 360
+    x_threshold = 2.4
+
+    def __init__(self, n_env: int = 1, seed: int = None, max_episode_steps: int = 500):
+        self.max_episode_steps = max_episode_steps
+        super().__init__(n_env, seed)
+
+    def _reset_state(self, n):
+        return self._rng.uniform(low=-0.05, high=0.05, size=(n, 4))
+
+    def _step_state(self, actions):
+        x, x_dot, theta, theta_dot = self.state.T
+        force = np.where(actions == 1, self.force_mag, -self.force_mag)
+        costheta, sintheta = np.cos(theta), np.sin(theta)
+        temp = (force + self.polemass_length * theta_dot * theta_dot * sintheta) / self.total_mass
+        thetaacc = (self.gravity * sintheta - costheta * temp) / \
+            (self.length * (4.0 / 3.0 - self.masspole * costheta * costheta / self.total_mass))
+        xacc = temp - self.polemass_length * thetaacc * costheta / self.total_mass
+
+        self.state = np.stack([x + self.tau * x_dot,
+                               x_dot + self.tau * xacc,
+                               theta + self.tau * theta_dot,
+                               theta_dot + self.tau * thetaacc], axis=1)
+        x, theta = self.state[:, 0], self.state[:, 2]
+        dones = (np.abs(x) > self.x_threshold) | (np.abs(theta) > self.theta_threshold_radians)
+        return np.ones(self._n_env), dones
+
+
+class VecAcrobot(VecClassicControl):
+    """The "book" dynamics of gym's Acrobot-v1, integrated with one RK4 step of `dt`."""
+    dim_obs = (6,)
+    n_action = 3
+    max_episode_steps = 500
+
+    dt = .2
+    LINK_LENGTH_1 = 1.
+    LINK_MASS_1 = 1.
+    LINK_MASS_2 = 1.
+    LINK_COM_POS_1 = 0.5
+    LINK_COM_POS_2 = 0.5
+    LINK_MOI = 1.
+    MAX_VEL_1 = 4 * np.pi
+    MAX_VEL_2 = 9 * np.pi
+    AVAIL_TORQUE = np.array([-1., 0., +1])
+
+    def _reset_state(self, n):
+        return self._rng.uniform(low=-0.1, high=0.1, size=(n, 4))
+
+    def _dsdt(self, s, a):
+        m1, m2 = self.LINK_MASS_1, self.LINK_MASS_2
+        l1 = self.LINK_LENGTH_1
+        lc1, lc2 = self.LINK_COM_POS_1, self.LINK_COM_POS_2
+        I1 = I2 = self.LINK_MOI
+        g = 9.8
+        theta1, theta2, dtheta1, dtheta2 = s.T
+        d1 = m1 * lc1 ** 2 + m2 * (l1 ** 2 + lc2 ** 2 + 2 * l1 * lc2 * np.cos(theta2)) + I1 + I2
+        d2 = m2 * (lc2 ** 2 + l1 * lc2 * np.cos(theta2)) + I2
+        phi2 = m2 * lc2 * g * np.cos(theta1 + theta2 - np.pi / 2.)
+        phi1 = - m2 * l1 * lc2 * dtheta2 ** 2 * np.sin(theta2) \
+            - 2 * m2 * l1 * lc2 * dtheta2 * dtheta1 * np.sin(theta2) \
+            + (m1 * lc1 + m2 * l1) * g * np.cos(theta1 - np.pi / 2) + phi2
+        ddtheta2 = (a + d2 / d1 * phi1 - m2 * l1 * lc2 * dtheta1 ** 2 * np.sin(theta2) - phi2) \
+            / (m2 * lc2 ** 2 + I2 - d2 ** 2 / d1)
+        ddtheta1 = -(d2 * ddtheta2 + phi1) / d1
+        return np.stack([dtheta1, dtheta2, ddtheta1, ddtheta2], axis=1)
+
+    def _step_state(self, actions):
+        a = self.AVAIL_TORQUE[actions]
+        s, dt = self.state, self.dt
+        k1 = self._dsdt(s, a)
+        k2 = self._dsdt(s + dt / 2. * k1, a)
+        k3 = self._dsdt(s + dt / 2. * k2, a)
+        k4 = self._dsdt(s + dt * k3, a)
+        ns = s + dt / 6.0 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+        ns[:, :2] = (ns[:, :2] + np.pi) % (2 * np.pi) - np.pi
+        ns[:, 2] = np.clip(ns[:, 2], -self.MAX_VEL_1, self.MAX_VEL_1)
+        ns[:, 3] = np.clip(ns[:, 3], -self.MAX_VEL_2, self.MAX_VEL_2)
+        self.state = ns
+        dones = -np.cos(ns[:, 0]) - np.cos(ns[:, 1] + ns[:, 0]) > 1.
+        return np.where(dones, 0., -1.), dones
+
+    def _observe(self, state):
+        return np.stack([np.cos(state[:, 0]), np.sin(state[:, 0]),
+                         np.cos(state[:, 1]), np.sin(state[:, 1]),
+                         state[:, 2], state[:, 3]], axis=1)
+
+
+class VecMountainCar(VecClassicControl):
+    dim_obs = (2,)
+    n_action = 3
+    max_episode_steps = 200
+
+    min_position = -1.2
+    max_position = 0.6
+    max_speed = 0.07
+    goal_position = 0.5
+    force = 0.001
+    gravity = 0.0025
+
+    def _reset_state(self, n):
+        return np.stack([self._rng.uniform(low=-0.6, high=-0.4, size=n), np.zeros(n)], axis=1)
+
+    def _step_state(self, actions):
+        position, velocity = self.state[:, 0], self.state[:, 1]
+        velocity = np.clip(velocity + (actions - 1) * self.force + np.cos(3 * position) * (-self.gravity),
+                           -self.max_speed, self.max_speed)
+        position = np.clip(position + velocity, self.min_position, self.max_position)
+        velocity[(position == self.min_position) & (velocity < 0)] = 0
+
+        self.state = np.stack([position, velocity], axis=1)
+        return -np.ones(self._n_env), position >= self.goal_position
+
+
+def make_vec_classic_control(env_name: str, n_env: int = 1, seed: int = None):
+    """Vectorized counterpart of `make_classic_control` for the same environment names."""
+    assert env_name in {"Acrobot-v1", "CartPole-v1", "CartPole-v0", "MountainCar-v0"}
+    if env_name == "CartPole-v0":
+        return VecCartPole(n_env, seed, max_episode_steps=200)
+    elif env_name == "CartPole-v1":
+        return VecCartPole(n_env, seed, max_episode_steps=500)
+    elif env_name == "Acrobot-v1":
+        return VecAcrobot(n_env, seed)
+    else:
+        return VecMountainCar(n_env, seed)
@@ -1,3 +1,5 @@
+from .advantage import discount_cumsum, compute_returns_advantages
+from .inference_server import InferenceServer
 from .log import logger
 from .network import *
 from .utils import *
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def discount_cumsum(x, coef):
+    """Compute y[..., t] = x[..., t] + coef[..., t] * y[..., t+1] along the last axis, with y = 0 past the end.
+
+    `coef` is a scalar or an array broadcastable to `x`. The recurrence is solved by
+    a doubling scan, i.e. log2(T) vectorized passes instead of a Python loop over T.
+    """
+    y = np.array(x, dtype=np.float64)
+    a = np.broadcast_to(np.asarray(coef, dtype=np.float64), y.shape).copy()
+    n = y.shape[-1]
+    s = 1
+    while s < n:
+        # y must be updated with the coefficients of the previous pass, so before a.
+        y[..., :-s] += a[..., :-s] * y[..., s:]
+        a[..., :-s] *= a[..., s:]
+        s *= 2
+    return y
+
+
+def compute_returns_advantages(rewards, values, nextvalues, dones, earlystops, discount, gae):
+    """Discounted returns, TD residuals and GAE(lambda) advantages of a batch of transitions.
+
+    All inputs have shape (..., T), time along the last axis. `values` and `nextvalues`
+    are V(s_t) and V(s_{t+1}). At a done step nothing is bootstrapped. At an early-stopped
+    step that is not done, returns and deltas bootstrap from `nextvalues` and the
+    advantage recursion restarts. Otherwise step t + 1 continues the trajectory.
+
+    Returns:
+        - returns, deltas, advantages: float64 arrays of the input shape.
+    """
+    dones = np.asarray(dones).astype(bool)
+    earlystops = np.asarray(earlystops).astype(bool) & ~dones
+    rewards = np.asarray(rewards, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    nextvalues = np.asarray(nextvalues, dtype=np.float64)
+
+    notdone = discount * ~dones
+    following_values = np.concatenate([values[..., 1:], np.zeros_like(values[..., :1])], axis=-1)
+    bootstrap = np.where(earlystops, nextvalues, 0.)
+    cont = notdone * ~earlystops
+
+    returns = discount_cumsum(rewards + notdone * bootstrap, cont)
+    deltas = rewards + notdone * np.where(earlystops, nextvalues, following_values) - values
+    advantages = discount_cumsum(deltas, gae * cont)
+    return returns, deltas, advantages
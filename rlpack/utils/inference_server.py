@@ -0,0 +1,134 @@
+"""
+A batching front end for `get_action`.
+
+Actor threads call `submit(obs)` with a single observation and get a
+`concurrent.futures.Future` back. A worker thread takes the first pending
+request, keeps collecting until `max_batch` requests are queued or `max_latency`
+seconds have passed, runs one `get_action` on the stacked batch and scatters
+the rows of the result to the futures, so many single-env actors share one
+`sess.run` per batch.
+
+`stop()` serves the requests submitted before it and fails any left over with
+`RuntimeError`; `submit()` raises once the server is stopping.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+
+import numpy as np
+
+_STOP = object()
+
+
+class InferenceServer(object):
+    def __init__(self, agent, max_batch=64, max_latency=1e-3, act_fn=None):
+        """
+        agent：任意Base子类实例，默认调用其get_action。
+        max_batch：一次推断的最大请求数。
+        max_latency：第一个请求到达后最多等待的秒数。
+        act_fn：替代agent.get_action的函数，输入输出第0维均为batch。
+        """
+        self._act_fn = act_fn if act_fn is not None else agent.get_action
+        self._max_batch = max_batch
+        self._max_latency = max_latency
+
+        self._queue = Queue()
+        self._thread = None
+        # 保证停止信号之后不再有请求入队。
+        self._lock = threading.Lock()
+        self._stopping = False
+        self.n_batch = 0
+        self.n_request = 0
+
+    def start(self):
+        assert self._thread is None, "Server already started."
+        self._stopping = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """处理完已提交的请求后退出，未处理的请求以RuntimeError结束。"""
+        with self._lock:
+            self._stopping = True
+            if self._thread is not None:
+                self._queue.put(_STOP)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._fail_pending()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def submit(self, obs):
+        """提交单个observation（不含batch维），返回对应动作的Future。"""
+        future = Future()
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("InferenceServer is stopped.")
+            self._queue.put((obs, future))
+        return future
+
+    def get_action(self, obs):
+        return self.submit(obs).result()
+
+    def _fail_pending(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                return
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("InferenceServer stopped before serving the request."))
+
+    def _collect(self):
+        """阻塞到第一个请求，再在max_latency内凑满至多max_batch个。返回(请求列表, 是否收到停止信号)。"""
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        requests = [first]
+        deadline = time.monotonic() + self._max_latency
+        while len(requests) < self._max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except Empty:
+                break
+            if item is _STOP:
+                return requests, True
+            requests.append(item)
+        return requests, False
+
+    def _serve(self):
+        stop = False
+        while not stop:
+            requests, stop = self._collect()
+            if not requests:
+                continue
+
+            # 跳过已被取消的请求。
+            requests = [(o, future) for o, future in requests if future.set_running_or_notify_cancel()]
+            if not requests:
+                continue
+            obs, futures = zip(*requests)
+
+            try:
+                actions = self._act_fn(np.stack(obs))
+                if len(actions) != len(futures):
+                    raise ValueError(f"act_fn returned {len(actions)} rows for {len(futures)} requests.")
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, action in zip(futures, actions):
+                future.set_result(action)
+            self.n_batch += 1
+            self.n_request += len(futures)
@@ -8,6 +8,60 @@ def mlp(x, hidden_sizes=(32,), activation=tf.tanh, output_activation=None):
     return tf.layers.dense(x, units=hidden_sizes[-1], activation=output_activation)
 
 
+def observation_input(dim_obs, dtype=tf.float32, name="observation"):
+    """Return a placeholder for observations of `dtype` and the float tensor to feed networks.
+
+    uint8 observations, e.g. frames, are cast in-graph and scaled to [0, 1], so they can be fed
+    without being converted to float32 on the host. Other integer observations are only cast.
+    """
+    ph = tf.placeholder(tf.as_dtype(dtype), shape=[None, *dim_obs], name=name)
+    return ph, float_observation(ph)
+
+
+def float_observation(obs):
+    """Cast uint8 observations to float32 scaled to [0, 1] and other integer observations, e.g. state ids,
+    to float32 unscaled; return float observations unchanged."""
+    if obs.dtype == tf.uint8:
+        return tf.to_float(obs) / 255.0
+    if obs.dtype.is_integer:
+        return tf.to_float(obs)
+    return obs
+
+
+def stacked_variable_getter(n, index):
+    """Custom getter that stores each variable as `n` stacked, non-trainable copies and returns copy `index`.
+
+    Calling the same network function under `tf.variable_scope(scope, reuse=tf.AUTO_REUSE,
+    custom_getter=stacked_variable_getter(n, i))` for i in range(n) evaluates an ensemble of `n`
+    networks whose variables share one [n, ...] variable each, so copying a network into a slot
+    is one `tf.scatter_update` per variable. Each copy is initialized independently.
+    """
+    def getter(getter, name, shape=None, dtype=tf.float32, initializer=None, **kwargs):
+        init = initializer if initializer is not None else tf.glorot_uniform_initializer()
+
+        def stacked_init(shape, dtype=dtype, partition_info=None):
+            return tf.stack([init(shape[1:], dtype) for _ in range(n)])
+
+        kwargs["trainable"] = False
+        stacked = getter(name, shape=[n, *shape], dtype=dtype, initializer=stacked_init, **kwargs)
+        return stacked[index]
+    return getter
+
+
+def concat_batch_call(fn, *args_list):
+    """Call `fn` once on several argument tuples concatenated along the batch axis.
+
+    Return one output per argument tuple, split back from the outputs of `fn`, which may be
+    a tensor or a tuple of tensors. Suits networks without cross-sample layers such as batch norm.
+    """
+    sizes = [tf.shape(args[0])[0] for args in args_list]
+    outputs = fn(*[tf.concat(xs, axis=0) for xs in zip(*args_list)])
+    if isinstance(outputs, (tuple, list)):
+        splits = [tf.split(y, sizes, axis=0, num=len(args_list)) for y in outputs]
+        return [tuple(parts) for parts in zip(*splits)]
+    return tf.split(outputs, sizes, axis=0, num=len(args_list))
+
+
 def gaussian_likelihood(x, mu, log_std, EPS=1e-8):
     pre_sum = -0.5 * (((x-mu)/(tf.exp(log_std)+EPS))**2 + 2*log_std + np.log(2*np.pi))
     return tf.reduce_sum(pre_sum, axis=1)
@@ -0,0 +1,66 @@
+import numpy as np
+
+from rlpack.utils.advantage import compute_returns_advantages, discount_cumsum
+
+
+def _loop(rewards, values, nextvalues, dones, earlystops, discount, gae):
+    """The reversed loop previously used by PG, A2C, PPO and TRPO."""
+    batch_size = len(dones)
+    returns = np.zeros(batch_size)
+    deltas = np.zeros(batch_size)
+    advantages = np.zeros(batch_size)
+
+    for i in reversed(range(batch_size)):
+
+        if dones[i]:
+            prev_return = 0
+            prev_value = 0
+            prev_advantage = 0
+        elif earlystops[i]:
+            prev_return = nextvalues[i]
+            prev_value = prev_return
+            prev_advantage = 0
+
+        returns[i] = rewards[i] + discount * prev_return * (1 - dones[i])
+        deltas[i] = rewards[i] + discount * prev_value * (1 - dones[i]) - values[i]
+        advantages[i] = deltas[i] + discount * gae * prev_advantage * (1 - dones[i])
+
+        prev_return = returns[i]
+        prev_value = values[i]
+        prev_advantage = advantages[i]
+    return returns, deltas, advantages
+
+
+def test_matches_loop_on_random_batches():
+    rng = np.random.RandomState(0)
+    for batch_size in [1, 2, 7, 64, 1000]:
+        rewards = rng.randn(batch_size)
+        values, nextvalues = rng.randn(batch_size), rng.randn(batch_size)
+        dones = (rng.rand(batch_size) < 0.05).astype(np.float32)
+        earlystops = rng.rand(batch_size) < 0.05
+        earlystops[-1] = True
+
+        expected = _loop(rewards, values, nextvalues, dones, earlystops, 0.99, 0.95)
+        result = compute_returns_advantages(rewards, values, nextvalues, dones, earlystops, 0.99, 0.95)
+        for e, r in zip(expected, result):
+            assert np.allclose(e, r)
+
+
+def test_batched_over_envs():
+    rng = np.random.RandomState(1)
+    n_env, T = 5, 33
+    inputs = [rng.randn(n_env, T), rng.randn(n_env, T), rng.randn(n_env, T),
+              rng.rand(n_env, T) < 0.1, rng.rand(n_env, T) < 0.1]
+    inputs[4][:, -1] = True
+
+    result = compute_returns_advantages(*inputs, 0.9, 0.8)
+    for i in range(n_env):
+        expected = _loop(*[x[i] for x in inputs], 0.9, 0.8)
+        for e, r in zip(expected, result):
+            assert np.allclose(e, r[i])
+
+
+def test_discount_cumsum():
+    x = np.arange(10.)
+    expected = [sum(0.5 ** (k - t) * x[k] for k in range(t, 10)) for t in range(10)]
+    assert np.allclose(discount_cumsum(x, 0.5), expected)
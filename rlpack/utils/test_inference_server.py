@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from rlpack.utils.inference_server import InferenceServer
+
+
+class DoubleAgent(object):
+    def __init__(self):
+        self.batch_sizes = []
+
+    def get_action(self, obs):
+        self.batch_sizes.append(len(obs))
+        return obs * 2
+
+
+def test_results_scattered_to_callers():
+    agent = DoubleAgent()
+    n_thread, n_call = 8, 50
+    results = {}
+
+    def actor(i):
+        results[i] = [server.get_action(np.full(3, i * n_call + j)) for j in range(n_call)]
+
+    with InferenceServer(agent, max_batch=n_thread, max_latency=1e-2) as server:
+        threads = [threading.Thread(target=actor, args=(i,)) for i in range(n_thread)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    for i in range(n_thread):
+        for j, act in enumerate(results[i]):
+            np.testing.assert_array_equal(act, np.full(3, 2 * (i * n_call + j)))
+    assert sum(agent.batch_sizes) == n_thread * n_call
+    assert max(agent.batch_sizes) <= n_thread
+    assert server.n_batch < n_thread * n_call
+
+
+def test_pending_requests_coalesced():
+    agent = DoubleAgent()
+    server = InferenceServer(agent, max_batch=4, max_latency=1.)
+    futures = [server.submit(np.array([i])) for i in range(10)]
+    server.start()
+    server.stop()
+
+    assert [f.result()[0] for f in futures] == [2 * i for i in range(10)]
+    assert agent.batch_sizes == [4, 4, 2]
+
+
+def test_exception_propagates():
+    def fail(obs):
+        raise ValueError("bad batch")
+
+    with InferenceServer(None, act_fn=fail) as server:
+        with pytest.raises(ValueError):
+            server.get_action(np.zeros(2))
+
+
+def test_submit_after_stop_raises():
+    server = InferenceServer(DoubleAgent()).start()
+    server.stop()
+    with pytest.raises(RuntimeError):
+        server.submit(np.zeros(2))
+
+    # 重新启动后可以继续使用。
+    with server:
+        np.testing.assert_array_equal(server.get_action(np.ones(2)), [2, 2])
+
+
+def test_stop_fails_unserved_requests():
+    server = InferenceServer(DoubleAgent())
+    future = server.submit(np.zeros(2))
+    server.stop()
+    with pytest.raises(RuntimeError):
+        future.result(timeout=1)
+
+
+def test_wrong_number_of_rows():
+    with InferenceServer(None, max_batch=1, act_fn=lambda obs: obs[:0]) as server:
+        with pytest.raises(ValueError):
+            server.get_action(np.zeros(2))
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from rlpack.utils.network import concat_batch_call, observation_input
+
+
+def _net(x, a):
+    h = tf.layers.dense(tf.concat([x, a], axis=1), 8, tf.tanh)
+    return tf.layers.dense(h, 1)[:, 0]
+
+
+def _two_heads(x, a):
+    h = tf.layers.dense(tf.concat([x, a], axis=1), 8, tf.tanh)
+    return tf.layers.dense(h, 2), tf.layers.dense(h, 1)[:, 0]
+
+
+@pytest.mark.parametrize("fn", [_net, _two_heads])
+def test_concat_batch_call_matches_separate_calls(fn):
+    rng = np.random.RandomState(0)
+    with tf.Graph().as_default():
+        # 两组输入的batch大小不同。
+        inputs = [(tf.constant(rng.randn(n, 3), tf.float32), tf.constant(rng.randn(n, 2), tf.float32)) for n in (4, 7)]
+        with tf.variable_scope("net", reuse=tf.AUTO_REUSE):
+            concat = concat_batch_call(fn, *inputs)
+        separate = []
+        for args in inputs:
+            with tf.variable_scope("net", reuse=True):
+                separate.append(fn(*args))
+        assert len(tf.trainable_variables()) == (4 if fn is _net else 6)
+
+        with tf.Session() as sess:
+            sess.run(tf.global_variables_initializer())
+            concat, separate = sess.run([concat, separate])
+
+    assert len(concat) == len(separate) == 2
+    for y, y_ref in zip(concat, separate):
+        if fn is _two_heads:
+            assert isinstance(y, tuple) and len(y) == 2
+        else:
+            y, y_ref = [y], [y_ref]
+        for part, part_ref in zip(y, y_ref):
+            np.testing.assert_allclose(part, part_ref, rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize("dtype, scale", [(np.uint8, 1 / 255.), (np.int32, 1.), (np.int64, 1.), (np.float32, 1.)])
+def test_observation_input(dtype, scale):
+    obs = np.array([[0, 3, 255]], dtype=dtype)
+    with tf.Graph().as_default():
+        ph, x = observation_input((3,), dtype)
+        assert ph.dtype == tf.as_dtype(dtype) and x.dtype == tf.float32
+        with tf.Session() as sess:
+            np.testing.assert_allclose(sess.run(x, feed_dict={ph: obs}), obs * scale, rtol=1e-6)